@@ -1,19 +1,23 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import plotly.graph_objects as go
 import os
+import sys
 from PIL import Image
-from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "notebook"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import model_registry
+import run_log
+import sku_store
 
 # ───── STREAMLIT CONFIG ─────
 st.set_page_config(page_title="📊 Faviy Dairy Forecast Dashboard", layout="wide")
 
 # ───── PATHS ─────
-FORECAST_DIR = "data/processed/"
-PROC_DIR     = "data/processed/"
 EVAL_PATH    = "results/tables/accuracy_summary.csv"
 IMG_FOLDER   = "images"
+RISK_ALERT   = 0.20   # spoilage / stockout probability from which the risk note turns into a warning
 
 # ───── HEADER ─────
 with st.container():
@@ -31,13 +35,14 @@ with st.container():
             unsafe_allow_html=True,
         )
 
-# ───── CSV LOADER ─────
-@st.cache_data
-def load_csv(path, parse_dates=None):
-    return pd.read_csv(path, parse_dates=parse_dates) if os.path.exists(path) else None
+# ───── DATA LOADERS ─────
+# Bounded, file-change-aware cache shared by every dashboard (dashboard/data_access.py)
+from data_access import (cache_panel, current_stock, list_skus, load_chart, load_csv, load_horizon,
+                         load_portfolio_index, load_run_log, load_series, load_stock_index, load_table)
+import chart_data
 
 # ───── SIDEBAR ─────
-products = sorted(f.replace("_forecast.csv", "") for f in os.listdir(FORECAST_DIR) if f.endswith("_forecast.csv"))
+products = list_skus("forecast")
 selected_product = st.sidebar.selectbox("🧀 Select Product", products)
 display_name     = selected_product.replace("_", " ").title()
 st.sidebar.markdown(f"### Viewing: **{display_name}**")
@@ -51,11 +56,17 @@ else:
     st.sidebar.info("🖼️ No product image.")
 
 # ───── LOAD DATA ─────
-forecast_df = load_csv(f"{FORECAST_DIR}{selected_product}_forecast.csv", parse_dates=["ds"])
-stock_df    = load_csv(f"{PROC_DIR}stock_levels.csv", parse_dates=["Date"])
-spoil_df    = load_csv(f"{PROC_DIR}spoilage_summary.csv")
-fest_df     = load_csv(f"{PROC_DIR}festival_dates.csv", parse_dates=["Date"])
+forecast_df = load_series("forecast", selected_product, sku_store.FORECAST_COLUMNS)
+stock_idx   = load_stock_index()
+risk_df     = load_table("spoilage_risk")
+risk_daily  = load_table("spoilage_risk_daily")
+plan_df     = load_table("replenishment_plan_by_location")
+fest_df     = load_table("festival_dates")
 eval_df     = load_csv(EVAL_PATH)
+index_df    = load_portfolio_index()
+runlog_df   = load_run_log()
+
+cache_panel()
 
 # ───── KPI TILE FUNCTION ─────
 def kpi(icon, label, value):
@@ -74,13 +85,17 @@ def kpi(icon, label, value):
     )
 
 # ───── TABS ─────
-tab_over, tab_fore, tab_eval = st.tabs(["📊 Overview", "📈 Forecast", "📏 Evaluation"])
+tab_over, tab_fore, tab_eval, tab_health = st.tabs(["📊 Overview", "📈 Forecast", "📏 Evaluation",
+                                                    "🩺 Pipeline Health"])
 
 # ╭── OVERVIEW ───────────────────────────────────────────╮
 with tab_over:
     st.markdown("### 📊 Overview – Portfolio Snapshot")
 
-    total_rows = forecast_df.shape[0] if forecast_df is not None else 0
+    # Per-SKU totals from the pipeline's portfolio index (notebook/portfolio_index.py), or the stored forecasts
+    total_rows = 0
+    if index_df is not None:
+        total_rows = int(index_df.loc[index_df["SKU"] == selected_product, "Forecast_Rows"].sum())
     next_fest = None
     if fest_df is not None:
         fut = fest_df[fest_df["Date"] >= pd.Timestamp.today()]
@@ -96,12 +111,9 @@ with tab_over:
 
     # Top‑5 plot (Plotly)
     st.markdown("#### 🔝 Top‑5 SKUs by 30‑Day Demand")
-    lst = []
-    for p in products:
-        df_tmp = load_csv(f"{FORECAST_DIR}{p}_forecast.csv", parse_dates=["ds"])
-        if df_tmp is not None:
-            lst.append({"Product": p.replace("_", " ").title(), "Demand": df_tmp.tail(30)["yhat"].sum()})
-    top_df = pd.DataFrame(lst).sort_values("Demand", ascending=False).head(5)
+    top_df = pd.DataFrame(columns=["Product", "Demand"])
+    if index_df is not None:
+        top_df = index_df.rename(columns={"Demand_30d": "Demand"}).nlargest(5, "Demand")[["Product", "Demand"]]
     if not top_df.empty:
         fig_top = px.bar(
             top_df, x="Demand", y="Product", orientation="h",
@@ -112,7 +124,18 @@ with tab_over:
                               margin=dict(l=10, r=10, t=30, b=10))
         st.plotly_chart(fig_top, use_container_width=True)
     else:
-        st.info("No data for top SKUs.")
+        st.info("No data for top SKUs – run 02_prophet_forecasting.py.")
+
+    # Catalogue-wide risk from the pipeline's Monte Carlo simulation (notebook/spoilage_sim.py)
+    st.markdown("#### 🧫 Spoilage & Stockout Risk – all SKUs")
+    if risk_df is not None:
+        cols = ["SKU", "Shelf_Life_Days", "Spoilage_Prob", "Expected_Spoilage", "Spoilage_P90",
+                "Stockout_Prob", "Expected_Lost_Units", "Fill_Rate"]
+        st.dataframe(risk_df.sort_values(["Spoilage_Prob", "Stockout_Prob"], ascending=False)[cols],
+                     use_container_width=True, hide_index=True,
+                     column_config={c: st.column_config.NumberColumn(format="%.2f") for c in cols[2:]})
+    else:
+        st.info("No risk simulation yet – run `python notebook/spoilage_sim.py`.")
 
     # Upcoming festivals list
     st.markdown("#### 🎉 Upcoming Festivals (next 30 days)")
@@ -134,64 +157,93 @@ with tab_over:
 with tab_fore:
     horizon = st.slider("Forecast Horizon (days)", 7, 60, 30)
     if forecast_df is not None:
-        today = datetime.today().date()
-        curr_stock = stock_df.query("Product_Name == @display_name and Date == @today")["Ending_Stock"].sum() if stock_df is not None else 0
-        demand_h = forecast_df.tail(horizon)["yhat"].sum()
+        # Predict exactly `horizon` future days from the stored model; the CSV only holds 30
+        model_key = model_registry.latest_model(selected_product)
+        future_df = load_horizon(selected_product, horizon, model_key) if model_key else None
+        if future_df is None:
+            st.caption("No registered model for this SKU – showing the stored forecast file.")
+            future_df = forecast_df.tail(horizon)
+        chart_df = pd.concat([forecast_df[forecast_df["ds"] < future_df["ds"].min()], future_df])
+
+        # Latest ending stock comes from the pipeline's per-SKU snapshot, not the full history
+        snapshot = current_stock(selected_product)
+        curr_stock, stock_as_of = (snapshot[1], snapshot[0]) if snapshot else (0, None)
+        demand_h = future_df["yhat"].sum()
         gap = curr_stock - demand_h
 
         c1, c2, c3 = st.columns(3)
         with c1: kpi("📦", "Current Stock", f"{curr_stock:.0f}")
         with c2: kpi("🛒", f"Demand ({horizon}d)", f"{demand_h:.0f}")
         with c3: kpi("📉", "Gap", f"{gap:+.0f}")
+        if stock_as_of is not None:
+            st.caption(f"Stock as of {stock_as_of:%d %b %Y}")
+
+        # Spoilage / stockout risk, simulated for the whole catalogue by the pipeline (notebook/spoilage_sim.py)
+        risk = risk_df[risk_df["SKU"] == selected_product] if risk_df is not None else pd.DataFrame()
+        if risk.empty:
+            st.info("🧫 No spoilage simulation for this SKU yet – run `python notebook/spoilage_sim.py`.")
+        else:
+            r = risk.iloc[0]
+            note = (f"🧫 Next {r.Horizon_Days} days: {r.Spoilage_Prob:.0%} chance of spoilage "
+                    f"(expected {r.Expected_Spoilage:.0f} units, P90 {r.Spoilage_P90:.0f}; shelf life "
+                    f"{r.Shelf_Life_Days} d) • {r.Stockout_Prob:.0%} chance of a stockout "
+                    f"(expected {r.Expected_Lost_Units:.0f} units short)")
+            (st.warning if max(r.Spoilage_Prob, r.Stockout_Prob) >= RISK_ALERT else st.success)(note)
+            days = risk_daily[risk_daily["SKU"] == selected_product] if risk_daily is not None else None
+            if days is not None and not days.empty:
+                with st.expander("📆 Daily spoilage / stockout probability"):
+                    fig_risk = px.line(days, x="Date", y=["Spoilage_Prob", "Stockout_Prob"],
+                                       labels={"value": "Probability", "variable": ""})
+                    fig_risk.update_layout(yaxis_tickformat=".0%", margin=dict(l=10, r=10, t=30, b=10))
+                    st.plotly_chart(fig_risk, use_container_width=True)
+                    st.caption(f"{r.Paths:,} simulated demand paths; receipts: {r.Policy} policy")
 
-        # Spoilage risk
-        shelf_life = 7
-        if spoil_df is not None and "Shelf_Life_Days" in spoil_df.columns:
-            row = spoil_df.query("Product_Name == @display_name")
-            if not row.empty:
-                shelf_life = int(row["Shelf_Life_Days"].iat[0])
-        at_risk = max(curr_stock - forecast_df.head(shelf_life)["yhat"].sum(), 0)
-        if at_risk > 0:
-            st.warning(f"🧫 {at_risk:.0f} units risk spoilage in {shelf_life} days.")
+        # Reorder point / order quantity per location from the pipeline's optimizer (notebook/replenishment.py)
+        plan = plan_df[plan_df["SKU"] == selected_product] if plan_df is not None else pd.DataFrame()
+        if plan.empty:
+            st.info("🚚 No replenishment plan for this SKU yet – run `python notebook/replenishment.py`.")
         else:
-              st.success("✅ No spoilage risk.")
+            st.markdown("#### 🚚 Replenishment Plan")
+            p = plan.iloc[0]
+            c1, c2, c3 = st.columns(3)
+            with c1: kpi("🎯", "Service Level", f"{plan['Service_Level'].mean():.0%}")
+            with c2: kpi("🔔", "Reorder Point", f"{plan['Reorder_Point'].sum():.0f}")
+            with c3: kpi("🚚", "Order Now", f"{plan['Order_Qty'].sum():.0f}")
+            cols = [c for c in ("Location", "Sales_Channel") if c in plan] + [
+                "On_Hand", "Safety_Stock", "Reorder_Point", "Order_Up_To", "Order_Qty", "Service_Level",
+                "Expected_Spoilage", "Fill_Rate"]
+            st.dataframe(plan[cols], use_container_width=True, hide_index=True,
+                         column_config={c: st.column_config.NumberColumn(format="%.2f")
+                                        for c in ("Safety_Stock", "Service_Level", "Expected_Spoilage", "Fill_Rate")})
+            st.caption(f"Plan for {p.Plan_Date:%d %b %Y}: {p.Lead_Time_Days} d lead time, reviewed every "
+                       f"{p.Review_Days} d; service level = newsvendor ratio of lost margin vs holding and "
+                       f"spoilage (shelf life {p.Shelf_Life_Days} d)")
 
 
         # Forecast table
-        disp = forecast_df[["ds", "yhat", "yhat_lower", "yhat_upper"]].tail(horizon)
+        disp = future_df[["ds", "yhat", "yhat_lower", "yhat_upper"]]
         disp = disp.rename(columns={"ds": "Date", "yhat": "Predicted", "yhat_lower": "Lower", "yhat_upper": "Upper"})
         st.dataframe(disp, use_container_width=True)
 
         if st.download_button("📥 Download CSV", disp.to_csv(index=False), file_name=f"{selected_product}_{horizon}d_forecast.csv"):
             st.toast("CSV downloaded!", icon="📁")
 
-        # Interactive line chart
-        fig = go.Figure()
-
-        fig.add_trace(go.Scatter(x=forecast_df["ds"], y=forecast_df["yhat"],
-                                 mode="lines", name="Forecast", line=dict(color="#0055A4")))
-        fig.add_trace(go.Scatter(
-            x=pd.concat([forecast_df["ds"], forecast_df["ds"][::-1]]),
-            y=pd.concat([forecast_df["yhat_upper"], forecast_df["yhat_lower"][::-1]]),
-            fill="toself", fillcolor="rgba(0,85,164,0.15)", line=dict(width=0),
-            hoverinfo="skip", showlegend=False
-        ))
-        if stock_df is not None:
-            stock_line = stock_df.query("Product_Name == @display_name")
-            fig.add_trace(go.Scatter(x=stock_line["Date"], y=stock_line["Ending_Stock"],
-                                     mode="lines", name="Stock", line=dict(color="#E94E1B", dash="dot")))
-        if fest_df is not None:
-            for d in fest_df["Date"]:
-                fig.add_vrect(x0=d, x1=d + pd.Timedelta(days=1),
-                              fillcolor="#9B59B6", opacity=0.15, line_width=0)
-
-        fig.update_layout(
-            title=f"{display_name} – Forecast, Stock & Festivals",
-            yaxis_title="Units", hovermode="x unified",
-            legend=dict(orientation="h", y=1.02, x=1, xanchor="right"),
-            template="plotly_white", margin=dict(l=20, r=10, t=50, b=30)
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        # Interactive line chart – downsampled traces and merged festival ranges, cached per (SKU, horizon)
+        title = f"{display_name} – Forecast, Stock & Festivals"
+
+        def prepare():
+            stock_line = stock_idx.series(selected_product) if stock_idx is not None else None
+            fest_dates = fest_df["Date"] if fest_df is not None else None
+            data = chart_data.prepare_chart(chart_df, stock_line, fest_dates)
+            raw = chart_data.raw_chart(chart_df, stock_line, fest_dates)
+            data["payload"] = (chart_data.payload_bytes(chart_data.build_figure(raw, title)),
+                               chart_data.payload_bytes(chart_data.build_figure(data, title)))
+            return data
+
+        traces = load_chart(selected_product, horizon, model_key, prepare)
+        st.plotly_chart(chart_data.build_figure(traces, title), use_container_width=True)
+        raw_bytes, sent_bytes = traces["payload"]
+        st.caption(f"Chart payload {sent_bytes / 1024:.1f} kB (unreduced {raw_bytes / 1024:.1f} kB)")
 
 # ╭── EVALUATION ─────────────────────────────────────────╮
 with tab_eval:
@@ -207,6 +259,47 @@ with tab_eval:
         with st.expander("📊 All Product Accuracy"):
             st.dataframe(eval_df.sort_values("MAPE (%)"), use_container_width=True)
 
+# ╭── PIPELINE HEALTH ────────────────────────────────────╮
+with tab_health:
+    # Stage and per-SKU timings logged by each pipeline stage (notebook/run_log.py)
+    history = run_log.stage_history(runlog_df, runs=20)
+    if history.empty:
+        st.info("No pipeline runs logged yet – run `python notebook/run_pipeline.py`.")
+    else:
+        history["run_id"] = history["run_id"].astype(str)
+        last_id = history["run_id"].iloc[-1]
+        last = history[history["run_id"] == last_id]
+        hits, misses = last["cache_hits"].sum(), last["cache_misses"].sum()
+        h1, h2, h3, h4 = st.columns(4)
+        with h1: kpi("🆔", "Last run", last_id)
+        with h2: kpi("⏱️", "Stage time (sum)", f"{last['duration_s'].sum():.1f}s")
+        with h3: kpi("🧠", "Peak RSS", f"{last.filter(like='peak_rss_mb').max().max():.0f} MB")
+        with h4: kpi("♻️", "SKU cache hits", f"{hits / (hits + misses):.0%}" if hits + misses else "–")
+
+        runs = list(dict.fromkeys(history["run_id"]))
+        fig = px.bar(history, x="run_id", y="duration_s", color="stage",
+                     category_orders={"run_id": runs}, labels={"run_id": "Run", "duration_s": "Seconds"},
+                     title="Stage duration per run")
+        st.plotly_chart(fig, use_container_width=True)
+        mem = px.line(history, x="run_id", y="peak_rss_mb", color="stage", markers=True,
+                      category_orders={"run_id": runs}, labels={"run_id": "Run", "peak_rss_mb": "MB"},
+                      title="Peak RSS per stage")
+        st.plotly_chart(mem, use_container_width=True)
+
+        stages = [s for s in ("forecast", "charts", "evaluate", "preprocess")
+                  if not run_log.slowest_skus(runlog_df, s).empty]
+        if stages:
+            stage = st.selectbox("🐢 Slowest SKUs in stage", stages)
+            slow = run_log.slowest_skus(runlog_df, stage, runs=5, n=10)
+            parts = [c for c in ("fit_s", "predict_s", "plot_s", "write_s") if c in slow] or ["total_s"]
+            bars = px.bar(slow.melt(id_vars="sku", value_vars=parts, var_name="step", value_name="seconds"),
+                          x="seconds", y="sku", color="step", orientation="h",
+                          category_orders={"sku": list(slow["sku"])},
+                          title=f"Slowest {stage} SKUs (mean of the last 5 runs that recomputed them)")
+            st.plotly_chart(bars, use_container_width=True)
+        with st.expander("📋 Stage log of the last run"):
+            st.dataframe(last.drop(columns=["event", "run_id"]), use_container_width=True)
+
 # ───── FOOTER ─────
 st.markdown(
     """
@@ -2,8 +2,14 @@ import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
+import sys
 from PIL import Image
-from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "notebook"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import model_registry
+import run_log
+import sku_store
 
 # ───── MATPLOTLIB THEME ─────
 plt.rcParams.update({
@@ -18,10 +24,9 @@ plt.rcParams.update({
 st.set_page_config(page_title="📊 Faviy Dairy Forecast Dashboard", layout="wide")
 
 # ───── PATHS ─────
-FORECAST_DIR = "data/processed/"
-PROC_DIR = "data/processed/"
 EVAL_PATH = "results/tables/accuracy_summary.csv"
 IMG_FOLDER = "images"
+RISK_ALERT = 0.20   # spoilage / stockout probability from which the risk note turns into a warning
 
 # ───── HEADER BLOCK ─────
 with st.container():
@@ -38,13 +43,13 @@ with st.container():
             """,
             unsafe_allow_html=True,
         )
-# ───── CSV LOADER ─────
-@st.cache_data
-def load_csv(path, parse_dates=None):
-    return pd.read_csv(path, parse_dates=parse_dates) if os.path.exists(path) else None
+# ───── DATA LOADERS ─────
+# Bounded, file-change-aware cache shared by every dashboard (dashboard/data_access.py)
+from data_access import (cache_panel, current_stock, list_skus, load_csv, load_horizon, load_run_log,
+                         load_portfolio_index, load_series, load_stock_index, load_table)
 
 # ───── SIDEBAR ─────
-products = sorted(f.replace("_forecast.csv", "") for f in os.listdir(FORECAST_DIR) if f.endswith("_forecast.csv"))
+products = list_skus("forecast")
 selected_product = st.sidebar.selectbox("🧀 Select Product", products)
 display_name = selected_product.replace("_", " ").title()
 
@@ -59,11 +64,17 @@ else:
     st.sidebar.info("🖼️ No product image.")
 
 # ───── LOAD DATA ─────
-forecast_df = load_csv(f"{FORECAST_DIR}{selected_product}_forecast.csv", parse_dates=["ds"])
-stock_df    = load_csv(f"{PROC_DIR}stock_levels.csv", parse_dates=["Date"])
-spoil_df    = load_csv(f"{PROC_DIR}spoilage_summary.csv")
-fest_df     = load_csv(f"{PROC_DIR}festival_dates.csv", parse_dates=["Date"])
+forecast_df = load_series("forecast", selected_product, sku_store.FORECAST_COLUMNS)
+stock_idx   = load_stock_index()
+risk_df     = load_table("spoilage_risk")
+risk_daily  = load_table("spoilage_risk_daily")
+plan_df     = load_table("replenishment_plan_by_location")
+fest_df     = load_table("festival_dates")
 eval_df     = load_csv(EVAL_PATH)
+index_df    = load_portfolio_index()
+runlog_df   = load_run_log()
+
+cache_panel()
 
 # ───── KPI TILE FUNCTION ─────
 def kpi(icon, label, value):
@@ -82,7 +93,8 @@ def kpi(icon, label, value):
     )
 
 # ───── TABS ─────
-tab_over, tab_fore, tab_eval = st.tabs(["📊 Overview", "📈 Forecast", "📏 Evaluation"])
+tab_over, tab_fore, tab_eval, tab_health = st.tabs(["📊 Overview", "📈 Forecast", "📏 Evaluation",
+                                                    "🩺 Pipeline Health"])
 
 # ╭────────────────────────────────────────────────────────╮
 # │ OVERVIEW TAB                                           │
@@ -91,7 +103,10 @@ with tab_over:
     st.markdown("### 📊 Overview – Portfolio Snapshot")
 
     # KPI tiles
-    total_rows = forecast_df.shape[0] if forecast_df is not None else 0
+    # Per-SKU totals from the pipeline's portfolio index (notebook/portfolio_index.py), or the stored forecasts
+    total_rows = 0
+    if index_df is not None:
+        total_rows = int(index_df.loc[index_df["SKU"] == selected_product, "Forecast_Rows"].sum())
     next_fest_date = None
     if fest_df is not None:
         future_fest = fest_df[fest_df["Date"] >= pd.Timestamp.today()]
@@ -107,13 +122,9 @@ with tab_over:
 
     # Top‑5 SKUs by 30‑day demand
     st.markdown("#### 🔝 Top‑5 SKUs by 30‑Day Forecast Demand")
-    top_df_list = []
-    for p in products:
-        df_tmp = load_csv(f"{FORECAST_DIR}{p}_forecast.csv", parse_dates=["ds"])
-        if df_tmp is not None:
-            total_30 = df_tmp.tail(30)["yhat"].sum()
-            top_df_list.append({"Product": p.replace("_", " ").title(), "Demand": total_30})
-    top_df = pd.DataFrame(top_df_list).sort_values("Demand", ascending=False).head(5)
+    top_df = pd.DataFrame(columns=["Product", "Demand"])
+    if index_df is not None:
+        top_df = index_df.rename(columns={"Demand_30d": "Demand"}).nlargest(5, "Demand")[["Product", "Demand"]]
 
     if not top_df.empty:
         fig1, ax1 = plt.subplots(figsize=(7, 3))
@@ -122,7 +133,18 @@ with tab_over:
         ax1.set_xlabel("Units")
         st.pyplot(fig1)
     else:
-        st.info("No forecast data to display top SKUs.")
+        st.info("No forecast data to display top SKUs – run 02_prophet_forecasting.py.")
+
+    # Catalogue-wide risk from the pipeline's Monte Carlo simulation (notebook/spoilage_sim.py)
+    st.markdown("#### 🧫 Spoilage & Stockout Risk – all SKUs")
+    if risk_df is not None:
+        cols = ["SKU", "Shelf_Life_Days", "Spoilage_Prob", "Expected_Spoilage", "Spoilage_P90",
+                "Stockout_Prob", "Expected_Lost_Units", "Fill_Rate"]
+        st.dataframe(risk_df.sort_values(["Spoilage_Prob", "Stockout_Prob"], ascending=False)[cols]
+                            .style.format({c: "{:.2f}" for c in cols[2:]}),
+                     use_container_width=True, hide_index=True)
+    else:
+        st.info("No risk simulation yet – run `python notebook/spoilage_sim.py`.")
 
     # Upcoming festivals (next 30 days)
     st.markdown("#### 🎉 Upcoming Festivals (next 30 days)")
@@ -148,36 +170,75 @@ with tab_over:
 with tab_fore:
     horizon = st.slider("Forecast Horizon", 7, 60, 30)
     if forecast_df is not None:
-        today = datetime.today().date()
-        todays_stock = 0
-        if stock_df is not None:
-            todays_stock = (
-                stock_df.query("Product_Name == @display_name and Date == @today")["Ending_Stock"].sum()
-            )
-        demand_horizon = forecast_df.tail(horizon)["yhat"].sum()
+        # Predict exactly `horizon` future days from the stored model; the CSV only holds 30
+        model_key = model_registry.latest_model(selected_product)
+        future_df = load_horizon(selected_product, horizon, model_key) if model_key else None
+        if future_df is None:
+            st.caption("No registered model for this SKU – showing the stored forecast file.")
+            future_df = forecast_df.tail(horizon)
+        chart_df = pd.concat([forecast_df[forecast_df["ds"] < future_df["ds"].min()], future_df])
+
+        # Latest ending stock comes from the pipeline's per-SKU snapshot, not the full history
+        snapshot = current_stock(selected_product)
+        todays_stock, stock_as_of = (snapshot[1], snapshot[0]) if snapshot else (0, None)
+        demand_horizon = future_df["yhat"].sum()
         gap = todays_stock - demand_horizon
 
         c1, c2, c3 = st.columns(3)
         with c1: kpi("📦", "Current Stock", f"{todays_stock:.0f}")
         with c2: kpi("🛒", f"Demand ({horizon} d)", f"{demand_horizon:.0f}")
         with c3: kpi("📉", "Stock Gap", f"{gap:+.0f} units")
+        if stock_as_of is not None:
+            st.caption(f"Stock as of {stock_as_of:%d %b %Y}")
+
+        # Spoilage / stockout risk, simulated for the whole catalogue by the pipeline (notebook/spoilage_sim.py)
+        risk = risk_df[risk_df["SKU"] == selected_product] if risk_df is not None else pd.DataFrame()
+        if risk.empty:
+            st.info("🧫 No spoilage simulation for this SKU yet – run `python notebook/spoilage_sim.py`.")
+        else:
+            r = risk.iloc[0]
+            note = (f"🧫 Next {r.Horizon_Days} days: {r.Spoilage_Prob:.0%} chance of spoilage "
+                    f"(expected {r.Expected_Spoilage:.0f} units, P90 {r.Spoilage_P90:.0f}; shelf life "
+                    f"{r.Shelf_Life_Days} d) • {r.Stockout_Prob:.0%} chance of a stockout "
+                    f"(expected {r.Expected_Lost_Units:.0f} units short)")
+            (st.warning if max(r.Spoilage_Prob, r.Stockout_Prob) >= RISK_ALERT else st.success)(note)
+            days = risk_daily[risk_daily["SKU"] == selected_product] if risk_daily is not None else None
+            if days is not None and not days.empty:
+                with st.expander("📆 Daily spoilage / stockout probability"):
+                    fig_risk, ax_risk = plt.subplots(figsize=(9, 3))
+                    ax_risk.plot(days["Date"], days["Spoilage_Prob"], label="Spoilage")
+                    ax_risk.plot(days["Date"], days["Stockout_Prob"], label="Stockout")
+                    ax_risk.set_ylim(0, 1)
+                    ax_risk.set_ylabel("Probability")
+                    ax_risk.legend()
+                    ax_risk.grid(True)
+                    st.pyplot(fig_risk)
+                    st.caption(f"{r.Paths:,} simulated demand paths; receipts: {r.Policy} policy")
 
-        # Spoilage risk
-        shelf_life_days = 7
-        if spoil_df is not None and "Shelf_Life_Days" in spoil_df.columns:
-            row = spoil_df.query("Product_Name == @display_name")
-            if not row.empty:
-                shelf_life_days = int(row["Shelf_Life_Days"].iat[0])
-        at_risk = max(todays_stock - forecast_df.head(shelf_life_days)["yhat"].sum(), 0)
-        if at_risk > 0:
-            st.warning(f"🧫 Spoilage risk: ~{at_risk:.0f} units may expire in {shelf_life_days} days.")
+        # Reorder point / order quantity per location from the pipeline's optimizer (notebook/replenishment.py)
+        plan = plan_df[plan_df["SKU"] == selected_product] if plan_df is not None else pd.DataFrame()
+        if plan.empty:
+            st.info("🚚 No replenishment plan for this SKU yet – run `python notebook/replenishment.py`.")
         else:
-            st.success("✅ No spoilage risk in shelf life window.")
+            st.markdown("#### 🚚 Replenishment Plan")
+            p = plan.iloc[0]
+            c1, c2, c3 = st.columns(3)
+            with c1: kpi("🎯", "Service Level", f"{plan['Service_Level'].mean():.0%}")
+            with c2: kpi("🔔", "Reorder Point", f"{plan['Reorder_Point'].sum():.0f}")
+            with c3: kpi("🚚", "Order Now", f"{plan['Order_Qty'].sum():.0f}")
+            cols = [c for c in ("Location", "Sales_Channel") if c in plan] + [
+                "On_Hand", "Safety_Stock", "Reorder_Point", "Order_Up_To", "Order_Qty", "Service_Level",
+                "Expected_Spoilage", "Fill_Rate"]
+            st.dataframe(plan[cols].style.format({c: "{:.2f}" for c in ("Safety_Stock", "Service_Level",
+                                                                         "Expected_Spoilage", "Fill_Rate")}),
+                         use_container_width=True, hide_index=True)
+            st.caption(f"Plan for {p.Plan_Date:%d %b %Y}: {p.Lead_Time_Days} d lead time, reviewed every "
+                       f"{p.Review_Days} d; service level = newsvendor ratio of lost margin vs holding and "
+                       f"spoilage (shelf life {p.Shelf_Life_Days} d)")
 
         # Forecast table
         disp = (
-            forecast_df[["ds", "yhat", "yhat_lower", "yhat_upper"]]
-            .tail(horizon)
+            future_df[["ds", "yhat", "yhat_lower", "yhat_upper"]]
             .rename(columns={"ds": "Date", "yhat": "Predicted", "yhat_lower": "Lower", "yhat_upper": "Upper"})
         )
         st.dataframe(disp, use_container_width=True)
@@ -187,10 +248,10 @@ with tab_fore:
 
         # Forecast chart
         fig, ax = plt.subplots(figsize=(9, 4))
-        ax.plot(forecast_df["ds"], forecast_df["yhat"], label="Forecast")
-        ax.fill_between(forecast_df["ds"], forecast_df["yhat_lower"], forecast_df["yhat_upper"], alpha=0.1)
-        if stock_df is not None:
-            stock_line = stock_df.query("Product_Name == @display_name")
+        ax.plot(chart_df["ds"], chart_df["yhat"], label="Forecast")
+        ax.fill_between(chart_df["ds"], chart_df["yhat_lower"], chart_df["yhat_upper"], alpha=0.1)
+        if stock_idx is not None:
+            stock_line = stock_idx.series(selected_product)
             ax.plot(stock_line["Date"], stock_line["Ending_Stock"], linestyle=":", label="Stock")
         if fest_df is not None:
             for d in fest_df["Date"]:
@@ -216,6 +277,53 @@ with tab_eval:
         with st.expander("📊 All Product Accuracy"):
             st.dataframe(eval_df.sort_values("MAPE (%)"), use_container_width=True)
 
+# ╭────────────────────────────────────────────────────────╮
+# │ PIPELINE HEALTH TAB                                    │
+# ╰────────────────────────────────────────────────────────╯
+with tab_health:
+    # Stage and per-SKU timings logged by each pipeline stage (notebook/run_log.py)
+    history = run_log.stage_history(runlog_df, runs=20)
+    if history.empty:
+        st.info("No pipeline runs logged yet – run `python notebook/run_pipeline.py`.")
+    else:
+        last_id = history["run_id"].iloc[-1]
+        last = history[history["run_id"] == last_id]
+        hits, misses = last["cache_hits"].sum(), last["cache_misses"].sum()
+        h1, h2, h3, h4 = st.columns(4)
+        h1.metric("Last run", str(last_id))
+        h2.metric("Stage time (sum)", f"{last['duration_s'].sum():.1f}s")
+        h3.metric("Peak RSS", f"{last.filter(like='peak_rss_mb').max().max():.0f} MB")
+        h4.metric("SKU cache hits", f"{hits / (hits + misses):.0%}" if hits + misses else "–")
+
+        durations = history.pivot_table(index="run_id", columns="stage", values="duration_s",
+                                        aggfunc="sum", observed=True)
+        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 4))
+        durations.plot(kind="bar", stacked=True, ax=ax1, rot=45)
+        ax1.set_title("Stage duration per run")
+        ax1.set_xlabel("Run")
+        ax1.set_ylabel("Seconds")
+        history.pivot_table(index="run_id", columns="stage", values="peak_rss_mb", aggfunc="max",
+                            observed=True).plot(marker="o", ax=ax2, rot=45)
+        ax2.set_title("Peak RSS per stage")
+        ax2.set_xlabel("Run")
+        ax2.set_ylabel("MB")
+        fig.tight_layout()
+        st.pyplot(fig)
+
+        stages = [s for s in ("forecast", "charts", "evaluate", "preprocess")
+                  if not run_log.slowest_skus(runlog_df, s).empty]
+        if stages:
+            stage = st.selectbox("🐢 Slowest SKUs in stage", stages)
+            slow = run_log.slowest_skus(runlog_df, stage, runs=5, n=10)
+            parts = [c for c in ("fit_s", "predict_s", "plot_s", "write_s") if c in slow] or ["total_s"]
+            fig, ax = plt.subplots(figsize=(10, 4))
+            slow.set_index("sku")[parts].iloc[::-1].plot(kind="barh", stacked=True, ax=ax)
+            ax.set_title(f"Slowest {stage} SKUs (mean of the last 5 runs that recomputed them)")
+            ax.set_xlabel("Seconds")
+            st.pyplot(fig)
+        with st.expander("📋 Stage log of the last run"):
+            st.dataframe(last.drop(columns=["event", "run_id"]), use_container_width=True)
+
 # FOOTER
 st.markdown(
     """
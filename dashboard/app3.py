@@ -2,11 +2,18 @@ import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
+import sys
 from PIL import Image
 from datetime import datetime
 import numpy as np
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "notebook"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import render_charts
+import sku_store
+from data_access import cache_panel, list_skus, load_csv, load_series
+
 # --- Page Config ---
 st.set_page_config(page_title="📊 Dairy Demand Forecast Dashboard", layout="wide")
 
@@ -29,13 +36,11 @@ _Last updated: {datetime.today().strftime("%B %d, %Y")}_
 )
 
 # --- Paths ---
-FORECAST_DIR = "data/processed/"
-PLOT_DIR = "results/forecast_charts/"
 EVAL_PATH = "results/tables/accuracy_summary.csv"
 IMG_FOLDER = "images"
 
 # --- Sidebar: product selector ---
-products = [f.replace("_forecast.csv", "") for f in os.listdir(FORECAST_DIR) if f.endswith("_forecast.csv")]
+products = list_skus("forecast")
 selected_product = st.sidebar.selectbox("Select a Product", products)
 
 display_name = selected_product.replace("_", " ").title()
@@ -53,11 +58,11 @@ elif os.path.exists(img_jpg):
 else:
     st.sidebar.info("🖼️ No image available for this product.")
 
+cache_panel()
+
 # --- Forecast Table & Load Forecast ---
-forecast_path = os.path.join(FORECAST_DIR, f"{selected_product}_forecast.csv")
-if os.path.exists(forecast_path):
-    forecast_df = pd.read_csv(forecast_path)
-    forecast_df['ds'] = pd.to_datetime(forecast_df['ds'])
+forecast_df = load_series("forecast", selected_product, sku_store.FORECAST_COLUMNS)
+if forecast_df is not None:
 
     forecast_display = (
         forecast_df[["ds", "yhat", "yhat_lower", "yhat_upper"]]
@@ -92,9 +97,9 @@ if os.path.exists(forecast_path):
 else:
     st.warning("⚠️ Forecast data not found.")
 
-# --- Forecast Plot ---
-img_path = os.path.join(PLOT_DIR, f"{selected_product}_plot.png")
-if os.path.exists(img_path):
+# --- Forecast Plot (rendered on first request, then served from results/forecast_charts/) ---
+img_path = render_charts.ensure_chart(selected_product)
+if img_path is not None:
     st.subheader(f"📈 Forecast Plot – {display_name}")
     st.image(img_path, use_container_width=True)
 else:
@@ -103,10 +108,9 @@ else:
 # --- Forecast vs Actual Chart & Seasonality ---
 with st.expander(f"📉 Forecast vs Actual & Seasonality – {display_name}", expanded=True):
 
-    cleaned_path = os.path.join('data/processed/', f"{selected_product}_cleaned.csv")
+    actual_df = load_series("cleaned", selected_product)
 
-    if os.path.exists(cleaned_path):
-        actual_df = pd.read_csv(cleaned_path)
+    if actual_df is not None and forecast_df is not None:
         actual_df.columns = actual_df.columns.str.strip().str.lower()
 
         # Debug logs
@@ -186,8 +190,8 @@ with st.expander(f"📉 Forecast vs Actual & Seasonality – {display_name}", ex
         st.info("📭 Actual data not available for this product.")
 
 # --- Accuracy Metrics Table ---
-if os.path.exists(EVAL_PATH):
-    eval_df = pd.read_csv(EVAL_PATH)
+eval_df = load_csv(EVAL_PATH)
+if eval_df is not None:
     metrics = eval_df[eval_df["Product"].str.lower() == display_name.lower()]
 
     if not metrics.empty:
@@ -211,7 +215,7 @@ else:
 
 # --- Full Accuracy Table ---
 with st.expander("📊 View Accuracy Summary for All Products"):
-    if os.path.exists(EVAL_PATH):
+    if eval_df is not None:
         st.dataframe(
             eval_df.rename(columns={
                 "Product": "Product Name",
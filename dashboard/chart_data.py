@@ -0,0 +1,186 @@
+"""
+chart_data.py
+Chart-data preparation for the Plotly forecast chart in Home.py.
+
+Long histories are reduced to roughly one point per horizontal pixel before
+they reach the browser:
+
+* the forecast and stock lines with LTTB (largest-triangle-three-buckets),
+  which keeps peaks and troughs that plain striding would drop;
+* the confidence band with min/max bucketing – each bucket keeps the lowest
+  lower bound and the highest upper bound, so the band never gets narrower;
+* festival days are merged into one shaded range per run of adjacent days
+  and clipped to the chart's date range, instead of one shape per row.
+
+``prepare_chart`` returns plain arrays; Home.py caches them per
+(SKU, horizon) through data_access and builds the figure with
+``build_figure``.
+
+    python dashboard/chart_data.py          # payload bytes per SKU, raw vs prepared
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "notebook"))
+import sku_store
+from series_keys import sku_slug
+
+MAX_POINTS = 1200   # about one point per pixel of a full-width chart
+
+FORECAST_COLOR = "#0055A4"
+STOCK_COLOR = "#E94E1B"
+FESTIVAL_COLOR = "#9B59B6"
+
+
+def lttb(x, y, n_out):
+    """Indices of the ``n_out`` points LTTB keeps from (x, y); all indices if already short enough."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)   # n_out - 2 buckets between the endpoints
+    keep = np.empty(n_out, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the final bucket)
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        ax, ay = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[prev] - ax) * (y[lo:hi] - y[prev]) - (x[prev] - x[lo:hi]) * (ay - y[prev]))
+        prev = lo + int(np.argmax(area))
+        keep[i + 1] = prev
+    return keep
+
+
+def minmax_band(x, lower, upper, n_out):
+    """(x, lower, upper) reduced to ``n_out`` buckets, keeping each bucket's envelope."""
+    n = len(x)
+    if n_out >= n:
+        return np.asarray(x), np.asarray(lower), np.asarray(upper)
+    starts = np.linspace(0, n, n_out, endpoint=False).astype(int)
+    return (np.asarray(x)[starts],
+            np.minimum.reduceat(np.asarray(lower, dtype=float), starts),
+            np.maximum.reduceat(np.asarray(upper, dtype=float), starts))
+
+
+def festival_ranges(dates, start=None, end=None):
+    """Runs of consecutive festival days → ``[(first day, day after last), ...]`` within [start, end]."""
+    days = pd.DatetimeIndex(pd.to_datetime(pd.Series(dates)).dt.normalize().unique()).sort_values()
+    if start is not None:
+        days = days[days >= pd.Timestamp(start).normalize()]
+    if end is not None:
+        days = days[days <= pd.Timestamp(end)]
+    if days.empty:
+        return []
+    breaks = np.flatnonzero(np.diff(days.asi8) != pd.Timedelta(days=1).value) + 1
+    firsts = np.r_[0, breaks]
+    lasts = np.r_[breaks - 1, len(days) - 1]
+    return [(days[a], days[b] + pd.Timedelta(days=1)) for a, b in zip(firsts, lasts)]
+
+
+def prepare_chart(chart_df, stock_line=None, festival_dates=None, max_points=MAX_POINTS):
+    """Downsampled traces for the forecast chart as a dict of arrays."""
+    x = chart_df["ds"].to_numpy()
+    keep = lttb(x.astype("int64"), chart_df["yhat"].to_numpy(), max_points)
+    band_x, band_lo, band_hi = minmax_band(x, chart_df["yhat_lower"].to_numpy(),
+                                           chart_df["yhat_upper"].to_numpy(), max_points)
+    data = {
+        "forecast": (x[keep], chart_df["yhat"].to_numpy()[keep]),
+        "band": (band_x, band_lo, band_hi),
+        "stock": None,
+        "festivals": [],
+    }
+    if stock_line is not None and not stock_line.empty:
+        sx = stock_line["Date"].to_numpy()
+        sy = stock_line["Ending_Stock"].to_numpy()
+        skeep = lttb(sx.astype("int64"), sy, max_points)
+        data["stock"] = (sx[skeep], sy[skeep])
+    if festival_dates is not None and len(festival_dates):
+        data["festivals"] = festival_ranges(festival_dates, x.min(), x.max())
+    return data
+
+
+def raw_chart(chart_df, stock_line=None, festival_dates=None):
+    """The same traces without any reduction – one festival shape per calendar row (for comparison)."""
+    data = {
+        "forecast": (chart_df["ds"].to_numpy(), chart_df["yhat"].to_numpy()),
+        "band": (chart_df["ds"].to_numpy(), chart_df["yhat_lower"].to_numpy(), chart_df["yhat_upper"].to_numpy()),
+        "stock": None,
+        "festivals": [],
+    }
+    if stock_line is not None and not stock_line.empty:
+        data["stock"] = (stock_line["Date"].to_numpy(), stock_line["Ending_Stock"].to_numpy())
+    if festival_dates is not None:
+        data["festivals"] = [(d, d + pd.Timedelta(days=1)) for d in pd.to_datetime(pd.Series(festival_dates))]
+    return data
+
+
+def build_figure(data, title):
+    fig = go.Figure()
+    fx, fy = data["forecast"]
+    fig.add_trace(go.Scatter(x=fx, y=fy, mode="lines", name="Forecast", line=dict(color=FORECAST_COLOR)))
+    bx, blo, bhi = data["band"]
+    fig.add_trace(go.Scatter(
+        x=np.concatenate([bx, bx[::-1]]), y=np.concatenate([bhi, blo[::-1]]),
+        fill="toself", fillcolor="rgba(0,85,164,0.15)", line=dict(width=0),
+        hoverinfo="skip", showlegend=False
+    ))
+    if data["stock"] is not None:
+        sx, sy = data["stock"]
+        fig.add_trace(go.Scatter(x=sx, y=sy, mode="lines", name="Stock",
+                                 line=dict(color=STOCK_COLOR, dash="dot")))
+    # One layout update for every festival range (add_vrect re-validates the layout per call)
+    fig.update_layout(shapes=[
+        dict(type="rect", xref="x", yref="y domain", x0=x0, x1=x1, y0=0, y1=1,
+             fillcolor=FESTIVAL_COLOR, opacity=0.15, line_width=0)
+        for x0, x1 in data["festivals"]
+    ])
+    fig.update_layout(
+        title=title,
+        yaxis_title="Units", hovermode="x unified",
+        legend=dict(orientation="h", y=1.02, x=1, xanchor="right"),
+        template="plotly_white", margin=dict(l=20, r=10, t=50, b=30)
+    )
+    return fig
+
+
+def payload_bytes(fig):
+    """Size of the figure JSON Streamlit sends to the browser."""
+    return len(fig.to_json().encode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Plotly payload sizes with and without chart-data preparation.")
+    parser.add_argument("--max-points", type=int, default=MAX_POINTS)
+    args = parser.parse_args()
+
+    stock = sku_store.read_table("stock_levels")
+    fest = sku_store.read_table("festival_dates")
+    fest_dates = fest["Date"] if fest is not None else None
+    rows = []
+    for sku in sku_store.list_skus("forecast"):
+        chart_df = sku_store.read_series("forecast", sku, columns=sku_store.FORECAST_COLUMNS)
+        stock_line = None
+        if stock is not None:
+            stock_line = (stock[stock["Product_Name"].map(sku_slug) == sku]
+                          .groupby("Date", as_index=False)["Ending_Stock"].sum())
+        raw = payload_bytes(build_figure(raw_chart(chart_df, stock_line, fest_dates), sku))
+        prepared = prepare_chart(chart_df, stock_line, fest_dates, args.max_points)
+        rows.append({"SKU": sku, "Points": len(chart_df), "Raw bytes": raw,
+                     "Prepared bytes": payload_bytes(build_figure(prepared, sku)),
+                     "Festival shapes": f"{0 if fest_dates is None else len(fest_dates)} → {len(prepared['festivals'])}"})
+    report = pd.DataFrame(rows)
+    print(report.to_string(index=False))
+    print(f"\nTotal: {report['Raw bytes'].sum():,} → {report['Prepared bytes'].sum():,} bytes")
+
+
+if __name__ == "__main__":
+    main()
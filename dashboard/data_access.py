@@ -0,0 +1,249 @@
+"""
+data_access.py
+Shared, bounded data cache for the Streamlit dashboards (Home.py, app.py, app3.py).
+
+Every loader keys its entry on the files it reads: the entry is reused only
+while each file's (mtime, size) is unchanged, so a pipeline rerun shows up on
+the next page interaction without restarting the server. Loads that are not
+tied to one file (the SKU list) are keyed on the pipeline run ID – the stamp
+of the pipeline manifest, rewritten at the end of every stage.
+
+Entries live in one process-wide LRU bounded by entry count and by total
+frame memory; the least recently used entries are evicted first. Callers get
+a copy of the cached frame, so mutating it cannot corrupt the cache.
+
+    import data_access as da
+    forecast_df = da.load_series("forecast", sku, sku_store.FORECAST_COLUMNS)
+    da.cache_panel()   # hit / miss / evict counters in the sidebar
+"""
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "notebook"))
+import model_registry
+import portfolio_index
+import run_log
+import sku_store
+from pipeline_cache import MANIFEST_PATH, file_stamp
+from series_keys import sku_slug
+
+MAX_ENTRIES = 256
+MAX_BYTES   = 512 * 1024 ** 2
+
+
+def pipeline_run_id():
+    """Changes whenever a pipeline stage finishes (it rewrites the manifest)."""
+    return file_stamp(MANIFEST_PATH)
+
+
+def _nbytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    return getattr(value, "nbytes", None) or sys.getsizeof(value)
+
+
+class StockIndex:
+    """Daily ending stock per SKU, built once per stock_levels file.
+
+    Rows are summed per (SKU, day) and sorted, so each SKU's history is one
+    contiguous slice of the arrays; ``at`` is a dict lookup. Read-only – it
+    is shared between sessions without copying.
+    """
+
+    def __init__(self, stock_df):
+        daily = (stock_df.assign(SKU=stock_df["Product_Name"].map(sku_slug))
+                         .groupby(["SKU", "Date"], sort=True)["Ending_Stock"].sum())
+        skus = daily.index.get_level_values("SKU")
+        self.dates = daily.index.get_level_values("Date").to_numpy()
+        self.values = daily.to_numpy()
+        starts = np.flatnonzero(np.r_[True, skus[1:] != skus[:-1]])
+        stops = np.r_[starts[1:], len(skus)]
+        self._slices = {skus[a]: slice(a, b) for a, b in zip(starts, stops)}
+        self._at = dict(zip(zip(skus, self.dates), self.values))
+        self.nbytes = self.dates.nbytes + self.values.nbytes + 200 * len(self._at)
+
+    def at(self, sku, date):
+        """Ending stock of ``sku`` on ``date`` (0 if there is no row)."""
+        return float(self._at.get((sku, np.datetime64(pd.Timestamp(date), "ns")), 0.0))
+
+    def series(self, sku):
+        """DataFrame(Date, Ending_Stock) for one SKU – a slice, not a scan."""
+        sl = self._slices.get(sku, slice(0, 0))
+        return pd.DataFrame({"Date": self.dates[sl], "Ending_Stock": self.values[sl]})
+
+    def latest(self, sku):
+        """(date, ending stock) of the SKU's last day, or None."""
+        sl = self._slices.get(sku)
+        return None if sl is None else (pd.Timestamp(self.dates[sl.stop - 1]), float(self.values[sl.stop - 1]))
+
+
+class FrameCache:
+    """Thread-safe LRU of ``key → (stamp, value)``; a stale stamp counts as a miss."""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key, stamp, loader):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return _copy(entry[1])
+            if entry is not None:
+                self._drop(key)
+                self.stats["invalidations"] += 1
+            self.stats["misses"] += 1
+
+        # Load outside the lock so one slow read does not block other sessions
+        value = loader()
+        size = _nbytes(value)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (stamp, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (self._bytes > self.max_bytes
+                                                           and len(self._entries) > 1):
+                self._drop(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+        return _copy(value)
+
+    def _drop(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def snapshot(self):
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "bytes": self._bytes,
+                    "max_entries": self.max_entries, "max_bytes": self.max_bytes}
+
+
+def _copy(value):
+    return value.copy() if isinstance(value, pd.DataFrame) else value
+
+
+# One cache per server process, shared by every session and dashboard page
+CACHE = FrameCache()
+
+
+# ───── LOADERS ─────
+def list_skus(dataset):
+    return CACHE.get(("skus", dataset), pipeline_run_id(), lambda: sku_store.list_skus(dataset))
+
+
+def load_csv(path, parse_dates=None):
+    return CACHE.get(("csv", str(path), tuple(parse_dates or ())), file_stamp(path),
+                     lambda: pd.read_csv(path, parse_dates=parse_dates) if os.path.exists(path) else None)
+
+
+def load_series(dataset, product, columns=None):
+    path = sku_store.series_path(dataset, product)
+    return CACHE.get(("series", dataset, product, tuple(columns or ())), file_stamp(path),
+                     lambda: sku_store.read_series(dataset, product, columns=columns))
+
+
+def load_table(name):
+    return CACHE.get(("table", name), file_stamp(_table_file(name)), lambda: sku_store.read_table(name))
+
+
+def load_portfolio_index():
+    """The pipeline's portfolio_index table; built from the stored forecasts if it is missing.
+
+    A fresh checkout only has the legacy CSVs, so the Overview tab computes the
+    same per-SKU summary from them until 02_prophet_forecasting.py writes the table.
+    """
+    index_file = sku_store.table_path(portfolio_index.INDEX_TABLE)
+    if index_file.exists():
+        return load_table(portfolio_index.INDEX_TABLE)
+    return CACHE.get(("portfolio_index",), (pipeline_run_id(), file_stamp(_table_file("festival_dates"))),
+                     lambda: portfolio_index.build_index(sku_store.read_table("festival_dates")))
+
+
+def _table_file(name):
+    """The file (or folder of parts) behind a table; a folder's mtime changes with every part written."""
+    path = sku_store.table_path(name)
+    if path.exists():
+        return path
+    if sku_store.table_parts(name):
+        return sku_store.TABLE_DIR / name
+    return sku_store.LEGACY_DIR / f"{name}.csv"
+
+
+def load_stock_index():
+    """StockIndex of the stock_levels table, or None if the table is missing."""
+    def build():
+        df = sku_store.read_table("stock_levels", columns=["Date", "Product_Name", "Ending_Stock"])
+        return StockIndex(df) if df is not None else None
+    return CACHE.get(("stock_index",), file_stamp(_table_file("stock_levels")), build)
+
+
+def current_stock(sku):
+    """(as-of date, ending stock) from the pipeline's stock_snapshot table; falls back to the index."""
+    def build():
+        df = sku_store.read_table("stock_snapshot", columns=["SKU", "As_Of", "Ending_Stock"])
+        return None if df is None else {s: (pd.Timestamp(d), float(v))
+                                        for s, d, v in df.itertuples(index=False)}
+    snapshot = CACHE.get(("stock_snapshot",), file_stamp(_table_file("stock_snapshot")), build)
+    if snapshot is not None:
+        return snapshot.get(sku)
+    index = load_stock_index()
+    return index.latest(sku) if index is not None else None
+
+
+def load_chart(product, horizon, model_key, build):
+    """Prepared chart traces per (SKU, horizon) from ``build()``.
+
+    Rebuilt when the stored forecast, the registered model, the stock levels
+    or the festival calendar change.
+    """
+    stamp = (file_stamp(sku_store.series_path("forecast", product)), tuple(model_key or ()),
+             file_stamp(_table_file("stock_levels")), file_stamp(_table_file("festival_dates")))
+    return CACHE.get(("chart", product, horizon), stamp, build)
+
+
+def load_horizon(product, horizon, model_key):
+    """Future-only forecast from the registered model; ``model_key`` changes with every refit."""
+    return CACHE.get(("horizon", product, horizon), tuple(model_key or ()),
+                     lambda: model_registry.forecast_horizon(product, horizon, model_key))
+
+
+def load_run_log():
+    """Every stage and SKU event of the pipeline run log (notebook/run_log.py)."""
+    return CACHE.get(("run_log",), file_stamp(run_log.RUN_LOG), run_log.read_log)
+
+
+# ───── DEBUG PANEL ─────
+def cache_panel():
+    """Sidebar expander with the cache counters."""
+    import streamlit as st
+
+    s = CACHE.snapshot()
+    lookups = s["hits"] + s["misses"]
+    with st.sidebar.expander("🛠️ Data cache"):
+        c1, c2 = st.columns(2)
+        c1.metric("Hits", s["hits"])
+        c2.metric("Misses", s["misses"])
+        c1.metric("Evictions", s["evictions"])
+        c2.metric("Invalidated", s["invalidations"])
+        st.caption(f"{s['entries']}/{s['max_entries']} entries • "
+                   f"{s['bytes'] / 1024 ** 2:.1f}/{s['max_bytes'] / 1024 ** 2:.0f} MB • "
+                   f"hit rate {s['hits'] / lookups:.0%}" if lookups else "No lookups yet")
+        if st.button("Clear cache"):
+            CACHE.clear()
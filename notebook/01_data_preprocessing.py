@@ -1,28 +1,48 @@
-import pandas as pd
-import os
-
-df = pd.read_csv('data/faviy_dairy_cleaned_extended_with_festivals.csv')
-df["Date"] = pd.to_datetime(df["Date"])
-
-#os.mkdir("data/processed",exist_ok=True)
-products = df["Product_Name"].unique()
-print("Found Product:",products)
-
-for i in products:
-    product_df = df[df["Product_Name"] == i]
-    
-    daily = product_df.groupby("Date")["Units_Sold"].sum().reset_index()
-    daily = daily.sort_values(["Date"])
-    
-    daily["Units_Sold"]  = daily["Units_Sold"].rolling(window=7,min_periods=1).mean()
-    
-    prophet_df = daily.rename({
-        
-        "Date":"ds",
-        "Units_Sold" :'y'
-    }) 
-    
-    safe_name = i.lower().replace(" ","_").replace("(","").replace(")","").replace("/","_")
-    path = f'data/processed/{safe_name}_cleaned.csv'
-    prophet_df.to_csv(path,index=False)
-    print(f"✅ {i} → cleaned data saved to {path}")
\ No newline at end of file
+import argparse
+import time
+
+import chunked_ingest
+import incremental_ingest
+import run_log
+import sku_store
+from series_keys import DEFAULT_KEYS, PRODUCT_KEY, dataset_name, extra_keys, level_name, parse_keys, sku_slug
+
+SOURCE_FILE = 'data/faviy_dairy_cleaned_extended_with_festivals.csv'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the smoothed daily series for forecasting.")
+    parser.add_argument("--keys", default=",".join(DEFAULT_KEYS),
+                        help="comma-separated series keys, e.g. Product_Name,Location,Sales_Channel "
+                             "(default: Product_Name)")
+    parser.add_argument("--chunksize", type=int, default=chunked_ingest.CHUNK_ROWS,
+                        help=f"raw rows read per chunk (default: {chunked_ingest.CHUNK_ROWS:,})")
+    args = parser.parse_args()
+    keys = parse_keys(args.keys)
+    dataset = dataset_name("cleaned", keys)
+    log = run_log.StageLog("preprocess", level_name(keys))
+
+    # Streamed in chunks: memory follows the number of series × days, not the raw row count
+    filled = chunked_ingest.fill_calendar(chunked_ingest.fold_daily(SOURCE_FILE, keys, args.chunksize), keys)
+    daily = chunked_ingest.rolling_mean(filled, keys)
+    # The trailing window of raw totals lets incremental_ingest.py append new days
+    incremental_ingest.save_daily_state(dataset, filled, keys)
+
+    products = daily[PRODUCT_KEY].unique()
+    print("Found Product:",products)
+
+    # One partition per product; finer levels keep their key columns inside it
+    for i, prophet_df in daily.groupby(PRODUCT_KEY, sort=False):
+        prophet_df = prophet_df[[*extra_keys(keys), "Date", "Units_Sold"]]
+
+        start = time.perf_counter()
+        path = sku_store.write_series(dataset, sku_slug(i), prophet_df)
+        n_series = len(prophet_df.groupby(extra_keys(keys))) if extra_keys(keys) else 1
+        log.sku(sku_slug(i), write_s=time.perf_counter() - start, rows=len(prophet_df), series=n_series)
+        print(f"✅ {i} → {n_series} cleaned series saved to {path}")
+    log.rows = len(daily)
+    log.close()
+
+
+if __name__ == "__main__":
+    main()
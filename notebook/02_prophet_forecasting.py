@@ -1,49 +1,282 @@
 import pandas as pd
-from prophet import Prophet
-import matplotlib.pyplot as plt
+import prophet
+import argparse
 import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
 
-# Folder paths
-cleaned_data_dir = 'data/processed/'
-forecast_dir = 'data/processed/'
-plot_dir = 'results/forecast_charts/'
+import batch_engine
+import forecast_output
+import model_registry
+import portfolio_index
+import run_log
+import sku_store
+import warm_start
+from pipeline_cache import Manifest, combined_digest, file_digest
+from series_keys import DEFAULT_KEYS, dataset_name, extra_keys, level_name, parse_keys, split_series
 
-# Create output folders
-os.makedirs(forecast_dir, exist_ok=True)
-os.makedirs(plot_dir, exist_ok=True)
+# Settings that change the forecast output; part of every SKU's cache digest
+FORECAST_PERIODS = 30
+MODEL_CONFIG = {
+    "model": "prophet",
+    "prophet_version": prophet.__version__,
+    "periods": FORECAST_PERIODS,
+}
+ENGINE_CONFIGS = {
+    "prophet": MODEL_CONFIG,
+    "batch": {**batch_engine.ENGINE_CONFIG, "periods": FORECAST_PERIODS},
+}
 
-# Loop through all cleaned CSV files
-for file in os.listdir(cleaned_data_dir):
-    if file.endswith('_cleaned.csv'):
-        product_name = file.replace('_cleaned.csv', '')
-        path = os.path.join(cleaned_data_dir, file)
-        
-        print(f"🔄 Processing: {product_name}")
 
-        # Load and rename columns
-        df = pd.read_csv(path)
-        df = df.rename(columns={"Date": "ds", "Units_Sold": "y"}) if 'Date' in df.columns else df
+def forecast_product(product_name, data_hash=None, keys=DEFAULT_KEYS, warm=True, output=None):
+    """Fit, forecast and save one product partition.
 
-        # Convert date column
-        df['ds'] = pd.to_datetime(df['ds'])
+    At product level this is one series, whose model is registered together
+    with its fitted parameters; the next refit starts from them (warm_start.py)
+    unless ``warm`` is False. At finer levels every series in the partition is
+    fitted cold and the forecasts are written back as one partition.
+    ``output`` holds the forecast_output.py settings (default: compact). Charts
+    are drawn separately from the stored forecasts (render_charts.py).
 
-        # Fit model
-        model = Prophet()
-        model.fit(df)
+    Runs inside a worker process, so any failure is caught and reported back
+    instead of tearing down the pool.
+    """
+    result = {"product": product_name, "ok": False, "fit_s": 0.0, "predict_s": 0.0, "write_s": 0.0,
+              "total_s": 0.0, "error": None, "fit_mode": None, "iterations": 0}
+    start = time.perf_counter()
+    try:
+        # Load the partition (dates come back typed from the store)
+        df = sku_store.read_series(dataset_name("cleaned", keys), product_name)
 
-        # Forecast
-        future = model.make_future_dataframe(periods=30)
-        forecast = model.predict(future)
+        state = model_registry.warm_state(product_name) if warm and not extra_keys(keys) else None
+        forecasts = []
+        for _, key_values, series in split_series(df, product_name, keys):
+            # Fit model (warm-started from the last fit's parameters where they still apply)
+            model, info = warm_start.fit(series, state, MODEL_CONFIG, warm=warm)
+            result["fit_s"] += info["fit_s"]
+            result["iterations"] += info["iterations"] or 0
+            result["fit_mode"] = info["mode"] if result["fit_mode"] in (None, info["mode"]) else "mixed"
+            result["fit_reason"] = info["reason"]
+
+            # Forecast (only the rows and columns the output settings keep)
+            predict_start = time.perf_counter()
+            forecast = forecast_output.predict(model, FORECAST_PERIODS, **(output or forecast_output.settings()))
+            forecasts.append(forecast.assign(**key_values))
+            result["predict_s"] += time.perf_counter() - predict_start
+        result["series"] = len(forecasts)
 
         # Save forecast
-        forecast_file = f"{forecast_dir}{product_name}_forecast.csv"
-        forecast.to_csv(forecast_file, index=False)
+        write_start = time.perf_counter()
+        forecast = pd.concat(forecasts, ignore_index=True)
+        forecast = forecast[[*extra_keys(keys), *(c for c in forecast.columns if c not in extra_keys(keys))]]
+        sku_store.write_series(dataset_name("forecast", keys), product_name, forecast)
+        result["rows"] = len(forecast)
+
+        if not extra_keys(keys):
+            result["model_version"] = ["prophet", model_registry.save_model(product_name, model, data_hash,
+                                                                            MODEL_CONFIG, info["state"])]
+        result["write_s"] = time.perf_counter() - write_start
+
+        result["ok"] = True
+    except Exception:
+        result["error"] = traceback.format_exc()
+    result["total_s"] = time.perf_counter() - start
+    return result
+
+
+def print_summary(results):
+    """Print per-SKU timings (slowest first) and any failures."""
+    done = [r for r in results if r["ok"]]
+    failed = [r for r in results if not r["ok"]]
+
+    print("\n⏱️ Fit time per SKU (slowest first)")
+    for r in sorted(done, key=lambda r: r["fit_s"], reverse=True):
+        start = f"   {r['fit_mode']} start, {r['iterations']} iter" if r.get("fit_mode") else ""
+        print(f"   {r['product']:<28} fit {r['fit_s']:6.2f}s   total {r['total_s']:6.2f}s"
+              f"   ({r.get('series', 1)} series){start}")
+    if done:
+        print(f"   {'sum of fit time':<28} {sum(r['fit_s'] for r in done):10.2f}s")
+    # Cold fits of SKUs that had stored parameters, and why they could not be used
+    cold = [r for r in done if r.get("fit_mode") == "cold" and r.get("fit_reason") not in (None, "no previous fit")]
+    if cold:
+        print("   cold starts: " + ", ".join(f"{r['product']} ({r['fit_reason']})" for r in cold))
+
+    print(f"\n✅ {len(done)} succeeded, ❌ {len(failed)} failed")
+    for r in failed:
+        print(f"\n❌ {r['product']}\n{r['error']}")
+
+
+def forecast_batch(files, digests, keys=DEFAULT_KEYS, output=None):
+    """Fit every cleaned series at this level with the vectorized batch engine in one solve.
+
+    The solve is cheap, so the whole catalogue is refit and stored as one
+    registry bundle; only the forecasts of ``files`` (the stale products) are
+    rewritten.
+    """
+    config = ENGINE_CONFIGS["batch"]
+    start = time.perf_counter()
+    series = {}
+    members = {}   # product → [(series id, key values)]
+    results = {}
+    for product_name in digests:
+        df = sku_store.read_series(dataset_name("cleaned", keys), product_name)
+        members[product_name] = []
+        for sid, key_values, frame in split_series(df, product_name, keys):
+            frame = frame.dropna(subset=["y"])
+            if len(frame) < 2:
+                results[product_name] = {"product": product_name, "ok": False, "fit_s": 0.0, "total_s": 0.0,
+                                         "error": f"{sid}: only {len(frame)} observation(s) – nothing to fit\n"}
+                continue
+            series[sid] = frame
+            members[product_name].append((sid, key_values))
+
+    try:
+        fit_start = time.perf_counter()
+        frames, spec, fit, names, history_end = batch_engine.forecast_frames(
+            series, FORECAST_PERIODS, sku_store.read_table("festival_dates"))
+        fit_s = time.perf_counter() - fit_start
+        version = model_registry.save_batch(fit, spec, names, history_end,
+                                            {p: digests[p] for p in members}, config, level_name(keys))
+    except Exception:
+        error = traceback.format_exc()
+        return [results.get(p) or {"product": p, "ok": False, "fit_s": 0.0, "total_s": 0.0, "error": error}
+                for p in files]
+    print(f"🧮 Batch engine fit {len(names)} series in {fit_s:.2f}s")
+
+    out = []
+    for product_name in files:
+        if product_name in results:
+            out.append(results[product_name])
+            continue
+        output = output or forecast_output.settings()
+        predict_start = time.perf_counter()
+        forecast = pd.concat([forecast_output.compact(frames[sid], history_end[sid], **output).assign(**kv)
+                              for sid, kv in members[product_name]], ignore_index=True)
+        forecast = forecast[[*extra_keys(keys), *(c for c in forecast.columns if c not in extra_keys(keys))]]
+        write_start = time.perf_counter()
+        sku_store.write_series(dataset_name("forecast", keys), product_name, forecast)
+        # One shared solve – report each product's share of it
+        n = len(members[product_name])
+        out.append({"product": product_name, "ok": True, "fit_s": fit_s * n / len(names),
+                    "predict_s": write_start - predict_start, "write_s": time.perf_counter() - write_start,
+                    "total_s": (time.perf_counter() - start) / len(files), "error": None,
+                    "series": n, "rows": len(forecast), "model_version": ["batch", version]})
+    return out
+
+
+def output_paths(product_name, keys=DEFAULT_KEYS):
+    return [sku_store.partition_path(dataset_name("forecast", keys), product_name)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit a forecast model per cleaned SKU series.")
+    parser.add_argument("--engine", choices=sorted(ENGINE_CONFIGS), default="prophet",
+                        help="prophet: one Stan fit per SKU; batch: all SKUs in one vectorized solve")
+    parser.add_argument("--keys", default=",".join(DEFAULT_KEYS),
+                        help="series keys the cleaned data was built with, e.g. Product_Name,Location "
+                             "(default: Product_Name)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes to fit with; 1 runs serially (default: CPU count)")
+    parser.add_argument("--force", action="store_true",
+                        help="refit every SKU even if its series and settings are unchanged")
+    parser.add_argument("--cold", action="store_true",
+                        help="ignore stored parameters and fit every Prophet model from a cold start")
+    parser.add_argument("--output", choices=forecast_output.MODES, default="compact",
+                        help="compact: ds, yhat and its interval only; full: every Prophet component "
+                             "over the whole history (default: compact)")
+    parser.add_argument("--history-days", type=int,
+                        help="compact output: days of fitted history to keep before the horizon; "
+                             "0 writes the horizon only (default: the whole history, which 03 scores)")
+    parser.add_argument("--uncertainty-samples", type=int, default=0,
+                        help="compact output: simulated paths per interval; 0 computes the interval "
+                             "in closed form (default: 0)")
+    args = parser.parse_args()
+    keys = parse_keys(args.keys)
+    output = forecast_output.settings(args.output, args.history_days, args.uncertainty_samples)
+    config = {**ENGINE_CONFIGS[args.engine], "output": output}
+    if extra_keys(keys):
+        config = {**config, "keys": keys}
+    cleaned = dataset_name("cleaned", keys)
+    stage = dataset_name("forecast", keys)
+    log = run_log.StageLog("forecast", level_name(keys))
+
+    # Skip products whose cleaned partition and model settings match the last run
+    manifest = Manifest()
+    digests = {}
+    files = []
+    skipped = []
+    for product_name in sku_store.list_skus(cleaned):
+        digests[product_name] = combined_digest(file_digest(sku_store.series_path(cleaned, product_name)),
+                                                config)
+        if (not args.force
+                and manifest.is_fresh(stage, product_name, digests[product_name],
+                                      output_paths(product_name, keys))
+                and (extra_keys(keys) or model_registry.latest_model(product_name) is not None)):
+            skipped.append(product_name)
+        else:
+            files.append(product_name)
+
+    workers = 1 if args.engine == "batch" else max(1, min(args.workers, len(files)))
+    print(f"🔄 Forecasting {len(files)} SKUs at {level_name(keys)} level "
+          f"with the {args.engine} engine ({workers} worker(s))")
+
+    run_start = time.perf_counter()
+    results = []
+    if args.engine == "batch":
+        if files:
+            results = forecast_batch(files, digests, keys, output)
+        for i, result in enumerate(results, 1):
+            status = "✅" if result["ok"] else "❌"
+            print(f"{status} [{i}/{len(files)}] {result['product']}")
+    elif workers == 1:
+        outcomes = (forecast_product(p, digests[p], keys, not args.cold, output) for p in files)
+        for i, result in enumerate(outcomes, 1):
+            results.append(result)
+            status = "✅" if result["ok"] else "❌"
+            print(f"{status} [{i}/{len(files)}] {result['product']} ({result['total_s']:.1f}s)")
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(forecast_product, p, digests[p], keys, not args.cold, output)
+                       for p in files]
+            # Report in catalogue order so the log reads the same on every run
+            for i, (product_name, future) in enumerate(zip(files, futures), 1):
+                try:
+                    result = future.result()
+                except Exception:
+                    # Worker process died (e.g. killed by the OOM killer)
+                    result = {"product": product_name, "ok": False,
+                              "fit_s": 0.0, "total_s": 0.0, "error": traceback.format_exc()}
+                results.append(result)
+                status = "✅" if result["ok"] else "❌"
+                print(f"{status} [{i}/{len(files)}] {result['product']} ({result['total_s']:.1f}s)")
+
+    for r in results:
+        if r["ok"]:
+            manifest.record(stage, r["product"], digests[r["product"]],
+                            config=config, model_version=r.get("model_version"))
+    manifest.save()
+
+    # Dashboard Overview reads this one small table instead of every forecast
+    if not extra_keys(keys):
+        index_path = portfolio_index.write_index()
+        if index_path:
+            print(f"🗂️ Portfolio index saved to {index_path}")
+
+    print_summary(results)
+    print(f"♻️ Skipped {len(skipped)} unchanged SKUs, recomputed {len(results)}")
+    print(f"\n🏁 Wall time: {time.perf_counter() - run_start:.1f}s")
+
+    for r in results:
+        log.sku(r["product"], r["ok"], **{k: r.get(k) for k in ("fit_s", "predict_s", "write_s", "total_s",
+                                                                 "rows", "series", "fit_mode", "iterations")})
+    log.rows = sum(r.get("rows", 0) for r in results)
+    log.cache_hits, log.cache_misses = len(skipped), len(results)
+    log.close(engine=args.engine, workers=workers)
+
+    if any(not r["ok"] for r in results):
+        raise SystemExit(1)
 
-        # Plot
-        fig = model.plot(forecast)
-        plt.title(f"{product_name.replace('_', ' ').title()} – Forecast (30 Days)")
-        fig_path = f"{plot_dir}{product_name}_plot.png"
-        fig.savefig(fig_path)
-        plt.close()
 
-        print(f"✅ Saved: {forecast_file} and {fig_path}")
+if __name__ == "__main__":
+    main()
@@ -1,54 +1,187 @@
 import pandas as pd
 import numpy as np
 from sklearn.metrics import mean_absolute_error, mean_squared_error
+import argparse
 import os
+import time
+
+import backtest
+import run_log
+import sku_store
+from pipeline_cache import Manifest, combined_digest, file_digest
+from series_keys import DEFAULT_KEYS, dataset_name, extra_keys, level_name, parse_keys
 
 
 def calculate_metrics(actual, predicted):
     mae = mean_absolute_error(actual, predicted)
     rmse = np.sqrt(mean_squared_error(actual, predicted))
-    mape = np.mean(np.abs((actual - predicted) / actual)) * 100
+    # Days with zero actual demand have no percentage error; leave them out of MAPE
+    nonzero = actual != 0
+    mape = np.nan
+    if nonzero.any():
+        mape = np.mean(np.abs((actual[nonzero] - predicted[nonzero]) / actual[nonzero])) * 100
     return round(mae, 2), round(rmse, 2), round(mape, 2)
 
-cleaned_dir = 'data/processed/'
-forecast_dir = 'data/processed/'
-
-results = []
-
-for file in os.listdir(cleaned_dir):
-    if file.endswith('_cleaned.csv'):
-        product_name = file.replace('_cleaned.csv', '')
-        
-        # Load actual and forecast data
-        actual_df = pd.read_csv(os.path.join(cleaned_dir, file))
-        forecast_df = pd.read_csv(os.path.join(forecast_dir, f"{product_name}_forecast.csv"))
-
-        # Rename if needed
-        actual_df = actual_df.rename(columns={"Date": "ds", "Units_Sold": "y"}) if 'Date' in actual_df.columns else actual_df
-        actual_df['ds'] = pd.to_datetime(actual_df['ds'])
-        forecast_df['ds'] = pd.to_datetime(forecast_df['ds'])
-
-        # Filter forecast to only dates we have actuals for
-        common_dates = actual_df['ds'].isin(forecast_df['ds'])
-        merged = pd.merge(
-            actual_df[common_dates],
-            forecast_df[['ds', 'yhat']],
-            on='ds',
-            how='inner'
-        )
-
-        # Compute metrics
-        mae, rmse, mape = calculate_metrics(merged['y'], merged['yhat'])
-        results.append({
+
+def summary_path(keys=DEFAULT_KEYS):
+    suffix = f"_{level_name(keys)}" if extra_keys(keys) else ""
+    return f'results/tables/accuracy_summary{suffix}.csv'
+
+
+def evaluate_product(product_name, keys=DEFAULT_KEYS):
+    """Metric rows for every series in one product partition."""
+    extra = extra_keys(keys)
+
+    # Load actual and forecast data (only the forecast columns we score)
+    actual_df = sku_store.read_series(dataset_name("cleaned", keys), product_name)
+    forecast_df = sku_store.read_series(dataset_name("forecast", keys), product_name, columns=[*extra, 'ds', 'yhat'])
+
+    # Rename to Prophet's column names
+    actual_df = actual_df.rename(columns={"Date": "ds", "Units_Sold": "y"})
+
+    # Keep only dates we have actuals for
+    merged = pd.merge(actual_df, forecast_df, on=[*extra, 'ds'], how='inner')
+    if merged.empty:
+        return []
+
+    # Compute metrics
+    rows = []
+    for values, grp in (merged.groupby(extra, sort=True) if extra else [((), merged)]):
+        mae, rmse, mape = calculate_metrics(grp['y'], grp['yhat'])
+        rows.append({
             'Product': product_name.replace('_', ' ').title(),
+            **dict(zip(extra, values)),
             'MAE': mae,
             'RMSE': rmse,
             'MAPE (%)': mape
         })
-# Convert to DataFrame and save
-results_df = pd.DataFrame(results)
-os.makedirs('results/tables', exist_ok=True)
-results_df.to_csv('results/tables/accuracy_summary.csv', index=False)
+    return rows
+
+
+def backtest_paths(engine, keys=DEFAULT_KEYS):
+    suffix = f"_{level_name(keys)}" if extra_keys(keys) else ""
+    return (f'results/tables/backtest_by_sku_{engine}{suffix}.csv',
+            f'results/tables/backtest_by_horizon_{engine}{suffix}.csv')
+
+
+def run_backtest(args, keys):
+    """Rolling-origin backtest of one engine; metrics per SKU and per horizon day."""
+    series, labels = backtest.load_series(keys)
+    if not series:
+        print(f"⚠️ No {level_name(keys)}-level cleaned series – run 01 with --keys {args.keys}")
+        return
+
+    if args.cutoffs:
+        cutoffs = [pd.Timestamp(c) for c in args.cutoffs.split(",")]
+    else:
+        first = min(f["ds"].min() for f in series.values())
+        last = max(f["ds"].max() for f in series.values())
+        cutoffs = backtest.rolling_cutoffs(first, last, args.horizon, args.step, args.initial)
+    if not cutoffs:
+        print(f"⚠️ History too short for a {args.horizon}-day horizon after {args.initial} days of training")
+        return
+    print(f"🔁 Backtesting {len(series)} series with the {args.engine} engine: {len(cutoffs)} cutoffs "
+          f"({cutoffs[0].date()} … {cutoffs[-1].date()}), {args.horizon}-day horizon")
+
+    festivals = sku_store.read_table("festival_dates") if args.engine == "batch" else None
+    tasks = backtest.plan_folds(series, cutoffs, args.horizon, args.engine, keys, festivals)
+    folds, cached, failures = backtest.run_folds(tasks, args.workers, args.force)
+    print(f"♻️ Reused {cached} cached folds, computed {len(tasks) - cached}")
+    for label, error in failures:
+        print(f"\n❌ {label}\n{error}")
+    if folds.empty:
+        print("⚠️ No fold produced predictions")
+        raise SystemExit(1)
+
+    by_sku = backtest.metric_table(folds, ["series"])
+    by_sku = pd.concat([pd.DataFrame([labels[s] for s in by_sku.pop("series")]), by_sku], axis=1)
+    by_horizon = backtest.metric_table(folds, ["horizon_day"]).rename(columns={"horizon_day": "Horizon Day"})
+
+    sku_path, horizon_path = backtest_paths(args.engine, keys)
+    os.makedirs(os.path.dirname(sku_path), exist_ok=True)
+    by_sku.to_csv(sku_path, index=False)
+    by_horizon.to_csv(horizon_path, index=False)
+
+    print(by_horizon.to_string(index=False))
+    print(f"✅ Backtest saved to {sku_path} and {horizon_path}")
+    if failures:
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score each SKU's forecast against its actuals.")
+    parser.add_argument("--keys", default=",".join(DEFAULT_KEYS),
+                        help="series keys to evaluate at, e.g. Product_Name,Location (default: Product_Name)")
+    parser.add_argument("--force", action="store_true",
+                        help="rescore every SKU even if its actuals and forecast are unchanged")
+    bt = parser.add_argument_group("rolling-origin backtest")
+    bt.add_argument("--backtest", action="store_true",
+                    help="refit at rolling cutoffs and score the following days instead of the stored forecast")
+    bt.add_argument("--engine", choices=sorted(backtest.ENGINE_CONFIGS), default="batch",
+                    help="engine to backtest (default: batch)")
+    bt.add_argument("--horizon", type=int, default=backtest.DEFAULT_HORIZON,
+                    help=f"days scored after each cutoff (default: {backtest.DEFAULT_HORIZON})")
+    bt.add_argument("--step", type=int, default=backtest.DEFAULT_STEP,
+                    help=f"days between cutoffs (default: {backtest.DEFAULT_STEP})")
+    bt.add_argument("--initial", type=int, default=backtest.DEFAULT_INITIAL,
+                    help=f"days of history before the first cutoff (default: {backtest.DEFAULT_INITIAL})")
+    bt.add_argument("--cutoffs", help="explicit comma-separated cutoff dates, e.g. 2024-07-31,2024-08-10")
+    bt.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                    help="worker processes for the folds (default: CPU count)")
+    args = parser.parse_args()
+    keys = parse_keys(args.keys)
+    if args.backtest:
+        run_backtest(args, keys)
+        return
+    stage = "evaluation" + (f"_{level_name(keys)}" if extra_keys(keys) else "")
+    out_path = summary_path(keys)
+
+    manifest = Manifest()
+    log = run_log.StageLog("evaluate", level_name(keys))
+    results = []
+    skipped = recomputed = 0
+
+    for product_name in sku_store.list_skus(dataset_name("cleaned", keys)):
+        forecast_path = sku_store.series_path(dataset_name("forecast", keys), product_name)
+        if forecast_path is None:
+            continue
+
+        # Reuse the stored metric rows if neither input changed
+        digest = combined_digest(file_digest(sku_store.series_path(dataset_name("cleaned", keys), product_name)),
+                                 file_digest(forecast_path))
+        entry = manifest.get(stage, product_name)
+        if not args.force and manifest.is_fresh(stage, product_name, digest) and "metrics" in entry:
+            metrics = entry["metrics"]
+            results.extend([metrics] if isinstance(metrics, dict) else metrics)
+            skipped += 1
+            continue
+
+        start = time.perf_counter()
+        rows = evaluate_product(product_name, keys)
+        log.sku(product_name, total_s=time.perf_counter() - start, rows=len(rows))
+        if not rows:
+            print(f"⚠️ {product_name}: forecast holds no fitted history to score (02 --history-days 0?)")
+        manifest.record(stage, product_name, digest, metrics=rows)
+        results.extend(rows)
+        recomputed += 1
+
+    log.cache_hits, log.cache_misses = skipped, recomputed
+    if not results:
+        print(f"⚠️ No {level_name(keys)}-level forecasts to evaluate – run 01 and 02 with --keys {args.keys}")
+        log.close()
+        return
+
+    # Convert to DataFrame and save
+    results_df = pd.DataFrame(results)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    results_df.to_csv(out_path, index=False)
+    manifest.save()
+    log.rows = len(results_df)
+    log.close()
+
+    print(f"♻️ Skipped {skipped} unchanged SKUs, recomputed {recomputed}")
+    print(f"✅ Evaluation saved to {out_path}")
+
 
-print("✅ Evaluation saved to results/tables/accuracy_summary.csv")
-results_df.head()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+backtest.py
+Rolling-origin backtesting for the forecast engines.
+
+Every series is cut off at a set of origins; the engine is fitted on the
+history up to each cutoff and scored on the following ``horizon`` days:
+
+    cutoff 1   train ██████████|░░░░ horizon
+    cutoff 2   train ███████████████|░░░░
+    cutoff 3   train ████████████████████|░░░░     (cutoffs ``step`` days apart)
+
+Folds run in parallel. Each fold's predictions are cached on disk under a
+digest of its training/scoring data and the engine settings, so re-running
+after new days arrive only fits the new cutoffs. Metrics are reported per
+SKU and per horizon day; MAPE leaves out days with zero actual demand.
+
+    python notebook/03_evaluation_metrics.py --backtest --engine batch --horizon 14 --step 7
+"""
+
+import hashlib
+import logging
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import prophet
+from prophet import Prophet
+
+import batch_engine
+import sku_store
+from pipeline_cache import combined_digest
+from series_keys import DEFAULT_KEYS, dataset_name, extra_keys, level_name, split_series
+
+FOLD_DIR = sku_store.STORE_DIR / "backtest_folds"
+
+DEFAULT_HORIZON = 14
+DEFAULT_STEP    = 7
+DEFAULT_INITIAL = 28   # days of history the first cutoff needs
+
+ENGINE_CONFIGS = {
+    "prophet": {"model": "prophet", "prophet_version": prophet.__version__},
+    "batch": batch_engine.ENGINE_CONFIG,
+}
+
+
+def rolling_cutoffs(first, last, horizon=DEFAULT_HORIZON, step=DEFAULT_STEP, initial=DEFAULT_INITIAL):
+    """Cutoffs ``step`` days apart, the latest leaving a full ``horizon`` after it, oldest first."""
+    cutoffs = []
+    cutoff = pd.Timestamp(last) - pd.Timedelta(days=horizon)
+    while cutoff >= pd.Timestamp(first) + pd.Timedelta(days=initial - 1):
+        cutoffs.append(cutoff)
+        cutoff -= pd.Timedelta(days=step)
+    return cutoffs[::-1]
+
+
+def load_series(keys=DEFAULT_KEYS):
+    """Every cleaned series at this level → ``({series id: DataFrame(ds, y)}, {series id: labels})``."""
+    extra = extra_keys(keys)
+    series, labels = {}, {}
+    cleaned = dataset_name("cleaned", keys)
+    for product_name in sku_store.list_skus(cleaned):
+        df = sku_store.read_series(cleaned, product_name)
+        for sid, key_values, frame in split_series(df, product_name, keys):
+            series[sid] = frame.dropna(subset=["y"]).reset_index(drop=True)
+            labels[sid] = {"Product": product_name.replace('_', ' ').title(),
+                           **{k: key_values[k] for k in extra}}
+    return series, labels
+
+
+def _data_digest(frames):
+    """sha256 over ``{name: DataFrame}`` contents, independent of dict order."""
+    h = hashlib.sha256()
+    for name in sorted(frames):
+        h.update(name.encode("utf-8"))
+        h.update(pd.util.hash_pandas_object(frames[name], index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def fold_path(engine, keys, digest):
+    return FOLD_DIR / level_name(keys) / engine / f"{digest}.parquet"
+
+
+def _window(frame, cutoff, horizon):
+    """History up to ``cutoff`` and actuals for the ``horizon`` days after it."""
+    end = cutoff + pd.Timedelta(days=horizon)
+    return frame[frame["ds"] <= cutoff], frame[(frame["ds"] > cutoff) & (frame["ds"] <= end)]
+
+
+def _fold_frame(name, cutoff, actual, yhat, lower, upper):
+    return pd.DataFrame({
+        "series": name,
+        "cutoff": cutoff,
+        "ds": actual["ds"].to_numpy(),
+        "horizon_day": (actual["ds"] - cutoff).dt.days.to_numpy(),
+        "y": actual["y"].to_numpy(),
+        "yhat": yhat,
+        "yhat_lower": lower,
+        "yhat_upper": upper,
+    })
+
+
+def run_prophet_fold(name, frame, cutoff, horizon):
+    """One Prophet fit on ``frame`` up to ``cutoff``, scored on the next ``horizon`` days."""
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    train, actual = _window(frame, cutoff, horizon)
+    if len(train) < 2 or actual.empty:
+        return _fold_frame(name, cutoff, actual.iloc[:0], [], [], [])
+    model = Prophet().fit(train)
+    pred = model.predict(actual[["ds"]])
+    return _fold_frame(name, cutoff, actual, pred["yhat"].to_numpy(),
+                       pred["yhat_lower"].to_numpy(), pred["yhat_upper"].to_numpy())
+
+
+def run_batch_fold(series, cutoff, horizon, festivals=None):
+    """All series fitted in one batch solve up to ``cutoff``, scored on the next ``horizon`` days."""
+    train, actual = {}, {}
+    for name, frame in series.items():
+        history, future = _window(frame, cutoff, horizon)
+        if len(history) >= 2 and not future.empty:
+            train[name], actual[name] = history, future
+    if not train:
+        return _fold_frame("", cutoff, pd.DataFrame({"ds": pd.to_datetime([]), "y": []}), [], [], [])
+
+    # Forecast frames run to each series' own history end + horizon; score on the actual days
+    frames, *_ = batch_engine.forecast_frames(train, horizon, festivals)
+    parts = []
+    for name in train:
+        pred = actual[name].merge(frames[name], on="ds", how="left")
+        parts.append(_fold_frame(name, cutoff, actual[name], pred["yhat"].to_numpy(),
+                                 pred["yhat_lower"].to_numpy(), pred["yhat_upper"].to_numpy()))
+    return pd.concat(parts, ignore_index=True)
+
+
+def _cached_fold(path, func, *args):
+    """Run one fold, persisting its predictions at ``path`` (runs in a worker process)."""
+    try:
+        folds = func(*args)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        folds.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+        return folds, None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+def plan_folds(series, cutoffs, horizon, engine="batch", keys=DEFAULT_KEYS, festivals=None):
+    """``[(label, cache path, func, args), ...]`` – one task per cutoff (batch) or per series × cutoff (prophet)."""
+    config = ENGINE_CONFIGS[engine]
+    if engine == "batch" and festivals is not None:
+        festivals = festivals[["Date", "Festival_Name"]]
+        config = {**config, "festivals": _data_digest({"festival_dates": festivals})}
+    tasks = []
+    for cutoff in cutoffs:
+        end = cutoff + pd.Timedelta(days=horizon)
+        if engine == "batch":
+            window = {n: f[f["ds"] <= end] for n, f in series.items()}
+            digest = combined_digest(config, str(cutoff.date()), horizon, _data_digest(window))
+            tasks.append((f"{cutoff.date()}", fold_path(engine, keys, digest),
+                          run_batch_fold, (window, cutoff, horizon, festivals)))
+        else:
+            for name, frame in series.items():
+                window = frame[frame["ds"] <= end]
+                digest = combined_digest(config, str(cutoff.date()), horizon, _data_digest({name: window}))
+                tasks.append((f"{name} @ {cutoff.date()}", fold_path(engine, keys, digest),
+                              run_prophet_fold, (name, window, cutoff, horizon)))
+    return tasks
+
+
+def run_folds(tasks, workers=1, force=False):
+    """Predictions of every task (cached ones read back) → ``(DataFrame, n cached, failures)``."""
+    parts, failures = [], []
+    todo = []
+    for label, path, func, args in tasks:
+        if not force and path.exists():
+            parts.append(pd.read_parquet(path))
+        else:
+            todo.append((label, path, func, args))
+    cached = len(tasks) - len(todo)
+
+    workers = max(1, min(workers, len(todo)))
+    if workers == 1:
+        outcomes = [_cached_fold(path, func, *args) for _, path, func, args in todo]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_cached_fold, path, func, *args) for _, path, func, args in todo]
+            outcomes = []
+            for future in futures:
+                try:
+                    outcomes.append(future.result())
+                except Exception:
+                    # Worker process died (e.g. killed by the OOM killer)
+                    outcomes.append((None, traceback.format_exc()))
+    for (label, *_), (folds, error) in zip(todo, outcomes):
+        if error is None:
+            parts.append(folds)
+        else:
+            failures.append((label, error))
+
+    parts = [p for p in parts if not p.empty]
+    folds = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+    return folds, cached, failures
+
+
+def metric_table(folds, by):
+    """MAE / RMSE / MAPE (%) and 80% interval coverage per ``by`` group of fold predictions.
+
+    MAPE is taken over days with non-zero actual demand only (NaN if a group
+    has none).
+    """
+    err = folds["y"] - folds["yhat"]
+    nonzero = folds["y"] != 0
+    parts = pd.DataFrame({
+        "abs": err.abs(),
+        "sq": err ** 2,
+        "ape": (err.abs() / folds["y"].abs()).where(nonzero),
+        "covered": ((folds["y"] >= folds["yhat_lower"]) & (folds["y"] <= folds["yhat_upper"])).astype(float),
+        "cutoff": folds["cutoff"],
+    })
+    grouped = parts.groupby([folds[c] for c in by], sort=True)
+    table = pd.DataFrame({
+        "Folds": grouped["cutoff"].nunique(),
+        "Days": grouped["abs"].size(),
+        "MAE": grouped["abs"].mean().round(2),
+        "RMSE": np.sqrt(grouped["sq"].mean()).round(2),
+        "MAPE (%)": (grouped["ape"].mean() * 100).round(2),
+        "Coverage (%)": (grouped["covered"].mean() * 100).round(1),
+    })
+    return table.reset_index()
@@ -0,0 +1,236 @@
+"""
+batch_engine.py
+Vectorized forecasting engine – a fast alternative to fitting Prophet per SKU.
+
+Every series is modelled the way Prophet's defaults do, but as a linear model:
+
+    y(t) = a + b·t + Σ_j δ_j·max(0, t − c_j)      piecewise-linear trend
+         + weekly / yearly Fourier terms           (auto-enabled like Prophet)
+         + one dummy per festival name             (from festival_dates)
+         + ε
+
+All series share one design matrix, so the whole catalogue is solved with a
+handful of batched (ridge) least-squares solves – one per distinct pattern of
+missing days – instead of one Stan optimisation per series. Prediction
+intervals are analytic: σ·√(1 + x'(X'X + Λ)⁻¹x) from the residual variance.
+
+    spec = make_spec(dates, festivals)
+    fit  = fit_batch(spec, dates, Y)          # Y: (days, series), NaN = missing
+    yhat, lower, upper = predict_batch(spec, fit, future_dates)
+"""
+
+import json
+from functools import lru_cache
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+INTERVAL_WIDTH    = 0.80   # same default as Prophet
+N_CHANGEPOINTS    = 25
+CHANGEPOINT_RANGE = 0.8    # changepoints only in the first 80% of history
+WEEKLY_ORDER      = 3
+YEARLY_ORDER      = 10
+
+# Ridge penalties on the (max|y|-scaled) coefficients; intercept and slope are free
+CHANGEPOINT_PENALTY  = 1.0
+SEASONALITY_PENALTY  = 0.1
+FESTIVAL_PENALTY     = 1.0
+
+ENGINE_CONFIG = {
+    "model": "batch",
+    "interval_width": INTERVAL_WIDTH,
+    "n_changepoints": N_CHANGEPOINTS,
+    "changepoint_range": CHANGEPOINT_RANGE,
+    "weekly_order": WEEKLY_ORDER,
+    "yearly_order": YEARLY_ORDER,
+    "penalties": [CHANGEPOINT_PENALTY, SEASONALITY_PENALTY, FESTIVAL_PENALTY],
+}
+
+
+def make_spec(dates, festivals=None):
+    """Design specification (JSON-serializable) for a history spanning ``dates``.
+
+    ``festivals`` is a frame with ``Date`` and ``Festival_Name`` columns.
+    """
+    dates = pd.DatetimeIndex(dates)
+    start, end = dates.min(), dates.max()
+    span_days = max((end - start).days, 1)
+
+    fest = {}
+    if festivals is not None and not festivals.empty:
+        for name, grp in festivals.groupby("Festival_Name"):
+            fest[str(name)] = sorted(pd.to_datetime(grp["Date"]).dt.strftime("%Y-%m-%d").unique())
+
+    return {
+        "start": start.strftime("%Y-%m-%d"),
+        "span_days": span_days,
+        "changepoints": np.linspace(0, CHANGEPOINT_RANGE, N_CHANGEPOINTS + 1)[1:].tolist(),
+        # Prophet's auto rules: weekly needs two weeks of history, yearly two years
+        "weekly_order": WEEKLY_ORDER if span_days >= 14 else 0,
+        "yearly_order": YEARLY_ORDER if span_days >= 730 else 0,
+        "festivals": fest,
+    }
+
+
+def _fourier(days, period, order):
+    x = 2 * np.pi * np.outer(days, np.arange(1, order + 1)) / period
+    return np.hstack([np.sin(x), np.cos(x)])
+
+
+def design_matrix(spec, dates):
+    """(len(dates), P) design matrix and the (P,) ridge penalty vector.
+
+    Contiguous daily ranges – every history grid and forecast window – are
+    cached per (spec, first day, length), so a fit, its prediction and every
+    backtest fold on the same cutoff build each matrix once. Cached arrays
+    are read-only.
+    """
+    dates = pd.DatetimeIndex(dates)
+    if len(dates) > 2 and dates.inferred_freq == "D":
+        return _daily_design(json.dumps(spec, sort_keys=True), dates[0], len(dates))
+    return _build_design(spec, dates)
+
+
+@lru_cache(maxsize=64)
+def _daily_design(spec_json, start, periods):
+    X, penalty = _build_design(json.loads(spec_json), pd.date_range(start, periods=periods, freq="D"))
+    X.setflags(write=False)
+    penalty.setflags(write=False)
+    return X, penalty
+
+
+def _build_design(spec, dates):
+    days = (dates - pd.Timestamp(spec["start"])).days.to_numpy(dtype=float)
+    t = days / spec["span_days"]
+
+    blocks = [np.ones((len(t), 1)), t[:, None]]
+    penalty = [0.0, 0.0]
+
+    cps = np.asarray(spec["changepoints"])
+    blocks.append(np.maximum(0.0, t[:, None] - cps[None, :]))
+    penalty += [CHANGEPOINT_PENALTY] * len(cps)
+
+    # Fourier terms on absolute day number so weekly phase is calendar-aligned
+    epoch_days = (dates - pd.Timestamp("1970-01-01")).days.to_numpy(dtype=float)
+    for period, order in ((7.0, spec["weekly_order"]), (365.25, spec["yearly_order"])):
+        if order:
+            blocks.append(_fourier(epoch_days, period, order))
+            penalty += [SEASONALITY_PENALTY] * (2 * order)
+
+    iso = dates.strftime("%Y-%m-%d")
+    for fest_days in spec["festivals"].values():
+        blocks.append(np.isin(iso, fest_days).astype(float)[:, None])
+        penalty.append(FESTIVAL_PENALTY)
+
+    return np.hstack(blocks), np.asarray(penalty)
+
+
+def trend_columns(spec):
+    """Number of leading design columns that make up the trend."""
+    return 2 + len(spec["changepoints"])
+
+
+def fit_batch(spec, dates, Y):
+    """Fit every column of ``Y`` (days × series, NaN = missing) at once.
+
+    Series are grouped by their pattern of observed days; each group needs a
+    single P×P solve no matter how many series share it.
+    """
+    X, penalty = design_matrix(spec, dates)
+    Y = np.asarray(Y, dtype=float)
+    observed = ~np.isnan(Y)
+
+    scale = np.nanmax(np.abs(Y), axis=0)
+    scale = np.where((scale > 0) & np.isfinite(scale), scale, 1.0)
+    Ys = np.where(observed, Y / scale, 0.0)
+
+    n_series, n_params = Y.shape[1], X.shape[1]
+    beta = np.zeros((n_series, n_params))
+    sigma = np.zeros(n_series)
+
+    patterns, pattern_of = np.unique(observed.T, axis=0, return_inverse=True)
+    pattern_of = pattern_of.ravel()
+    ainv = np.zeros((len(patterns), n_params, n_params))
+
+    for k, rows in enumerate(patterns):
+        cols = np.flatnonzero(pattern_of == k)
+        Xk = X[rows]
+        A = Xk.T @ Xk + np.diag(penalty)
+        ainv[k] = np.linalg.pinv(A, hermitian=True)
+        B = ainv[k] @ (Xk.T @ Ys[rows][:, cols])            # (P, series in group)
+        beta[cols] = B.T
+
+        resid = Ys[rows][:, cols] - Xk @ B
+        dof = max(rows.sum() - np.trace(Xk @ ainv[k] @ Xk.T), 1.0)
+        sigma[cols] = np.sqrt((resid ** 2).sum(axis=0) / dof)
+
+    return {
+        "beta": beta * scale[:, None],
+        "sigma": sigma * scale,
+        "pattern": pattern_of,
+        "ainv": ainv,
+    }
+
+
+def predict_batch(spec, fit, dates, series=None, interval_width=INTERVAL_WIDTH):
+    """yhat, yhat_lower, yhat_upper as (len(dates), series) arrays.
+
+    ``series`` optionally selects columns (indices into the fit).
+    """
+    X, _ = design_matrix(spec, dates)
+    idx = np.arange(len(fit["sigma"])) if series is None else np.atleast_1d(series)
+
+    yhat = X @ fit["beta"][idx].T
+    # Parameter variance per pattern: x' A⁻¹ x for every date
+    leverage = np.einsum("tp,kpq,tq->kt", X, fit["ainv"], X)
+    se = fit["sigma"][idx] * np.sqrt(1.0 + leverage[fit["pattern"][idx]].T)
+    z = NormalDist().inv_cdf(0.5 + interval_width / 2)
+    return yhat, yhat - z * se, yhat + z * se
+
+
+def predict_trend(spec, fit, dates, series=None):
+    X, _ = design_matrix(spec, dates)
+    idx = np.arange(len(fit["sigma"])) if series is None else np.atleast_1d(series)
+    n = trend_columns(spec)
+    return X[:, :n] @ fit["beta"][idx, :n].T
+
+
+def forecast_frames(series, periods, festivals=None):
+    """Fit ``{name: DataFrame(ds, y)}`` in one batch and forecast ``periods`` days past the end.
+
+    Returns ``(frames, spec, fit, names, history_end)`` where each frame holds the
+    series' own history dates plus its forecast window, with the columns
+    ds, trend, yhat_lower, yhat_upper, yhat.
+    """
+    names = list(series)
+    wide = pd.concat(
+        {n: df.set_index("ds")["y"].groupby(level=0).mean() for n, df in series.items()}, axis=1
+    ).sort_index()
+    grid = pd.date_range(wide.index.min(), wide.index.max(), freq="D")
+    wide = wide.reindex(grid)[names]
+
+    spec = make_spec(grid, festivals)
+    fit = fit_batch(spec, grid, wide.to_numpy())
+
+    full = pd.date_range(grid[0], grid[-1] + pd.Timedelta(days=periods), freq="D")
+    yhat, lower, upper = predict_batch(spec, fit, full)
+    trend = predict_trend(spec, fit, full)
+
+    observed = wide.notna().to_numpy()
+    history_end = {}
+    frames = {}
+    for j, name in enumerate(names):
+        last = grid[np.flatnonzero(observed[:, j])[-1]]
+        history_end[name] = last
+        keep = np.zeros(len(full), dtype=bool)
+        keep[:len(grid)] = observed[:, j]
+        keep |= (full > last) & (full <= last + pd.Timedelta(days=periods))
+        frames[name] = pd.DataFrame({
+            "ds": full[keep],
+            "trend": trend[keep, j],
+            "yhat_lower": lower[keep, j],
+            "yhat_upper": upper[keep, j],
+            "yhat": yhat[keep, j],
+        })
+    return frames, spec, fit, names, history_end
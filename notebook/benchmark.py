@@ -0,0 +1,293 @@
+"""
+benchmark.py
+Timing and memory baseline for the pipeline stages and the dashboard's data paths.
+
+For every case of the grid (SKU count × days of history) a raw extract of
+that size is built in a temporary workspace. The stages then run there in
+pipeline order, each as its own process:
+
+    preprocess (01) → reports (generating_csv) → forecast (02) → evaluate (03)
+    → dashboard_load / dashboard_aggregate / dashboard_chart
+
+The dashboard steps replay what Home.py does on a cold cache: load every
+SKU's forecast, the tables and the stock index through data_access, build
+the portfolio index and horizon totals, and prepare every chart. For each
+stage the suite records wall time, peak RSS (the process's ``ru_maxrss``;
+cumulative within the dashboard process) and rows processed.
+
+Every run appends one JSON line per (case, stage) to
+results/benchmarks/history.jsonl. ``--save-baseline`` stores the run as
+results/benchmarks/baseline.json. Later runs, or ``--compare`` on a recorded
+run, flag a stage as a regression when it is more than ``--tolerance``
+slower or larger than the baseline, ignoring differences under
+``MIN_SECONDS`` / ``MIN_MB``.
+
+Each case's extract comes from synthetic_extract.py with a fixed seed, so
+every run of a case reads the same rows (one per SKU and day unless
+``--locations`` / ``--channels`` ask for more).
+
+    python notebook/benchmark.py --skus 10,40 --days 92,184 --save-baseline
+    python notebook/benchmark.py --skus 10,40 --days 92,184      # … after a change: flags regressions
+    python notebook/benchmark.py --compare latest
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import raw_schema
+import synthetic_extract
+
+NOTEBOOK_DIR = Path(__file__).resolve().parent
+DASHBOARD_DIR = NOTEBOOK_DIR.parent / "dashboard"
+BENCH_DIR = Path("results/benchmarks")
+HISTORY = BENCH_DIR / "history.jsonl"
+BASELINE = BENCH_DIR / "baseline.json"
+
+TOLERANCE = 0.25      # flag anything 25% slower / larger than the baseline …
+MIN_SECONDS = 0.10    # … unless it differs by less than this …
+MIN_MB = 10.0         # … or this
+HORIZONS = (7, 14, 30, 60)   # the Forecast tab's horizon choices
+
+
+# ───── STAGES ─────
+def pipeline_stages(engine, workers):
+    """(stage, argv) in pipeline order."""
+    forecast = ["02_prophet_forecasting.py", "--engine", engine]
+    if workers:
+        forecast += ["--workers", str(workers)]
+    return [
+        ("preprocess", ["01_data_preprocessing.py"]),
+        ("reports", ["generating_csv.py"]),
+        ("forecast", forecast),
+        ("evaluate", ["03_evaluation_metrics.py"]),
+        ("risk", ["spoilage_sim.py"]),
+        ("replenish", ["replenishment.py"]),
+    ]
+
+
+def run_process(argv, cwd, log, capture=False):
+    """Run ``argv`` in ``cwd`` with its output in ``log``; returns (exit code, wall seconds, peak RSS in MB, stdout).
+
+    Only with ``capture`` is stdout returned instead of logged.
+    """
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, *map(str, argv)], cwd=cwd, text=True,
+                            stdout=subprocess.PIPE if capture else log, stderr=log)
+    out = proc.stdout.read() if capture else ""
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return proc.returncode, time.perf_counter() - start, usage.ru_maxrss / 1024, out
+
+
+def probe_dashboard():
+    """Replay the dashboard's cold-cache data paths in this process; one JSON line per step."""
+    sys.path.insert(0, str(DASHBOARD_DIR))
+    import chart_data
+    import data_access as da
+    import portfolio_index
+    import sku_store
+
+    def emit(stage, start, rows):
+        print(json.dumps({"stage": stage, "wall_s": time.perf_counter() - start, "rows": rows,
+                          "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}), flush=True)
+
+    start = time.perf_counter()
+    skus = da.list_skus("forecast")
+    forecasts = {sku: da.load_series("forecast", sku, sku_store.FORECAST_COLUMNS) for sku in skus}
+    festivals = da.load_table("festival_dates")
+    da.load_table("spoilage_summary")
+    stock = da.load_stock_index()
+    emit("dashboard_load", start, len(skus))
+
+    start = time.perf_counter()
+    portfolio_index.build_index(festivals)
+    ends = portfolio_index._history_end(skus)
+    for sku, df in forecasts.items():
+        future = df[df["ds"] > ends[sku]]
+        [future.head(h)["yhat"].sum() for h in HORIZONS]
+        stock.latest(sku)
+    emit("dashboard_aggregate", start, len(skus))
+
+    start = time.perf_counter()
+    fest_dates = festivals["Date"] if festivals is not None else None
+    for sku, df in forecasts.items():
+        chart_data.prepare_chart(df, stock.series(sku), fest_dates)
+    emit("dashboard_chart", start, len(skus))
+
+
+def run_case(skus, days, engine, workers, log, locations=1, channels=1):
+    """Every stage on one scaled extract; returns the stage records."""
+    records = []
+    with tempfile.TemporaryDirectory(prefix="bench_") as tmp:
+        (Path(tmp) / "data").mkdir()
+        raw_rows = synthetic_extract.write(Path(tmp) / raw_schema.SOURCE_FILE, skus, locations, channels, days)
+        rows = {"preprocess": raw_rows, "reports": raw_rows, "forecast": skus, "evaluate": skus, "risk": skus,
+                "replenish": skus * locations}   # one series per SKU × location (replenishment's default keys)
+        for stage, argv in pipeline_stages(engine, workers):
+            print(f"   {stage:<20}", end="", flush=True)
+            log.write(f"\n### {skus} SKUs × {days} days: {stage}\n")
+            log.flush()
+            code, wall, rss, _ = run_process([NOTEBOOK_DIR / argv[0], *argv[1:]], tmp, log)
+            records.append({"stage": stage, "wall_s": wall, "peak_rss_mb": rss, "rows": rows[stage],
+                            "ok": code == 0})
+            print(f"{wall:8.2f}s {rss:8.1f} MB" + ("" if code == 0 else "  ❌ failed"))
+            if code != 0:
+                return records
+
+        log.write(f"\n### {skus} SKUs × {days} days: dashboard\n")
+        log.flush()
+        code, _, _, out = run_process([Path(__file__).resolve(), "--probe-dashboard"], tmp, log, capture=True)
+        steps = [json.loads(line) for line in out.splitlines() if line.startswith("{")]
+        for step in steps:
+            records.append({**step, "ok": code == 0})
+            print(f"   {step['stage']:<20}{step['wall_s']:8.2f}s {step['peak_rss_mb']:8.1f} MB")
+        if code != 0 or not steps:
+            records.append({"stage": "dashboard", "wall_s": 0.0, "peak_rss_mb": 0.0, "rows": 0, "ok": False})
+            print("   dashboard              ❌ failed")
+    return records
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=NOTEBOOK_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ───── HISTORY ─────
+def load_history():
+    if not HISTORY.exists():
+        return pd.DataFrame()
+    return pd.DataFrame([json.loads(line) for line in HISTORY.read_text().splitlines() if line.strip()])
+
+
+def append_history(records):
+    HISTORY.parent.mkdir(parents=True, exist_ok=True)
+    with open(HISTORY, "a") as fh:
+        for record in records:
+            fh.write(json.dumps(record) + "\n")
+
+
+def select_run(history, run):
+    """Records of ``run`` (a run ID or "latest")."""
+    if history.empty:
+        raise SystemExit(f"❌ No benchmark history in {HISTORY}")
+    if run == "latest":
+        run = history["run"].iloc[-1]
+    selected = history[history["run"] == run]
+    if selected.empty:
+        raise SystemExit(f"❌ No run {run!r} in {HISTORY}")
+    return selected
+
+
+def compare(current, baseline, tolerance=TOLERANCE):
+    """Per (case, stage): baseline vs current time and memory, and whether it regressed."""
+    key = ["engine", "locations", "channels", "skus", "days", "stage"]
+    merged = current.merge(baseline, on=key, how="left", suffixes=("", "_base"))
+    slower = ((merged["wall_s"] > merged["wall_s_base"] * (1 + tolerance))
+              & (merged["wall_s"] - merged["wall_s_base"] > MIN_SECONDS))
+    larger = ((merged["peak_rss_mb"] > merged["peak_rss_mb_base"] * (1 + tolerance))
+              & (merged["peak_rss_mb"] - merged["peak_rss_mb_base"] > MIN_MB))
+    merged["status"] = np.select(
+        [~merged["ok"].astype(bool), slower & larger, slower, larger, merged["wall_s_base"].isna()],
+        ["FAILED", "SLOWER+LARGER", "SLOWER", "LARGER", "new"], "ok")
+    merged["time_%"] = 100 * (merged["wall_s"] / merged["wall_s_base"] - 1)
+    merged["rss_%"] = 100 * (merged["peak_rss_mb"] / merged["peak_rss_mb_base"] - 1)
+    return merged[[*key, "wall_s_base", "wall_s", "time_%", "peak_rss_mb_base", "peak_rss_mb", "rss_%", "status"]]
+
+
+def report_comparison(current, tolerance):
+    """Print the comparison against the saved baseline; returns True if anything regressed."""
+    if not BASELINE.exists():
+        print("\nℹ️ No baseline yet – save one with --save-baseline")
+        return False
+    baseline = pd.DataFrame(json.loads(BASELINE.read_text())["records"])
+    table = compare(current, baseline, tolerance)
+    print(f"\n📏 Against baseline run {baseline['run'].iloc[0]} (tolerance {tolerance:.0%})")
+    print(table.to_string(index=False, float_format=lambda v: f"{v:.2f}", na_rep="—"))
+    regressed = table[table["status"].isin(["SLOWER", "LARGER", "SLOWER+LARGER", "FAILED"])]
+    if not regressed.empty:
+        print(f"\n❌ {len(regressed)} regression(s)")
+        return True
+    print("\n✅ No regressions")
+    return False
+
+
+def save_baseline(records):
+    BASELINE.parent.mkdir(parents=True, exist_ok=True)
+    BASELINE.write_text(json.dumps({"saved_at": datetime.now().isoformat(timespec="seconds"),
+                                    "records": records}, indent=2))
+    print(f"📌 Baseline saved to {BASELINE}")
+
+
+def _ints(text):
+    return [int(v) for v in text.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages and dashboard data paths.")
+    parser.add_argument("--skus", type=_ints, default=[10, 40], help="SKU counts, comma-separated (default: 10,40)")
+    parser.add_argument("--days", type=_ints, default=[92, 184],
+                        help="days of history, comma-separated (default: 92,184)")
+    parser.add_argument("--engine", choices=["prophet", "batch"], default="prophet",
+                        help="forecast engine for 02 (default: prophet)")
+    parser.add_argument("--workers", type=int, help="worker processes for 02 (default: its own default)")
+    parser.add_argument("--locations", type=int, default=1, help="locations per SKU in the extract (default: 1)")
+    parser.add_argument("--channels", type=int, default=1, help="sales channels per location (default: 1)")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help=f"relative slowdown / growth flagged as a regression (default: {TOLERANCE})")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--compare", metavar="RUN",
+                        help="compare a recorded run (ID or 'latest') with the baseline instead of running")
+    parser.add_argument("--probe-dashboard", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe_dashboard:
+        probe_dashboard()
+        return
+    if args.compare:
+        current = select_run(load_history(), args.compare)
+        if args.save_baseline:
+            save_baseline(current.to_dict("records"))
+        if report_comparison(current, args.tolerance):
+            raise SystemExit(1)
+        return
+
+    run = {"run": uuid.uuid4().hex[:8], "time": datetime.now().isoformat(timespec="seconds"),
+           "commit": _commit(), "host": platform.node(), "python": platform.python_version(),
+           "cpus": os.cpu_count(), "engine": args.engine, "locations": args.locations, "channels": args.channels}
+    BENCH_DIR.mkdir(parents=True, exist_ok=True)
+    log_path = BENCH_DIR / f"{run['run']}.log"
+    records = []
+    with open(log_path, "w") as log:
+        for skus in args.skus:
+            for days in args.days:
+                print(f"⏱️ {skus} SKUs × {days} days")
+                for record in run_case(skus, days, args.engine, args.workers, log, args.locations, args.channels):
+                    records.append({**run, "skus": skus, "days": days, **record})
+    append_history(records)
+    print(f"\n🗂️ Run {run['run']} appended to {HISTORY} (stage output: {log_path})")
+
+    if args.save_baseline:
+        save_baseline(records)
+    regressed = report_comparison(pd.DataFrame(records), args.tolerance)
+    if regressed or not all(r["ok"] for r in records):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+chunked_ingest.py
+Out-of-core ingestion of the raw sales extract.
+
+The raw file is read in chunks of ``CHUNK_ROWS`` rows. Each chunk is reduced
+to partial aggregates that merge exactly – sums and counts rather than
+means, the latest day rather than a sorted history, distinct festival days
+rather than rows – and folded into a running total, so memory is bounded by
+the size of the outputs (series × days, products, months × categories, ...)
+and not by the input. The row-level stock_levels table is streamed straight
+to Parquet, one part file per chunk.
+
+    daily_series(path, keys)        → smoothed daily Units_Sold per series (01)
+    build_reports(path)             → the five generating_csv.py summary tables
+
+The running totals are also what incremental_ingest.py persists to append
+new days without re-reading the history.
+
+Both give the same frames as the old whole-file ``pd.read_csv`` versions.
+
+    python notebook/chunked_ingest.py --chunksize 100000 --max-mb 512 --verify
+"""
+
+import argparse
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import raw_schema
+import sku_store
+from series_keys import ALLOWED_KEYS, DEFAULT_KEYS, parse_keys, sku_slug
+
+SOURCE_FILE = raw_schema.SOURCE_FILE
+CHUNK_ROWS  = 250_000
+
+PRODUCT_COLS = ["Product_ID", "Product_Name", "Category"]
+STOCK_COLUMNS = ["Date", *PRODUCT_COLS, "Ending_Stock"]
+REPORT_COLUMNS = ["Date", *PRODUCT_COLS, "Units_Sold", "Restocked_Units", "Spoilage_Units",
+                  "Festival_Flag", "Festival_Name", "Temperature"]
+
+# Shelf life in days (the extract does not carry it): by Product_ID, else by Category, else the default
+SHELF_LIFE_DAYS = {
+    "MILK500ML": 2, "CURD200G": 3, "GHEE1L": 180, "PANEER250G": 5, "CHOC100G": 120,
+    "LASSI200ML": 4, "FLAVMILK200": 30, "ICECREAM500": 90, "BUTTER250G": 60, "SHRIKHAND250": 7,
+}
+CATEGORY_SHELF_LIFE = {"Milk": 2, "Curd": 3, "Paneer": 5, "Beverage": 4, "Dessert": 7, "Butter": 60,
+                       "Chocolate": 120, "Ghee": 180}
+DEFAULT_SHELF_LIFE = 7
+
+
+def read_chunks(path=SOURCE_FILE, chunksize=CHUNK_ROWS, usecols=None):
+    """Raw rows in chunks of ``chunksize``, in the compact raw schema (raw_schema.py)."""
+    return raw_schema.read_raw(path, usecols=usecols, chunksize=chunksize)
+
+
+def _group_sum(chunk, by, col, how="sum"):
+    """Group ``col`` by the ``by`` columns, summing in int64 (the compact int32 could overflow)."""
+    by = [by] if isinstance(by, str) else by
+    return chunk[col].astype("int64").groupby([chunk[k] for k in by], observed=True, sort=True).agg(how)
+
+
+def _sum_count(chunk, by, col):
+    return _group_sum(chunk, by, col, ["sum", "count"])
+
+
+def _fold(total, partial):
+    """Merge two sum/count (or sum-only) partials indexed by their group keys."""
+    if total is None:
+        return partial
+    merged = pd.concat([total, partial])
+    return merged.groupby(level=list(range(partial.index.nlevels)), observed=True, sort=True).sum()
+
+
+def _latest_days(daily_stock):
+    """Rows of each product's latest day in a (product..., Date)-indexed series."""
+    dates = pd.Series(daily_stock.index.get_level_values("Date"), index=daily_stock.index)
+    return daily_stock[dates == dates.groupby(level="Product_Name", observed=True).transform("max")]
+
+
+def _mean_frame(parts, index_names, total_col, mean_col, count_col=None):
+    """sum/count partial → (keys..., Total, Avg[, Count]) frame like ``groupby.agg(sum, mean[, count])``."""
+    out = pd.DataFrame({total_col: parts["sum"], mean_col: parts["sum"] / parts["count"]})
+    if count_col:
+        out[count_col] = parts["count"]
+    return raw_schema.plain(out.rename_axis(index_names).reset_index())
+
+
+# ───── DAILY SERIES (01) ─────
+def daily_totals(chunk, keys=DEFAULT_KEYS):
+    """Daily Units_Sold per series in one chunk (a mergeable partial)."""
+    return _group_sum(chunk, [*keys, "Date"], "Units_Sold")
+
+
+def fill_calendar(daily, keys=DEFAULT_KEYS):
+    """Daily totals per series with days without a sale filled with 0 from each series' first sale onwards."""
+    # Plain string keys, so the regrouping below works on observed series only
+    daily.index = pd.MultiIndex.from_frame(raw_schema.plain(daily.index.to_frame(index=False)))
+
+    # Complete each series' calendar so the window is 7 days, not 7 sales
+    dates = daily.index.get_level_values("Date")
+    full_dates = pd.date_range(dates.min(), dates.max(), freq="D", name="Date")
+    combos = daily.index.droplevel("Date").unique().to_frame(index=False)
+    grid = combos.loc[combos.index.repeat(len(full_dates))].assign(Date=np.tile(full_dates, len(combos)))
+    daily = daily.reindex(pd.MultiIndex.from_frame(grid))
+    started = daily.notna().groupby(level=keys, sort=False).cummax()
+    return daily[started].fillna(0)
+
+
+def rolling_mean(filled, keys=DEFAULT_KEYS):
+    """7-day rolling mean of calendar-filled totals, per series group (no per-series rescans)."""
+    return (
+        filled.groupby(level=keys, sort=False)
+             .rolling(window=7, min_periods=1)
+             .mean()
+             .droplevel(list(range(len(keys))))
+             .reset_index()
+    )
+
+
+def smooth_daily(daily, keys=DEFAULT_KEYS):
+    """Daily totals per series → 7-day smoothed series (``rolling_mean`` of ``fill_calendar``)."""
+    return rolling_mean(fill_calendar(daily, keys), keys)
+
+
+def fold_daily(path=SOURCE_FILE, keys=DEFAULT_KEYS, chunksize=CHUNK_ROWS):
+    """Daily Units_Sold totals per series, read from ``path`` in chunks."""
+    total = None
+    for chunk in read_chunks(path, chunksize, usecols=["Date", *keys, "Units_Sold"]):
+        total = _fold(total, daily_totals(chunk, keys))
+    return total
+
+
+def daily_series(path=SOURCE_FILE, keys=DEFAULT_KEYS, chunksize=CHUNK_ROWS):
+    """Smoothed daily Units_Sold per series, read from ``path`` in chunks."""
+    return smooth_daily(fold_daily(path, keys, chunksize), keys)
+
+
+# ───── SUMMARY TABLES (generating_csv.py) ─────
+def report_partials(chunk):
+    """Mergeable partial aggregates of one chunk for every summary table."""
+    stock = chunk[PRODUCT_COLS].assign(
+        Date=chunk["Date"],
+        Ending_Stock=(chunk["Restocked_Units"].astype("int64") - chunk["Units_Sold"] - chunk["Spoilage_Units"]),
+    )
+    daily_stock = _group_sum(stock, [*PRODUCT_COLS, "Date"], "Ending_Stock")
+    return {
+        "stock_levels": raw_schema.plain(stock[STOCK_COLUMNS].copy()),
+        "latest_stock": _latest_days(daily_stock),
+        "spoilage": _sum_count(chunk, PRODUCT_COLS, "Spoilage_Units"),
+        "seasonal": _sum_count(chunk.assign(Month=chunk["Date"].dt.month), ["Month", "Category"], "Units_Sold"),
+        "festivals": chunk.loc[chunk["Festival_Flag"] == 1, ["Date", "Festival_Name"]].drop_duplicates(),
+        "weather": _sum_count(chunk.assign(Temp_Rounded=chunk["Temperature"].astype("float64").round()),
+                              "Temp_Rounded", "Units_Sold"),
+    }
+
+
+def merge_partials(total, partial):
+    """Fold one chunk's partials into the running totals (``total`` may be None)."""
+    if total is None:
+        return {k: v for k, v in partial.items() if k != "stock_levels"}
+    return {
+        "latest_stock": _latest_days(_fold(total["latest_stock"], partial["latest_stock"])),
+        "spoilage": _fold(total["spoilage"], partial["spoilage"]),
+        "seasonal": _fold(total["seasonal"], partial["seasonal"]),
+        # keep first-seen order so the final sort breaks ties as the whole-file version did
+        "festivals": _append_distinct(total["festivals"], partial["festivals"]),
+        "weather": _fold(total["weather"], partial["weather"]),
+    }
+
+
+def _append_distinct(total, partial):
+    """Rows of ``partial`` not yet in ``total``, after them (first-seen order)."""
+    if partial.empty:
+        return total
+    if total.empty:
+        return partial
+    return pd.concat([total, partial]).drop_duplicates()
+
+
+def shelf_life_days(products):
+    """Shelf life in days for each row of a frame with Product_ID and Category columns."""
+    by_id = products["Product_ID"].astype("object").map(SHELF_LIFE_DAYS)
+    by_category = products["Category"].astype("object").map(CATEGORY_SHELF_LIFE)
+    return by_id.fillna(by_category).fillna(DEFAULT_SHELF_LIFE).astype("int64")
+
+
+def finish_reports(total):
+    """Running totals → {table name: DataFrame} for every summary table except stock_levels."""
+    stock_snapshot = (
+        raw_schema.plain(total["latest_stock"].reset_index())
+             .sort_values("Date")
+             .groupby("Product_Name", sort=True)
+             .tail(1)
+             .rename(columns={"Date": "As_Of"})
+             .assign(SKU=lambda d: d["Product_Name"].map(sku_slug))
+             .sort_values("SKU")
+    )
+    return {
+        "stock_snapshot": stock_snapshot,
+        "spoilage_summary": _mean_frame(total["spoilage"], PRODUCT_COLS,
+                                        "Total_Spoilage_Units", "Avg_Daily_Spoilage")
+                            .assign(Shelf_Life_Days=shelf_life_days),
+        "seasonal_demand": _mean_frame(total["seasonal"], ["Month", "Category"],
+                                       "Total_Units_Sold", "Avg_Units_Sold"),
+        "festival_dates": raw_schema.plain(total["festivals"].copy()).sort_values("Date"),
+        "weather_demand": _mean_frame(total["weather"], ["Temperature"],
+                                      "Total_Units_Sold", "Avg_Units_Sold", "Observations"),
+    }
+
+
+def fold_reports(path, chunksize=CHUNK_ROWS, total=None):
+    """Fold ``path`` into the report running totals, yielding its stock_levels rows chunk by chunk.
+
+    The final running totals are the generator's return value; ``total``
+    continues from earlier totals (append mode).
+    """
+    for chunk in read_chunks(path, chunksize, usecols=REPORT_COLUMNS):
+        partial = report_partials(chunk)
+        total = merge_partials(total, partial)
+        yield partial["stock_levels"]
+    return total
+
+
+def build_reports(path=SOURCE_FILE, chunksize=CHUNK_ROWS, stock_path=None):
+    """Stream ``path`` once: write stock_levels as it goes, return (summary tables, running totals).
+
+    stock_levels goes to the store table, one part file per chunk, or to the
+    folder ``stock_path`` if given.
+    """
+    folded = {}
+
+    def stock_chunks():
+        folded["total"] = yield from fold_reports(path, chunksize)
+
+    sku_store.write_table_parts("stock_levels", stock_chunks(), folder=stock_path)
+    if folded.get("total") is None:
+        raise ValueError(f"{path} has no rows")
+    return finish_reports(folded["total"]), folded["total"]
+
+
+# ───── MEMORY CHECK ─────
+def _whole_file_reports(df):
+    """The summary tables computed the old way, from one in-memory frame (for --verify)."""
+    df = df.copy()
+    df["Ending_Stock"] = df["Restocked_Units"] - df["Units_Sold"] - df["Spoilage_Units"]
+    df["Month"] = df["Date"].dt.month
+    df["Temp_Rounded"] = df["Temperature"].round()
+    daily_stock = df.groupby([*PRODUCT_COLS, "Date"], as_index=False)["Ending_Stock"].sum()
+    return {
+        "stock_levels": df[STOCK_COLUMNS],
+        "stock_snapshot": (daily_stock.sort_values("Date").groupby("Product_Name", sort=True).tail(1)
+                                      .rename(columns={"Date": "As_Of"})
+                                      .assign(SKU=lambda d: d["Product_Name"].map(sku_slug))
+                                      .sort_values("SKU")),
+        "spoilage_summary": df.groupby(PRODUCT_COLS, as_index=False).agg(
+            Total_Spoilage_Units=("Spoilage_Units", "sum"), Avg_Daily_Spoilage=("Spoilage_Units", "mean"))
+                                .assign(Shelf_Life_Days=shelf_life_days),
+        "seasonal_demand": df.groupby(["Month", "Category"], as_index=False).agg(
+            Total_Units_Sold=("Units_Sold", "sum"), Avg_Units_Sold=("Units_Sold", "mean")),
+        "festival_dates": df.loc[df["Festival_Flag"] == 1, ["Date", "Festival_Name"]].drop_duplicates()
+                            .sort_values("Date"),
+        "weather_demand": df.groupby("Temp_Rounded", as_index=False).agg(
+            Total_Units_Sold=("Units_Sold", "sum"), Avg_Units_Sold=("Units_Sold", "mean"),
+            Observations=("Units_Sold", "count")).rename(columns={"Temp_Rounded": "Temperature"}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Stream the raw extract in chunks and report peak memory against a ceiling.")
+    parser.add_argument("--input", default=SOURCE_FILE, help=f"raw sales CSV (default: {SOURCE_FILE})")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS, help=f"rows per chunk (default: {CHUNK_ROWS})")
+    parser.add_argument("--keys", default=",".join(DEFAULT_KEYS),
+                        help=f"series keys for the daily series, from {ALLOWED_KEYS}")
+    parser.add_argument("--max-mb", type=float, default=None,
+                        help="fail if the traced peak allocation exceeds this many MB")
+    parser.add_argument("--verify", action="store_true",
+                        help="afterwards, read the whole file in memory and check the outputs match "
+                             "(only for extracts that fit in memory)")
+    args = parser.parse_args()
+    keys = parse_keys(args.keys)
+
+    # A check, not an ingest: stock_levels goes to a scratch folder, never the store
+    scratch = tempfile.TemporaryDirectory()
+    stock_path = Path(scratch.name) / "stock_levels"
+    tracemalloc.start()
+    start = time.perf_counter()
+    daily = daily_series(args.input, keys, args.chunksize)
+    reports, _ = build_reports(args.input, args.chunksize, stock_path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    out_bytes = daily.memory_usage(deep=True).sum() + sum(t.memory_usage(deep=True).sum() for t in reports.values())
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"📥 {args.input}: {elapsed:.1f}s in chunks of {args.chunksize:,} rows")
+    print(f"   daily series rows: {len(daily):,}  summary rows: "
+          + ", ".join(f"{name} {len(t):,}" for name, t in reports.items()))
+    print(f"   peak traced allocation {peak / 1024 ** 2:.1f} MB (outputs {out_bytes / 1024 ** 2:.1f} MB), "
+          f"peak RSS {rss_mb:.0f} MB")
+
+    failed = False
+    if args.verify:
+        df = pd.read_csv(args.input, parse_dates=["Date"])   # pandas' default dtypes, as the old loaders read it
+        pd.testing.assert_frame_equal(daily, smooth_daily(daily_totals(df, keys), keys))
+        expected = _whole_file_reports(df)
+        stored = sku_store.read_parts(sku_store.table_parts("stock_levels", stock_path))
+        pd.testing.assert_frame_equal(stored, expected.pop("stock_levels").reset_index(drop=True))
+        for name, frame in expected.items():
+            pd.testing.assert_frame_equal(reports[name].reset_index(drop=True), frame.reset_index(drop=True))
+        print("✅ Chunked outputs match the whole-file read")
+    if args.max_mb is not None and peak > args.max_mb * 1024 ** 2:
+        print(f"❌ Peak {peak / 1024 ** 2:.1f} MB is over the {args.max_mb:g} MB ceiling")
+        failed = True
+    elif args.max_mb is not None:
+        print(f"✅ Peak is within the {args.max_mb:g} MB ceiling")
+    scratch.cleanup()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
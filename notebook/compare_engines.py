@@ -0,0 +1,106 @@
+"""
+compare_engines.py
+Accuracy and speed of the batch engine against Prophet.
+
+Holds out the last --holdout days of every cleaned series, fits both engines
+on the rest and scores the held-out days (MAE / RMSE / MAPE and 80% interval
+coverage). Results go to results/tables/engine_comparison.csv.
+
+    python notebook/compare_engines.py
+    python notebook/compare_engines.py --scale 20000   # + batch throughput on synthetic series
+"""
+
+import argparse
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+from prophet import Prophet
+
+import batch_engine
+import sku_store
+
+OUT_PATH = "results/tables/engine_comparison.csv"
+
+
+def score(actual, yhat, lower, upper):
+    err = actual - yhat
+    nonzero = actual != 0
+    return {
+        "MAE": round(float(np.mean(np.abs(err))), 2),
+        "RMSE": round(float(np.sqrt(np.mean(err ** 2))), 2),
+        "MAPE (%)": round(float(np.mean(np.abs(err[nonzero] / actual[nonzero])) * 100), 2),
+        "Coverage (%)": round(float(np.mean((actual >= lower) & (actual <= upper)) * 100), 1),
+    }
+
+
+def throughput(n_series, n_days=365):
+    """Series per minute the batch engine fits + forecasts on synthetic daily data."""
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2023-01-01", periods=n_days, freq="D")
+    weekly = np.sin(2 * np.pi * np.arange(n_days) / 7)[:, None]
+    Y = 200 + rng.normal(0, 30, n_series) + 15 * weekly + rng.normal(0, 8, (n_days, n_series))
+    Y[: n_days // 10, : n_series // 4] = np.nan  # a quarter of the series start late
+
+    start = time.perf_counter()
+    spec = batch_engine.make_spec(dates)
+    fit = batch_engine.fit_batch(spec, dates, Y)
+    batch_engine.predict_batch(spec, fit, pd.date_range(dates[-1], periods=31, freq="D")[1:])
+    elapsed = time.perf_counter() - start
+    return elapsed, n_series / elapsed * 60
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the batch engine with Prophet on held-out days.")
+    parser.add_argument("--holdout", type=int, default=14, help="trailing days to hold out (default: 14)")
+    parser.add_argument("--scale", type=int, default=0,
+                        help="also time the batch engine on this many synthetic series")
+    args = parser.parse_args()
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+
+    festivals = sku_store.read_table("festival_dates")
+    train, test = {}, {}
+    for sku in sku_store.list_skus("cleaned"):
+        df = sku_store.read_series("cleaned", sku).rename(columns={"Date": "ds", "Units_Sold": "y"})
+        cutoff = df["ds"].max() - pd.Timedelta(days=args.holdout)
+        train[sku], test[sku] = df[df["ds"] <= cutoff], df[df["ds"] > cutoff]
+
+    # Prophet – one fit per series
+    rows, prophet_s = [], 0.0
+    for sku in train:
+        start = time.perf_counter()
+        model = Prophet().fit(train[sku])
+        pred = model.predict(test[sku][["ds"]])
+        prophet_s += time.perf_counter() - start
+        rows.append({"Product": sku, "Engine": "prophet",
+                     **score(test[sku]["y"].to_numpy(), pred["yhat"].to_numpy(),
+                             pred["yhat_lower"].to_numpy(), pred["yhat_upper"].to_numpy())})
+
+    # Batch – every series in one solve
+    start = time.perf_counter()
+    frames, *_ = batch_engine.forecast_frames(train, args.holdout, festivals)
+    batch_s = time.perf_counter() - start
+    for sku in train:
+        pred = test[sku].merge(frames[sku], on="ds")
+        rows.append({"Product": sku, "Engine": "batch",
+                     **score(pred["y"].to_numpy(), pred["yhat"].to_numpy(),
+                             pred["yhat_lower"].to_numpy(), pred["yhat_upper"].to_numpy())})
+
+    results = pd.DataFrame(rows)
+    results.to_csv(OUT_PATH, index=False)
+
+    print(results.pivot(index="Product", columns="Engine", values=["MAE", "MAPE (%)"]).round(2))
+    print("\nMean over SKUs:")
+    print(results.groupby("Engine")[["MAE", "RMSE", "MAPE (%)", "Coverage (%)"]].mean().round(2))
+    print(f"\n⏱️ Prophet {prophet_s:.2f}s vs batch {batch_s:.3f}s for {len(train)} series")
+
+    if args.scale:
+        elapsed, per_minute = throughput(args.scale)
+        print(f"⏱️ Batch engine: {args.scale:,} synthetic series × 365 days in {elapsed:.1f}s "
+              f"(≈{per_minute:,.0f} series/minute)")
+    print(f"✅ Comparison saved to {OUT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
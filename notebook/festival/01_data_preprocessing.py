@@ -1,8 +1,13 @@
+import os
+import sys
+
 import pandas as pd
 
-# Load your main dataset
-df = pd.read_csv('data/faviy_dairy_cleaned_extended_with_festivals.csv')
-df['date'] = pd.to_datetime(df['Date'])
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import raw_schema
+
+# Load your main dataset (typed schema: Date parsed, flags as int8)
+df = raw_schema.read_raw(usecols=['Date', 'Festival_Flag'])
 
 # Filter festival days
 festival_df = df[df['Festival_Flag'] == 1]
@@ -0,0 +1,173 @@
+"""
+forecast_output.py
+What 02_prophet_forecasting.py writes for each fitted series, and how the intervals are computed.
+
+``full`` is Prophet's own output: every history day plus the horizon, all 16
+component columns, and ``yhat_lower``/``yhat_upper`` from 1000 simulated
+paths per row. Nothing downstream reads most of it: the dashboards, charts
+and portfolio index read ``sku_store.FORECAST_COLUMNS``, and 03 scores
+``yhat`` where actuals exist.
+
+``compact`` (the default) writes only those columns, for the horizon plus an
+optional slice of fitted history (``history_days``; None keeps all of it, so
+03 still scores the whole series, 0 writes the horizon only). Rows outside
+the slice are never predicted.
+
+Intervals in compact mode come from one of two methods:
+
+* ``uncertainty_samples`` > 0 – Prophet's vectorized simulation with that
+  many paths instead of 1000;
+* ``uncertainty_samples`` = 0 – closed form. Prophet's simulated yhat is
+  trend × (1 + multiplicative terms) + additive terms + N(0, sigma_obs),
+  where the future trend takes a Laplace(0, mean |delta|) slope change with
+  probability S × step per day (S changepoints over the scaled history).
+  The variance of that sum is known per horizon day, so the band is
+  yhat ± z × sd. It matches the simulated band to within its sampling noise
+  on these series; logistic growth and MCMC fits fall back to simulation.
+
+    python notebook/forecast_output.py              # predict time and bytes per mode, one SKU
+"""
+
+import argparse
+import io
+import logging
+import time
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+import sku_store
+
+MODES = ("compact", "full")
+FALLBACK_SAMPLES = 200   # simulated paths where the closed form does not apply
+
+
+def settings(mode="compact", history_days=None, uncertainty_samples=0):
+    """The output settings as stored in the forecast stage's digest."""
+    if mode not in MODES:
+        raise ValueError(f"unknown output mode {mode!r} (expected one of {MODES})")
+    if mode == "full":
+        return {"mode": "full"}
+    return {"mode": mode, "history_days": history_days, "uncertainty_samples": uncertainty_samples}
+
+
+def history_slice(frame, history_end, history_days, date_col="ds"):
+    """Rows of ``frame`` in the horizon (after ``history_end``) or in its last ``history_days`` of history."""
+    if history_days is None:
+        return frame
+    return frame[frame[date_col] > history_end - pd.Timedelta(days=history_days)]
+
+
+def analytic_supported(model):
+    return model.growth in ("linear", "flat") and not model.mcmc_samples
+
+
+def analytic_intervals(model, forecast):
+    """yhat_lower / yhat_upper for ``forecast`` (ds, trend, multiplicative_terms, yhat) without sampling."""
+    t = model.setup_dataframe(forecast[["ds"]].copy())["t"].to_numpy()
+    sigma = float(np.ravel(model.params["sigma_obs"])[0])
+    trend_var = np.zeros(len(t))
+
+    future = t > 1
+    if future.any() and model.growth == "linear":
+        step = np.diff(t[future]).mean() if future.sum() > 1 else np.diff(model.history["t"]).mean()
+        likelihood = min(len(model.changepoints_t) * step, 1.0)
+        mean_delta = np.mean(np.abs(model.params["delta"][0])) + 1e-8
+        # Slope changes are averaged with the previous day's and summed twice (slope → level):
+        # the change on day k moves day i's trend by step × (i - k + 1/2), so
+        # Var = step² × p × 2b² × Σ_{j=1..i} (j - 1/2)² = step² × p × 2b² × i(4i² - 1) / 12
+        i = np.cumsum(future)[future]
+        trend_var[future] = step ** 2 * likelihood * 2 * mean_delta ** 2 * i * (4 * i ** 2 - 1) / 12
+
+    scale = 1 + forecast["multiplicative_terms"].to_numpy()
+    sd = model.y_scale * np.sqrt(trend_var * scale ** 2 + sigma ** 2)
+    z = NormalDist().inv_cdf((1 + model.interval_width) / 2)
+    yhat = forecast["yhat"].to_numpy()
+    return yhat - z * sd, yhat + z * sd
+
+
+def _predict(model, future, samples):
+    """model.predict with ``samples`` uncertainty paths (0: none), leaving the model as it was."""
+    saved = model.uncertainty_samples
+    model.uncertainty_samples = samples
+    try:
+        return model.predict(future)
+    finally:
+        model.uncertainty_samples = saved
+
+
+def predict(model, periods, mode="compact", history_days=None, uncertainty_samples=0):
+    """Forecast ``periods`` days past the end of ``model``'s history in the given output mode."""
+    if mode == "full":
+        return model.predict(model.make_future_dataframe(periods=periods))
+
+    future = model.make_future_dataframe(periods=periods, include_history=history_days != 0)
+    future = history_slice(future, model.history["ds"].max(), history_days)
+    if uncertainty_samples or not analytic_supported(model):
+        forecast = _predict(model, future, uncertainty_samples or FALLBACK_SAMPLES)
+    else:
+        forecast = _predict(model, future, 0)
+        forecast["yhat_lower"], forecast["yhat_upper"] = analytic_intervals(model, forecast)
+    return forecast[sku_store.FORECAST_COLUMNS]
+
+
+def compact(frame, history_end, mode="compact", history_days=None, **_):
+    """Apply the output settings to a forecast frame produced elsewhere (the batch engine)."""
+    if mode == "full":
+        return frame
+    return history_slice(frame, history_end, history_days)[sku_store.FORECAST_COLUMNS]
+
+
+# ───── COMPARISON ─────
+def _parquet_bytes(df):
+    buffer = io.BytesIO()
+    sku_store._coerce("forecast", df).to_parquet(buffer, index=False)
+    return buffer.getbuffer().nbytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Predict time, file size and interval width per output mode.")
+    parser.add_argument("--sku", help="SKU slug (default: the first cleaned SKU)")
+    parser.add_argument("--periods", type=int, default=30, help="forecast horizon in days (default: 30)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed predictions per mode (default: 3)")
+    args = parser.parse_args()
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    from prophet import Prophet
+
+    sku = args.sku or sku_store.list_skus("cleaned")[0]
+    series = sku_store.read_series("cleaned", sku)
+    if series is None:
+        parser.error(f"no cleaned series for {sku!r}")
+    series = series.rename(columns={"Date": "ds", "Units_Sold": "y"})
+    model = Prophet().fit(series[["ds", "y"]])
+    history_end = model.history["ds"].max()
+
+    modes = {
+        "full": settings("full"),
+        "compact, 1000 samples": settings(uncertainty_samples=1000),
+        "compact, 100 samples": settings(uncertainty_samples=100),
+        "compact, analytic": settings(),
+        "horizon only, analytic": settings(history_days=0),
+    }
+    rows = []
+    reference = None
+    for label, options in modes.items():
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            forecast = predict(model, args.periods, **options)
+            times.append(time.perf_counter() - start)
+        horizon = forecast[forecast["ds"] > history_end]
+        width = (horizon["yhat_upper"] - horizon["yhat_lower"]).to_numpy()
+        reference = width if reference is None else reference
+        rows.append({"output": label, "rows": len(forecast), "columns": forecast.shape[1],
+                     "predict_ms": 1000 * min(times), "parquet_kb": _parquet_bytes(forecast) / 1024,
+                     "band_vs_full_%": 100 * (width.mean() / reference.mean() - 1)})
+    report = pd.DataFrame(rows)
+    print(f"{sku}: {len(model.history)} history days, {args.periods}-day horizon\n")
+    print(report.to_string(index=False, float_format=lambda v: f"{v:.1f}"))
+
+
+if __name__ == "__main__":
+    main()
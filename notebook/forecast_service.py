@@ -0,0 +1,355 @@
+"""
+forecast_service.py
+Local HTTP service that serves the product-level forecasts to other jobs (ERP, replenishment).
+
+Every stored forecast is held in memory as one ``Snapshot``: per SKU, the
+days after its last cleaned observation as NumPy arrays. A request only
+slices those arrays, so it never touches the disk. A horizon longer than the
+stored window is served from one ``MAX_HORIZON``-day prediction of the
+registered model (model_registry.py), made the first time the SKU needs it
+and sliced for every later request. The snapshot keeps the predictions of
+the ``MAX_PREDICTED`` most recently used SKUs; each SKU's model has its own
+lock, so slow predictions of different SKUs run side by side.
+
+The snapshot is keyed on the pipeline run ID (the manifest stamp, as in the
+dashboard cache). A watcher thread checks it every ``--poll`` seconds; when
+a stage has finished it builds the next snapshot on the side and swaps the
+reference, so requests in flight finish on the old one and nothing is
+refused while it reloads. ``POST /reload`` does the same on demand.
+
+    GET  /health                               snapshot run ID, SKU count, load time
+    GET  /skus
+    GET  /forecast?sku=a,b&horizon=14          one horizon for several SKUs
+    POST /forecast  {"requests": [{"sku": "a", "horizon": 7}, {"sku": "b", "horizon": 30}]}
+                    or {"skus": ["a", "b"], "horizon": 14}
+    POST /reload
+
+Responses are JSON, one object per requested series, or an Arrow IPC stream
+with one long table (sku, horizon, ds, yhat, yhat_lower, yhat_upper) with
+``?format=arrow`` / ``Accept: application/vnd.apache.arrow.stream``.
+Unknown SKUs are listed under ``errors`` rather than failing the batch.
+Each JSON series carries ``days``, the number of days returned; a SKU
+without a registered model cannot go past its stored window, so a longer
+horizon returns fewer days and ``"truncated": true`` (for Arrow, such SKUs
+are listed in the ``truncated`` schema metadata).
+
+    python notebook/forecast_service.py --port 8502
+    python notebook/service_load_test.py       # p50/p99 latency and requests per second
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import model_registry
+import portfolio_index
+import sku_store
+from pipeline_cache import MANIFEST_PATH, file_stamp
+
+DEFAULT_HORIZON = 30
+MAX_HORIZON = 365
+MAX_BATCH = 10_000           # series per request
+MAX_PREDICTED = 256          # SKUs whose model prediction a snapshot keeps
+ARROW_TYPE = "application/vnd.apache.arrow.stream"
+VALUE_COLUMNS = ["yhat", "yhat_lower", "yhat_upper"]
+
+
+def pipeline_run_id():
+    """Changes whenever a pipeline stage finishes (it rewrites the manifest)."""
+    return file_stamp(MANIFEST_PATH)
+
+
+class RequestError(ValueError):
+    """A malformed request; answered with 400."""
+
+
+class Snapshot:
+    """Every SKU's stored future forecast, read once; read-only once built."""
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.loaded_at = datetime.now().isoformat(timespec="seconds")
+        start = time.perf_counter()
+        self.series = {}
+        fc = sku_store.read_dataset("forecast", columns=sku_store.FORECAST_COLUMNS)
+        if fc is not None:
+            skus = fc["sku"].unique()
+            end = portfolio_index._history_end(skus)
+            # Without a cleaned series, everything stored counts as the future
+            end = end.fillna(pd.Timestamp.min)
+            future = fc[fc["ds"] > fc["sku"].map(end)]
+            for sku, rows in future.groupby("sku", sort=True):
+                self.series[sku] = {"ds": rows["ds"].to_numpy(),
+                                    **{c: rows[c].to_numpy() for c in VALUE_COLUMNS}}
+        self.load_s = time.perf_counter() - start
+        self._predicted = OrderedDict()   # sku → MAX_HORIZON days predicted from the model (LRU)
+        self._predicted_lock = threading.Lock()
+        self._model_locks = {sku: threading.Lock() for sku in self.series}
+
+    def forecast(self, sku, horizon):
+        """{ds, yhat, yhat_lower, yhat_upper} arrays for the first ``horizon`` future days and their source."""
+        stored = self.series.get(sku)
+        if stored is None:
+            raise KeyError(sku)
+        if horizon <= len(stored["ds"]):
+            return {c: v[:horizon] for c, v in stored.items()}, "stored"
+        predicted = self._predict(sku)
+        if predicted is None:
+            return stored, "stored"   # no model: the whole stored window is all there is
+        return {c: v[:horizon] for c, v in predicted.items()}, "model"
+
+    def _cached(self, sku):
+        with self._predicted_lock:
+            if sku not in self._predicted:
+                return False, None
+            self._predicted.move_to_end(sku)
+            return True, self._predicted[sku]
+
+    def _predict(self, sku):
+        """MAX_HORIZON days of ``sku`` from its registered model (None without one), predicted once."""
+        found, arrays = self._cached(sku)
+        if found:
+            return arrays
+        with self._model_locks[sku]:   # a shared Prophet model predicts one request at a time
+            found, arrays = self._cached(sku)   # another request may have predicted it meanwhile
+            if found:
+                return arrays
+            df = model_registry.forecast_horizon(sku, MAX_HORIZON)
+            arrays = None if df is None else {c: df[c].to_numpy() for c in ["ds", *VALUE_COLUMNS]}
+            with self._predicted_lock:
+                self._predicted[sku] = arrays
+                while len(self._predicted) > MAX_PREDICTED:
+                    self._predicted.popitem(last=False)
+        return arrays
+
+    def info(self):
+        return {"run_id": list(self.run_id), "loaded_at": self.loaded_at, "skus": len(self.series),
+                "load_s": round(self.load_s, 3)}
+
+
+class ForecastService:
+    """Holds the current snapshot and swaps in a new one when the pipeline has run."""
+
+    def __init__(self):
+        self.snapshot = Snapshot(pipeline_run_id())
+        self.reloads = 0
+        self._reload_lock = threading.Lock()
+
+    def reload(self, force=False):
+        """Build a new snapshot if the run ID changed (or ``force``); True if one was swapped in."""
+        with self._reload_lock:
+            run_id = pipeline_run_id()
+            if not force and run_id == self.snapshot.run_id:
+                return False
+            self.snapshot = Snapshot(run_id)   # one reference assignment: readers see old or new
+            self.reloads += 1
+            return True
+
+    def watch(self, interval, stop):
+        while not stop.wait(interval):
+            try:
+                if self.reload():
+                    print(f"🔄 Reloaded forecasts for {self.snapshot.info()['run_id']}", flush=True)
+            except Exception as exc:   # keep serving the old snapshot
+                print(f"⚠️ Reload failed, still serving {self.snapshot.loaded_at}: {exc}", flush=True)
+
+    def answer(self, requests):
+        """Forecasts for ``[(sku, horizon), ...]`` against one snapshot."""
+        snapshot = self.snapshot
+        results, errors = [], []
+        for sku, horizon in requests:
+            try:
+                arrays, source = snapshot.forecast(sku, horizon)
+            except KeyError:
+                errors.append({"sku": sku, "horizon": horizon, "error": "unknown SKU"})
+                continue
+            results.append((sku, horizon, source, arrays))
+        return snapshot, results, errors
+
+
+# ───── REQUEST PARSING ─────
+def _horizon(value):
+    try:
+        horizon = int(value)
+    except (TypeError, ValueError):
+        raise RequestError(f"horizon must be an integer, got {value!r}") from None
+    if not 1 <= horizon <= MAX_HORIZON:
+        raise RequestError(f"horizon must be between 1 and {MAX_HORIZON}")
+    return horizon
+
+
+def parse_query(query):
+    params = parse_qs(query)
+    skus = [s for part in params.get("sku", []) for s in part.split(",") if s]
+    if not skus:
+        raise RequestError("give at least one sku")
+    horizon = _horizon(params.get("horizon", [DEFAULT_HORIZON])[0])
+    return [(sku, horizon) for sku in skus], params.get("format", [None])[0]
+
+
+def parse_body(body):
+    try:
+        payload = json.loads(body or b"{}")
+    except json.JSONDecodeError as exc:
+        raise RequestError(f"body is not JSON: {exc}") from None
+    if not isinstance(payload, dict):
+        raise RequestError("body must be a JSON object")
+    if "requests" in payload:
+        items = payload["requests"]
+        if not isinstance(items, list) or not all(isinstance(i, dict) and "sku" in i for i in items):
+            raise RequestError('"requests" must be a list of {"sku": ..., "horizon": ...}')
+        requests = [(str(i["sku"]), _horizon(i.get("horizon", DEFAULT_HORIZON))) for i in items]
+    elif "skus" in payload:
+        horizon = _horizon(payload.get("horizon", DEFAULT_HORIZON))
+        requests = [(str(sku), horizon) for sku in payload["skus"]]
+    else:
+        raise RequestError('give "requests" or "skus"')
+    if not requests:
+        raise RequestError("empty request")
+    return requests, payload.get("format")
+
+
+# ───── ENCODING ─────
+def to_json(snapshot, results, errors):
+    forecasts = [{
+        "sku": sku, "horizon": horizon, "source": source,
+        "days": len(arrays["ds"]), "truncated": len(arrays["ds"]) < horizon,
+        "ds": np.datetime_as_string(arrays["ds"], unit="D").tolist(),
+        **{c: np.round(arrays[c], 4).tolist() for c in VALUE_COLUMNS},
+    } for sku, horizon, source, arrays in results]
+    body = {"run_id": list(snapshot.run_id), "loaded_at": snapshot.loaded_at,
+            "forecasts": forecasts, "errors": errors}
+    return json.dumps(body).encode()
+
+
+def to_arrow(snapshot, results, errors):
+    lengths = [len(arrays["ds"]) for _, _, _, arrays in results]
+    columns = {
+        "sku": pa.DictionaryArray.from_arrays(
+            np.repeat(np.arange(len(results), dtype="int32"), lengths),
+            pa.array([sku for sku, _, _, _ in results], pa.string())),
+        "horizon": np.repeat([h for _, h, _, _ in results], lengths).astype("int32"),
+        "ds": np.concatenate([a["ds"] for *_, a in results]) if results else np.array([], "datetime64[ns]"),
+        **{c: np.concatenate([a[c] for *_, a in results]) if results else np.array([], "float64")
+           for c in VALUE_COLUMNS},
+    }
+    metadata = {"run_id": json.dumps(list(snapshot.run_id)), "loaded_at": snapshot.loaded_at,
+                "errors": json.dumps(errors),
+                "truncated": json.dumps([sku for (sku, horizon, _, _), n in zip(results, lengths) if n < horizon])}
+    table = pa.table(columns).replace_schema_metadata(metadata)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+# ───── HTTP ─────
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive for batched clients
+        disable_nagle_algorithm = True  # headers and body go out as two writes
+
+        def log_message(self, *args):   # one line per request is too noisy under load
+            pass
+
+        def _send(self, status, body, content_type="application/json"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _error(self, status, message):
+            self._send(status, json.dumps({"error": message}).encode())
+
+        def _forecast(self, requests, fmt):
+            if len(requests) > MAX_BATCH:
+                raise RequestError(f"at most {MAX_BATCH} series per request")
+            arrow = fmt == "arrow" or (fmt is None and ARROW_TYPE in self.headers.get("Accept", ""))
+            result = service.answer(requests)
+            if arrow:
+                self._send(200, to_arrow(*result), ARROW_TYPE)
+            else:
+                self._send(200, to_json(*result))
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            try:
+                if url.path == "/health":
+                    self._send(200, json.dumps({"status": "ok", "reloads": service.reloads,
+                                                **service.snapshot.info()}).encode())
+                elif url.path == "/skus":
+                    self._send(200, json.dumps(sorted(service.snapshot.series)).encode())
+                elif url.path == "/forecast":
+                    self._forecast(*parse_query(url.query))
+                else:
+                    self._error(404, f"no route {url.path}")
+            except RequestError as exc:
+                self._error(400, str(exc))
+            except Exception as exc:
+                self._error(500, repr(exc))
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            try:
+                if url.path == "/forecast":
+                    self._forecast(*parse_body(body))
+                elif url.path == "/reload":
+                    swapped = service.reload(force=True)
+                    self._send(200, json.dumps({"reloaded": swapped, **service.snapshot.info()}).encode())
+                else:
+                    self._error(404, f"no route {url.path}")
+            except RequestError as exc:
+                self._error(400, str(exc))
+            except Exception as exc:
+                self._error(500, repr(exc))
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=8502, poll=5.0):
+    """Start the service in background threads; returns (server, service, stop event)."""
+    service = ForecastService()
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    stop = threading.Event()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    if poll:
+        threading.Thread(target=service.watch, args=(poll, stop), daemon=True).start()
+    return server, service, stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve stored forecasts over HTTP from an in-memory snapshot.")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8502, help="port (default: 8502)")
+    parser.add_argument("--poll", type=float, default=5.0,
+                        help="seconds between checks for a finished pipeline stage; 0 disables (default: 5)")
+    args = parser.parse_args()
+
+    server, service, stop = serve(args.host, args.port, args.poll)
+    info = service.snapshot.info()
+    print(f"📦 {info['skus']} SKUs loaded in {info['load_s']:.2f}s")
+    print(f"🚀 Serving forecasts on http://{args.host}:{server.server_address[1]} (Ctrl+C to stop)", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+forecast_window.py
+The future part of the stored forecasts as aligned arrays, plus the stock on
+hand and shelf life the risk and replenishment stages start from.
+
+Shared by spoilage_sim.py and replenishment.py. Each series' window is the
+first ``horizon`` forecast days after its last observed day. Windows can be
+shorter than the horizon, or empty – a forecast stored before the newest
+days were appended (incremental_ingest.py) ends sooner – so the arrays are
+zero-padded to the longest window and ``days`` holds each series' own
+length; series without a single future day are returned in ``missing``
+rather than cutting every other series down to match.
+
+    window = forecast_window.future_window(fc, ["sku"], history_end, 30)
+    window["mean"][i, :window["days"][i]]     # series i's valid days
+"""
+
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+import batch_engine
+import chunked_ingest
+import sku_store
+from series_keys import sku_slug
+
+RERUN_HINT = "rerun 02_prophet_forecasting.py to forecast past the latest data"
+
+
+def future_window(fc, by, history_end, horizon):
+    """First ``horizon`` forecast days after each series' last observed day.
+
+    ``fc`` holds the ``by`` columns (``sku`` first), ``ds`` and the forecast
+    columns; ``history_end`` maps sku → last observed day (a SKU without one
+    counts everything stored as the future). Returns a dict:
+
+        series    the ``by`` columns and ``Start`` (first future day), one row per series
+        dates     series × days (NaT past a series' window)
+        mean, sd  series × days demand, from yhat and the 80% interval (0 past the window)
+        days      future days per series, at most ``horizon``
+        missing   the ``by`` columns of series with no future day
+    """
+    end = fc["sku"].map(history_end).fillna(pd.Timestamp.min)
+    future = fc[fc["ds"] > end].sort_values([*by, "ds"])
+    future = future.groupby(by, sort=False).head(horizon)
+
+    groups = future.groupby(by, sort=False)
+    row, col = groups.ngroup().to_numpy(), groups.cumcount().to_numpy()
+    days = np.bincount(row, minlength=groups.ngroups)
+    shape = (groups.ngroups, int(days.max()) if len(days) else 0)
+    z = NormalDist().inv_cdf(0.5 + batch_engine.INTERVAL_WIDTH / 2)
+    dates = np.full(shape, np.datetime64("NaT"), dtype="datetime64[ns]")
+    mean, sd = np.zeros(shape), np.zeros(shape)
+    dates[row, col] = future["ds"].to_numpy()
+    mean[row, col] = np.clip(future["yhat"].to_numpy(float), 0, None)
+    sd[row, col] = np.clip(future["yhat_upper"].to_numpy(float) - future["yhat_lower"].to_numpy(float), 0, None) / (2 * z)
+
+    series = groups.head(1)[[*by, "ds"]].rename(columns={"ds": "Start"}).reset_index(drop=True)
+    stored = fc[by].drop_duplicates().sort_values(by)
+    missing = stored.merge(series[by], on=by, how="left", indicator=True)
+    missing = missing.loc[missing["_merge"] == "left_only", by].reset_index(drop=True)
+    return {"series": series, "dates": dates, "mean": mean, "sd": sd, "days": days, "missing": missing}
+
+
+def stock_on_hand(skus):
+    """Latest ending stock of each of ``skus`` (stock_snapshot); 0 where unknown."""
+    snapshot = sku_store.read_table("stock_snapshot", columns=["SKU", "Ending_Stock"])
+    stock = snapshot.set_index("SKU")["Ending_Stock"] if snapshot is not None else pd.Series(dtype=float)
+    # Ending stock is a net flow in the extract and can dip below zero – nothing on hand then
+    return np.clip(stock.reindex(skus).fillna(0).to_numpy(float), 0, None)
+
+
+def shelf_life(skus):
+    """Shelf life in days of each of ``skus`` (spoilage_summary); the ingest default where unknown."""
+    summary = sku_store.read_table("spoilage_summary", columns=["Product_Name", "Shelf_Life_Days"])
+    shelf = (summary.assign(SKU=summary["Product_Name"].map(sku_slug)).set_index("SKU")["Shelf_Life_Days"]
+             if summary is not None else pd.Series(dtype=float))
+    return shelf.reindex(skus).fillna(chunked_ingest.DEFAULT_SHELF_LIFE).to_numpy().astype(np.int64)
+
+
+def describe(frame):
+    """``a, b / x, ...`` listing of series rows for warnings."""
+    return ", ".join(" / ".join(map(str, row)) for row in frame.itertuples(index=False))
@@ -1,96 +1,60 @@
 """
-generate_dairy_reports.py
-Create:
-    - stock_levels.csv
-    - spoilage_summary.csv
-    - seasonal_demand.csv
-    - festival_dates.csv
-    - weather_demand.csv
-All written to data/processed/.
+generating_csv.py
+Writes the summary tables to the Parquet store (data/store/tables/<name>.parquet,
+see sku_store.py; read them with ``sku_store.read_table(name)``):
+    - stock_levels       daily ending stock per product, streamed chunk by chunk
+    - stock_snapshot     latest ending stock per SKU, for the dashboard KPI tiles
+    - spoilage_summary   total & average daily spoilage and shelf life per product
+    - seasonal_demand
+    - festival_dates
+    - weather_demand
+It also saves the running totals behind them to data/store/state/ (for
+incremental_ingest.py) and refreshes the portfolio_index table when forecasts
+exist. No CSVs are written; the legacy data/processed/*.csv files are only
+read as a fallback until the store exists.
+
+The raw extract is streamed in chunks (INGEST_CHUNK_ROWS rows each, default
+chunked_ingest.CHUNK_ROWS), so it does not have to fit in memory.
 """
 
-import pandas as pd
 import os
 from pathlib import Path
 
+import chunked_ingest
+import incremental_ingest
+import portfolio_index
+import run_log
+import sku_store
+
 # --------------------------------------------------------------------
 # CONFIG
 # --------------------------------------------------------------------
 RAW_DIR      = Path("data")
-PROC_DIR     = RAW_DIR / "processed"
 SOURCE_FILE  = RAW_DIR / "faviy_dairy_cleaned_extended_with_festivals.csv"
 
-PROC_DIR.mkdir(parents=True, exist_ok=True)
-
-# --------------------------------------------------------------------
-# LOAD
-# --------------------------------------------------------------------
-df = pd.read_csv(SOURCE_FILE, parse_dates=["Date"])
-
-# --------------------------------------------------------------------
-# 1) STOCK LEVELS – daily ending stock per product
-# --------------------------------------------------------------------
-stock_df = df.copy()
-stock_df["Ending_Stock"] = (
-      stock_df["Restocked_Units"]
-    - stock_df["Units_Sold"]
-    - stock_df["Spoilage_Units"]
-)
-
-stock_levels = stock_df[["Date", "Product_ID",
-                         "Product_Name", "Category", "Ending_Stock"]]
-
-stock_levels.to_csv(PROC_DIR / "stock_levels.csv", index=False)
-
-# --------------------------------------------------------------------
-# 2) SPOILAGE SUMMARY – total & avg daily spoilage per product
-# --------------------------------------------------------------------
-spoilage_summary = (
-    df.groupby(["Product_ID", "Product_Name", "Category"], as_index=False)
-      .agg(Total_Spoilage_Units=("Spoilage_Units", "sum"),
-           Avg_Daily_Spoilage=("Spoilage_Units", "mean"))
-)
-
-spoilage_summary.to_csv(PROC_DIR / "spoilage_summary.csv", index=False)
-
 # --------------------------------------------------------------------
-# 3) SEASONAL DEMAND – monthly totals & averages by category
+# BUILD – one chunked pass over the raw extract (see chunked_ingest.py)
+#   1) STOCK LEVELS     – daily ending stock per product (streamed to the store)
+#      STOCK SNAPSHOT   – latest day's ending stock per product
+#   2) SPOILAGE SUMMARY – total & avg daily spoilage and shelf life per product
+#   3) SEASONAL DEMAND  – monthly totals & averages by category
+#   4) FESTIVAL DATES   – unique festival days
+#   5) WEATHER DEMAND   – sales aggregated by rounded temperature
 # --------------------------------------------------------------------
-df["Month"] = df["Date"].dt.month
+log = run_log.StageLog("reports")
+chunksize = int(os.environ.get("INGEST_CHUNK_ROWS", chunked_ingest.CHUNK_ROWS))
+tables, totals = chunked_ingest.build_reports(SOURCE_FILE, chunksize)
 
-seasonal_demand = (
-    df.groupby(["Month", "Category"], as_index=False)
-      .agg(Total_Units_Sold=("Units_Sold", "sum"),
-           Avg_Units_Sold=("Units_Sold", "mean"))
-      .sort_values(["Month", "Category"])
-)
-
-seasonal_demand.to_csv(PROC_DIR / "seasonal_demand.csv", index=False)
-
-# --------------------------------------------------------------------
-# 4) FESTIVAL DATES – unique festival days
-# --------------------------------------------------------------------
-festival_dates = (
-    df.loc[df["Festival_Flag"] == 1, ["Date", "Festival_Name"]]
-      .drop_duplicates()
-      .sort_values("Date")
-)
-
-festival_dates.to_csv(PROC_DIR / "festival_dates.csv", index=False)
-
-# --------------------------------------------------------------------
-# 5) WEATHER DEMAND – sales aggregated by rounded temperature
-# --------------------------------------------------------------------
-df["Temp_Rounded"] = df["Temperature"].round()
+for name, table in tables.items():
+    sku_store.write_table(name, table)
 
-weather_demand = (
-    df.groupby("Temp_Rounded", as_index=False)
-      .agg(Total_Units_Sold=("Units_Sold", "sum"),
-           Avg_Units_Sold=("Units_Sold", "mean"),
-           Observations=("Units_Sold", "count"))
-      .rename(columns={"Temp_Rounded": "Temperature"})
-)
+# Running totals let incremental_ingest.py append new days without a rebuild
+incremental_ingest.save_report_state(totals)
+log.rows = int(totals["spoilage"]["count"].sum())   # raw rows read
 
-weather_demand.to_csv(PROC_DIR / "weather_demand.csv", index=False)
+print("✅ All summary tables written to", sku_store.TABLE_DIR.resolve())
 
-print("✅ All five summary files written to", PROC_DIR.resolve())
+# Festival calendar feeds the dashboard's portfolio index; refresh it if forecasts exist
+if portfolio_index.write_index():
+    print("✅ Portfolio index refreshed")
+log.close()
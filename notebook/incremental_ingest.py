@@ -0,0 +1,311 @@
+"""
+incremental_ingest.py
+Append mode: ingest a file of new days without re-reading the sales history.
+
+Full runs of 01_data_preprocessing.py and generating_csv.py persist their
+running state in data/store/state/ (see sku_store.py):
+
+    reports_<part>.parquet          running totals behind the summary tables – sums and
+                                    counts, each product's latest stock day, festival days
+    daily_tail_<dataset>.parquet    each series' last 6 days of calendar-filled daily totals
+
+``append`` folds only the new rows into that state:
+
+* summary tables – the new rows' partial aggregates are merged into the
+  totals and the means recomputed from sum / count; stock_levels is
+  stored in parts of one raw chunk each, so only its last, partly filled
+  part is rewritten and the new rows go into new parts;
+* cleaned series – the 7-day rolling mean of each new day comes from the
+  persisted trailing window, and the new days are appended to each product
+  partition (series that stopped selling get zero days, new series start at
+  their first sale, as in a full run).
+
+Finally the new rows are appended to the raw extract, so a later full
+rebuild sees the same history.
+
+Each part saves its state last and its other writes can be redone, so an
+append that fails part-way is finished by rerunning it on the same file:
+parts whose state already reaches the file's last day are skipped, the
+others drop any rows the failed attempt left and append again, and the raw
+extract is only extended if it does not already end with the file's rows. Units are integers, so every sum is exact and
+the result is byte-identical to a full rebuild; ``--verify`` runs that
+rebuild in a temporary directory and compares every file.
+
+    python notebook/incremental_ingest.py data/new_days.csv
+    python notebook/incremental_ingest.py --verify
+"""
+
+import argparse
+import filecmp
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+import chunked_ingest
+import portfolio_index
+import raw_schema
+import sku_store
+from series_keys import PRODUCT_KEY, extra_keys, sku_slug
+
+NOTEBOOK_DIR = Path(__file__).resolve().parent
+WINDOW = 7
+
+# running-total part → its group-key columns (festivals is a plain frame)
+REPORT_STATE = {
+    "latest_stock": [*chunked_ingest.PRODUCT_COLS, "Date"],
+    "spoilage": chunked_ingest.PRODUCT_COLS,
+    "seasonal": ["Month", "Category"],
+    "festivals": None,
+    "weather": ["Temp_Rounded"],
+}
+
+
+# ───── STATE ─────
+def save_report_state(total):
+    for part, index in REPORT_STATE.items():
+        frame = total[part]
+        if isinstance(frame, pd.Series):
+            frame = frame.to_frame()
+        if index is not None:
+            frame = frame.reset_index()
+        sku_store.write_state(f"reports_{part}", raw_schema.plain(frame))
+
+
+def load_report_state():
+    """The running totals saved by the last full or append run, or None."""
+    total = {}
+    for part, index in REPORT_STATE.items():
+        frame = sku_store.read_state(f"reports_{part}")
+        if frame is None:
+            return None
+        if index is not None:
+            frame = frame.set_index(index)
+            if part == "latest_stock":
+                frame = frame["Ending_Stock"]
+        total[part] = frame
+    return total
+
+
+def save_daily_state(dataset, filled, keys):
+    """Keep each series' last WINDOW - 1 calendar-filled totals – all a new day's window needs."""
+    tail = filled.groupby(level=keys, sort=False).tail(WINDOW - 1)
+    sku_store.write_state(f"daily_tail_{dataset}", tail.reset_index())
+
+
+def daily_states():
+    """{dataset: series keys} of every cleaned level with a persisted trailing window."""
+    states = {}
+    for path in sorted(sku_store.STATE_DIR.glob("daily_tail_*.parquet")):
+        dataset = path.stem[len("daily_tail_"):]
+        columns = pq.read_schema(path).names
+        states[dataset] = [c for c in columns if c not in ("Date", "Units_Sold")]
+    return states
+
+
+def _last_day(frame, column="Date"):
+    return frame[column].max() if frame is not None and not frame.empty else None
+
+
+# ───── APPEND ─────
+def _rebatch(frames, rows):
+    """Re-cut a stream of frames into frames of exactly ``rows`` rows (the last may be shorter)."""
+    pending, count = [], 0
+    for frame in frames:
+        pending.append(frame)
+        count += len(frame)
+        while count >= rows:
+            merged = pd.concat(pending, ignore_index=True)
+            yield merged.iloc[:rows]
+            pending, count = [merged.iloc[rows:]], count - rows
+    if count:
+        yield pd.concat(pending, ignore_index=True)
+
+
+def append_reports(path, chunksize=chunked_ingest.CHUNK_ROWS):
+    """Fold ``path`` into the summary tables; stock_levels only has its last part rewritten."""
+    total = load_report_state()
+    if total is None:
+        raise FileNotFoundError("no report state – run generating_csv.py once before appending")
+    history_end = _last_day(total["latest_stock"].reset_index())
+    folded = {}
+
+    # Rows after the state's last day are left over from a failed append; they sit in the last parts
+    parts = sku_store.table_parts("stock_levels")
+    first, tail = len(parts), None
+    while first > 0 and tail is None:
+        first -= 1
+        frame = pd.read_parquet(parts[first])
+        frame = frame[frame["Date"] <= history_end]
+        tail = frame if not frame.empty else None
+
+    def stock_chunks():
+        if tail is not None:
+            yield tail
+        folded["total"] = yield from chunked_ingest.fold_reports(path, chunksize, total)
+
+    # A full run writes one part per chunk of raw rows: top up the last part, then add new ones
+    sku_store.write_table_parts("stock_levels", _rebatch(stock_chunks(), chunksize), first=first)
+    for name, table in chunked_ingest.finish_reports(folded["total"]).items():
+        sku_store.write_table(name, table)
+    save_report_state(folded["total"])
+
+
+def append_daily(path, dataset, keys, chunksize=chunked_ingest.CHUNK_ROWS):
+    """Extend one cleaned level with the days in ``path``; returns the number of rows added."""
+    state = sku_store.read_state(f"daily_tail_{dataset}")
+    tail = state.set_index([*keys, "Date"])["Units_Sold"]
+    last = tail.index.get_level_values("Date").max()
+
+    new = chunked_ingest.fold_daily(path, keys, chunksize)
+    filled = chunked_ingest.fill_calendar(pd.concat([tail, new]), keys)
+    smoothed = chunked_ingest.rolling_mean(filled, keys)
+    added = smoothed[smoothed["Date"] > last]
+
+    extra = extra_keys(keys)
+    columns = [*extra, "Date", "Units_Sold"]
+    for product, rows in added.groupby(PRODUCT_KEY, sort=False):
+        sku = sku_slug(product)
+        stored = sku_store.read_series(dataset, sku, end=last)   # not days a failed append left
+        series = rows[columns] if stored is None else pd.concat([stored[columns], rows[columns]])
+        sku_store.write_series(dataset, sku, series.sort_values([*extra, "Date"], kind="stable"))
+    save_daily_state(dataset, filled, keys)
+    return len(added)
+
+
+def _append_source(path, source=chunked_ingest.SOURCE_FILE):
+    """Append ``path``'s rows (without its header) to the raw extract; cut back to its old size on failure."""
+    with open(source, "rb") as fh:
+        size = fh.seek(0, os.SEEK_END)
+        needs_newline = False
+        if size > 0:
+            fh.seek(-1, os.SEEK_END)
+            needs_newline = fh.read(1) != b"\n"
+    try:
+        with open(path, "rb") as src, open(source, "ab") as dst:
+            src.readline()
+            if needs_newline:
+                dst.write(b"\n")
+            for line in src:
+                dst.write(line)
+    except BaseException:
+        os.truncate(source, size)
+        raise
+
+
+def _source_has(path, source=chunked_ingest.SOURCE_FILE):
+    """True if the raw extract already ends with ``path``'s rows (an earlier append got that far)."""
+    with open(path, "rb") as src:
+        src.readline()
+        rows = src.read()
+    with open(source, "rb") as fh:
+        size = fh.seek(0, os.SEEK_END)
+        if size < len(rows):
+            return False
+        fh.seek(size - len(rows))
+        return fh.read() == rows
+
+
+def _pending(name, end, first, last):
+    """Whether a part ingested up to ``end`` still needs the days first..last (False: it already has them)."""
+    if end is None or end < first:
+        return True
+    if end >= last:
+        print(f"⏭️ {name}: already runs to {end.date()} – skipped")
+        return False
+    raise ValueError(f"new days run {first.date()}–{last.date()}, but {name} already runs to {end.date()} "
+                     f"– rebuild with 01 and generating_csv.py instead")
+
+
+def append(path, chunksize=chunked_ingest.CHUNK_ROWS, extend_source=True):
+    """Ingest the new rows in ``path`` into every persisted level and the summary tables.
+
+    Rerunning the same file after a failure finishes the parts it did not reach.
+    """
+    # Validate before touching anything: schema, and which parts still need these days
+    spans = [(chunk["Date"].min(), chunk["Date"].max())
+             for chunk in raw_schema.read_raw(path, usecols=["Date"], chunksize=chunksize)]
+    first, last = min(s[0] for s in spans), max(s[1] for s in spans)
+    reports = _pending("summary tables", _last_day(sku_store.read_state("reports_latest_stock")), first, last)
+    levels = {dataset: keys for dataset, keys in daily_states().items()
+              if _pending(dataset, _last_day(sku_store.read_state(f"daily_tail_{dataset}")), first, last)}
+    source = extend_source and not _source_has(path)
+
+    start = time.perf_counter()
+    if reports:
+        append_reports(path, chunksize)
+        print(f"✅ Summary tables updated from {path}")
+    for dataset, keys in levels.items():
+        added = append_daily(path, dataset, keys, chunksize)
+        print(f"✅ {dataset}: {added:,} new daily rows appended")
+    if source:
+        _append_source(path)
+        print(f"✅ Rows appended to {chunked_ingest.SOURCE_FILE}")
+    if portfolio_index.write_index():
+        print("✅ Portfolio index refreshed")
+    print(f"🏁 Append took {time.perf_counter() - start:.1f}s")
+
+
+# ───── VERIFY ─────
+def verify(chunksize=chunked_ingest.CHUNK_ROWS):
+    """Rebuild from the raw extract in a temporary directory; list every file that differs from the store."""
+    levels = daily_states()
+    with tempfile.TemporaryDirectory() as tmp:
+        (Path(tmp) / "data").mkdir()
+        os.symlink(Path(chunked_ingest.SOURCE_FILE).resolve(), Path(tmp) / chunked_ingest.SOURCE_FILE)
+        env = {**os.environ, "INGEST_CHUNK_ROWS": str(chunksize)}
+        runs = [[NOTEBOOK_DIR / "01_data_preprocessing.py", "--keys", ",".join(keys), "--chunksize", str(chunksize)]
+                for keys in levels.values()]
+        runs.append([NOTEBOOK_DIR / "generating_csv.py"])
+        for argv in runs:
+            subprocess.run([sys.executable, *map(str, argv)], cwd=tmp, env=env, check=True,
+                           stdout=subprocess.DEVNULL)
+
+        rebuilt = Path(tmp) / sku_store.STORE_DIR
+        compared, mismatched = 0, []
+        for dirs in [list(levels), ["tables", "state"]]:
+            for name in dirs:
+                for expected in sorted((rebuilt / name).rglob("*.parquet")):
+                    actual = sku_store.STORE_DIR / expected.relative_to(rebuilt)
+                    compared += 1
+                    if not actual.exists() or not filecmp.cmp(expected, actual, shallow=False):
+                        mismatched.append(str(actual))
+        for dataset in levels:
+            extra = {p.parent.name for p in (sku_store.STORE_DIR / dataset).glob("sku=*/part-0.parquet")} - \
+                    {p.parent.name for p in (rebuilt / dataset).glob("sku=*/part-0.parquet")}
+            mismatched += [f"{sku_store.STORE_DIR / dataset / p} (not in the rebuild)" for p in sorted(extra)]
+    return compared, mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append new days of raw sales, or verify against a full rebuild.")
+    parser.add_argument("input", nargs="?", help="CSV of new rows in the raw extract's schema")
+    parser.add_argument("--chunksize", type=int, default=chunked_ingest.CHUNK_ROWS,
+                        help=f"rows per chunk; must match the full runs' (default: {chunked_ingest.CHUNK_ROWS:,})")
+    parser.add_argument("--no-source-append", action="store_true",
+                        help="do not append the new rows to the raw extract")
+    parser.add_argument("--verify", action="store_true",
+                        help="rebuild everything in a temporary directory and compare byte for byte")
+    args = parser.parse_args()
+    if not args.input and not args.verify:
+        parser.error("give a CSV of new rows to append, or --verify")
+
+    if args.input:
+        append(args.input, args.chunksize, extend_source=not args.no_source_append)
+    if args.verify:
+        compared, mismatched = verify(args.chunksize)
+        if mismatched:
+            print(f"❌ {len(mismatched)} of {compared} files differ from a full rebuild:")
+            for path in mismatched:
+                print(f"   {path}")
+            sys.exit(1)
+        print(f"✅ All {compared} files are byte-identical to a full rebuild")
+
+
+if __name__ == "__main__":
+    main()
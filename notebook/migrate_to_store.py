@@ -0,0 +1,113 @@
+"""
+migrate_to_store.py
+One-shot conversion of the legacy CSV layout in data/processed/ into the
+Parquet store (see sku_store.py), with a size and read-time comparison.
+
+    python notebook/migrate_to_store.py              # convert, keep the CSVs
+    python notebook/migrate_to_store.py --remove-csv # convert, verify, delete the CSVs
+
+Files already present in the store are newer than their CSV (the pipeline
+writes Parquet only), so they are never overwritten; --remove-csv keeps any
+CSV whose store copy no longer matches it.
+"""
+
+import argparse
+import time
+
+import pandas as pd
+
+import sku_store
+from sku_store import FORECAST_COLUMNS, LEGACY_DIR
+
+SUMMARY_TABLES = ["stock_levels", "spoilage_summary", "seasonal_demand", "festival_dates", "weather_demand"]
+
+
+def _timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def report(migrated):
+    csv_bytes = sum(c.stat().st_size for c, _ in migrated)
+    pq_bytes = sum(p.stat().st_size for _, p in migrated)
+    print(f"\n💾 Size: CSV {csv_bytes / 1024:,.1f} KiB → Parquet {pq_bytes / 1024:,.1f} KiB "
+          f"({100 * (1 - pq_bytes / csv_bytes):.0f}% smaller)")
+
+    # Dashboard access pattern: the 4 forecast columns of every migrated SKU
+    forecasts = [(c, p) for c, p in migrated if p.parent.parent.name == "forecast"]
+    if forecasts:
+        csv_time = _timed(lambda: [pd.read_csv(c, parse_dates=["ds"])[FORECAST_COLUMNS] for c, _ in forecasts])
+        pq_time = _timed(lambda: [pd.read_parquet(p, columns=FORECAST_COLUMNS) for _, p in forecasts])
+        print(f"⏱️ Dashboard forecast read ({len(forecasts)} SKUs, 4 columns): "
+              f"CSV {csv_time * 1000:.1f} ms → Parquet {pq_time * 1000:.1f} ms ({csv_time / pq_time:.1f}× faster)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate data/processed CSVs into the Parquet store.")
+    parser.add_argument("--remove-csv", action="store_true",
+                        help="delete each legacy CSV once its Parquet copy reads back identically")
+    args = parser.parse_args()
+
+    migrated = []  # (legacy csv, parquet) converted by this run
+    pairs = []     # (legacy csv, parquet, reread-from-csv) for every CSV with a store copy
+
+    # --------------------------------------------------------------------
+    # Per-SKU series
+    # --------------------------------------------------------------------
+    for dataset, (date_col, _) in sku_store.SERIES_SCHEMAS.items():
+        for sku in sku_store.list_skus(dataset):
+            csv_path = sku_store.legacy_path(dataset, sku)
+            if not csv_path.exists():
+                continue
+            out = sku_store.partition_path(dataset, sku)
+            if not out.exists():
+                sku_store.write_series(dataset, sku, pd.read_csv(csv_path, parse_dates=[date_col]))
+                migrated.append((csv_path, out))
+                print(f"✅ {csv_path} → {out}")
+            pairs.append((csv_path, out, lambda p=csv_path, c=date_col: pd.read_csv(p, parse_dates=[c])))
+
+    # --------------------------------------------------------------------
+    # Summary tables
+    # --------------------------------------------------------------------
+    for name in SUMMARY_TABLES:
+        csv_path = LEGACY_DIR / f"{name}.csv"
+        if not csv_path.exists() or sku_store.table_parts(name):   # parts are only written by the pipeline
+            continue
+        dates = sku_store.TABLE_DATES.get(name)
+        out = sku_store.table_path(name)
+        if not out.exists():
+            sku_store.write_table(name, pd.read_csv(csv_path, parse_dates=dates))
+            migrated.append((csv_path, out))
+            print(f"✅ {csv_path} → {out}")
+        pairs.append((csv_path, out, lambda p=csv_path, d=dates: pd.read_csv(p, parse_dates=d)))
+
+    # --------------------------------------------------------------------
+    # Size & read-time report
+    # --------------------------------------------------------------------
+    if not migrated:
+        print("Nothing new to migrate.")
+    else:
+        report(migrated)
+
+    # --------------------------------------------------------------------
+    # Optional cleanup – only after an exact round-trip check
+    # --------------------------------------------------------------------
+    if args.remove_csv:
+        removed = 0
+        for csv_path, pq_path, read_csv in pairs:
+            try:
+                pd.testing.assert_frame_equal(read_csv(), pd.read_parquet(pq_path), check_dtype=False)
+            except AssertionError:
+                print(f"⚠️ Kept {csv_path}: store copy differs (rewritten by the pipeline since)")
+                continue
+            csv_path.unlink()
+            removed += 1
+        print(f"\n🗑️ Removed {removed} legacy CSVs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+model_registry.py
+Versioned store of fitted models.
+
+Layout:
+    models/<sku>/v0001.json          – serialized Prophet model (prophet.serialize)
+    models/<sku>/v0001.meta.json     – fit timestamp, data hash, model config,
+                                       fitted parameters for warm starts (warm_start.py)
+    models/_batch/v0001.npz          – batch-engine coefficients for every SKU in the run
+    models/_batch/v0001.meta.json    – fit timestamp, per-SKU data hashes, config, design spec
+    models/_batch_<level>/...        – the same for finer levels (see series_keys.py)
+
+Each Prophet SKU has its own folder, so parallel fit workers never write the
+same file; the batch engine fits the whole catalogue in one go and stores it
+as one bundle. The dashboard asks `latest_model` for whichever fit of a SKU is
+newest and predicts any horizon from it without refitting.
+
+Model keys carry the stamp of the version's meta file, so a registry that is
+wiped and rebuilt (reusing v0001) never serves a model cached from before.
+"""
+
+import json
+import os
+import re
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from prophet.serialize import model_from_json, model_to_json
+
+import batch_engine
+import forecast_output
+from pipeline_cache import file_stamp
+
+REGISTRY_DIR = Path("models")
+BATCH_DIR = REGISTRY_DIR / "_batch"
+KEEP_VERSIONS = 3  # older versions are pruned after each save
+
+
+def _sku_dir(sku):
+    return REGISTRY_DIR / sku
+
+
+def _versions_in(folder, suffix):
+    """Version numbers of the ``vNNNN<suffix>`` files in ``folder``, oldest first."""
+    if not folder.is_dir():
+        return []
+    pattern = re.compile(rf"^v(\d+){re.escape(suffix)}$")
+    return sorted(int(m.group(1)) for m in map(pattern.match, (p.name for p in folder.iterdir())) if m)
+
+
+def _write_atomic(path, text):
+    """Write ``text`` to a temporary name next to ``path`` and move it into place."""
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+def list_versions(sku):
+    """Version numbers stored for ``sku``, oldest first (a version counts once its meta exists)."""
+    return _versions_in(_sku_dir(sku), ".meta.json")
+
+
+def latest_version(sku):
+    versions = list_versions(sku)
+    return versions[-1] if versions else None
+
+
+def save_model(sku, model, data_hash, config, warm_state=None):
+    """Serialize a fitted model as the next version of ``sku``; returns the version.
+
+    ``warm_state`` (from `warm_start.fit`) is kept in the meta file so the next
+    refit can start from these parameters without loading the model.
+    """
+    folder = _sku_dir(sku)
+    folder.mkdir(parents=True, exist_ok=True)
+    version = (latest_version(sku) or 0) + 1
+
+    meta = {
+        "sku": sku,
+        "version": version,
+        "fitted_at": datetime.now().isoformat(timespec="seconds"),
+        "data_hash": data_hash,
+        "config": config,
+        "history_end": str(model.history["ds"].max().date()),
+    }
+    if warm_state is not None:
+        meta["warm_start"] = warm_state
+    # Meta last: readers never see a version whose model or meta is still being written
+    _write_atomic(folder / f"v{version:04d}.json", model_to_json(model))
+    _write_atomic(folder / f"v{version:04d}.meta.json", json.dumps(meta, indent=2, default=str))
+
+    for old in list_versions(sku)[:-KEEP_VERSIONS]:
+        (folder / f"v{old:04d}.meta.json").unlink(missing_ok=True)
+        (folder / f"v{old:04d}.json").unlink(missing_ok=True)
+    return version
+
+
+def load_meta(sku, version=None):
+    version = version or latest_version(sku)
+    if version is None:
+        return None
+    return json.loads((_sku_dir(sku) / f"v{version:04d}.meta.json").read_text())
+
+
+def warm_state(sku):
+    """Warm-start record of the newest Prophet fit of ``sku``, or None."""
+    meta = load_meta(sku)
+    return meta.get("warm_start") if meta else None
+
+
+def _meta_stamp(path):
+    """(mtime_ns, size) of a meta file – part of every model key and cache key."""
+    return file_stamp(path)[1:]
+
+
+def _batch_dir(level):
+    return BATCH_DIR if level == "product" else REGISTRY_DIR / f"_batch_{level}"
+
+
+def save_batch(fit, spec, skus, history_end, data_hashes, config, level="product"):
+    """Store one batch-engine run (all of ``skus``) as the next bundle version.
+
+    ``skus`` are series ids; only product-level bundles feed `latest_model`.
+    """
+    folder = _batch_dir(level)
+    folder.mkdir(parents=True, exist_ok=True)
+    version = (_versions_in(folder, ".meta.json")[-1:] or [0])[0] + 1
+
+    np.savez_compressed(
+        folder / f"v{version:04d}.npz",
+        beta=fit["beta"], sigma=fit["sigma"], pattern=fit["pattern"], ainv=fit["ainv"],
+        history_end=np.array([history_end[s] for s in skus], dtype="datetime64[D]"),
+    )
+    # Written last: a bundle only counts once its meta exists
+    meta = {
+        "version": version,
+        "fitted_at": datetime.now().isoformat(timespec="seconds"),
+        "config": config,
+        "spec": spec,
+        "skus": list(skus),
+        "data_hashes": data_hashes,
+    }
+    _write_atomic(folder / f"v{version:04d}.meta.json", json.dumps(meta, indent=2, default=str))
+
+    for old in _versions_in(folder, ".meta.json")[:-KEEP_VERSIONS]:
+        (folder / f"v{old:04d}.meta.json").unlink(missing_ok=True)
+        (folder / f"v{old:04d}.npz").unlink(missing_ok=True)
+    return version
+
+
+@lru_cache(maxsize=8)
+def _load_batch_meta(version, stamp):
+    return json.loads((BATCH_DIR / f"v{version:04d}.meta.json").read_text())
+
+
+@lru_cache(maxsize=4)
+def _load_batch(version, stamp):
+    with np.load(BATCH_DIR / f"v{version:04d}.npz") as bundle:
+        return {k: bundle[k] for k in bundle.files}
+
+
+def _latest_batch():
+    versions = _versions_in(BATCH_DIR, ".meta.json")
+    return versions[-1] if versions else None
+
+
+def latest_model(sku):
+    """Key of the newest fit of ``sku`` – ``("prophet", version, stamp)`` or
+    ``("batch", version, stamp)`` – or None. ``stamp`` changes whenever the
+    version's meta file is rewritten.
+    """
+    candidates = []
+    version = latest_version(sku)
+    if version is not None:
+        stamp = _meta_stamp(_sku_dir(sku) / f"v{version:04d}.meta.json")
+        candidates.append((load_meta(sku, version)["fitted_at"], ("prophet", version, stamp)))
+    batch = _latest_batch()
+    if batch is not None:
+        stamp = _meta_stamp(BATCH_DIR / f"v{batch:04d}.meta.json")
+        meta = _load_batch_meta(batch, stamp)
+        if sku in meta["skus"]:
+            candidates.append((meta["fitted_at"], ("batch", batch, stamp)))
+    return max(candidates)[1] if candidates else None
+
+
+@lru_cache(maxsize=32)
+def load_model(sku, version, stamp=None):
+    """Deserialize one model version (cached per process and meta ``stamp``)."""
+    return model_from_json((_sku_dir(sku) / f"v{version:04d}.json").read_text())
+
+
+@lru_cache(maxsize=256)
+def _predict_horizon(sku, version, stamp, horizon):
+    model = load_model(sku, version, stamp)
+    return forecast_output.predict(model, horizon, history_days=0)
+
+
+@lru_cache(maxsize=256)
+def _predict_batch_horizon(sku, version, stamp, horizon):
+    meta, bundle = _load_batch_meta(version, stamp), _load_batch(version, stamp)
+    idx = meta["skus"].index(sku)
+    start = pd.Timestamp(bundle["history_end"][idx]) + pd.Timedelta(days=1)
+    dates = pd.date_range(start, periods=horizon, freq="D")
+    yhat, lower, upper = batch_engine.predict_batch(meta["spec"], bundle, dates, series=idx)
+    return pd.DataFrame({"ds": dates, "yhat": yhat[:, 0], "yhat_lower": lower[:, 0], "yhat_upper": upper[:, 0]})
+
+
+def forecast_horizon(sku, horizon, key=None):
+    """Future-only forecast of ``horizon`` days from the stored model.
+
+    ``key`` is a `latest_model` key (defaults to the newest fit). Returns None if
+    no model is registered for ``sku``. Results are cached per (sku, key,
+    horizon); a new fit bumps the version or the meta stamp and so misses the cache.
+    """
+    engine, version, stamp = key or latest_model(sku) or (None, None, None)
+    if engine == "prophet":
+        return _predict_horizon(sku, version, stamp, int(horizon)).copy()
+    if engine == "batch":
+        return _predict_batch_horizon(sku, version, stamp, int(horizon)).copy()
+    return None
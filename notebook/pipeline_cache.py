@@ -0,0 +1,114 @@
+"""
+pipeline_cache.py
+Content-hash manifest shared by the pipeline stages.
+
+Each stage records, per SKU, a digest of the inputs it consumed plus the
+settings it ran with. On the next run a SKU whose digest is unchanged (and
+whose outputs still exist) is skipped and its previous outputs are reused.
+"""
+
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+MANIFEST_PATH = Path("data/processed/pipeline_manifest.json")
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """sha256 of a file's bytes."""
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def combined_digest(*parts):
+    """Digest of several digests / settings dicts, order-sensitive."""
+    h = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, str):
+            part = json.dumps(part, sort_keys=True, default=str)
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def file_stamp(path):
+    """Cheap change marker for a file: ``(path, mtime_ns, size)``, or ``(path, None, None)`` if missing."""
+    try:
+        st = os.stat(path)
+    except (OSError, TypeError):
+        return (str(path), None, None)
+    return (str(path), st.st_mtime_ns, st.st_size)
+
+
+class Manifest:
+    """JSON manifest of ``{stage: {key: {"digest": ..., "updated": ..., ...}}}``.
+
+    Stages may run concurrently (see run_pipeline.py), so ``save`` re-reads
+    the file under a lock and writes back only the entries this instance
+    recorded.
+    """
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = Path(path)
+        self.entries = self._load()
+        self._recorded = set()
+
+    def _load(self):
+        if self.path.exists():
+            with open(self.path) as fh:
+                return json.load(fh)
+        return {}
+
+    def get(self, stage, key):
+        return self.entries.get(stage, {}).get(key)
+
+    def is_fresh(self, stage, key, digest, outputs=()):
+        """True if ``key`` was last built from ``digest`` and its outputs still exist."""
+        entry = self.get(stage, key)
+        return (
+            entry is not None
+            and entry.get("digest") == digest
+            and all(os.path.exists(p) for p in outputs)
+        )
+
+    def record(self, stage, key, digest, **extra):
+        self.entries.setdefault(stage, {})[key] = {
+            "digest": digest,
+            "updated": datetime.now().isoformat(timespec="seconds"),
+            **extra,
+        }
+        self._recorded.add((stage, key))
+
+    def save(self, timeout=60.0):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lock = self.path.with_suffix(".lock")
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                if time.monotonic() > deadline:
+                    # A crashed writer left its lock behind; take it over
+                    os.remove(lock)
+                    continue
+                time.sleep(0.05)
+        try:
+            merged = self._load()
+            for stage, key in self._recorded:
+                merged.setdefault(stage, {})[key] = self.entries[stage][key]
+            tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "w") as fh:
+                json.dump(merged, fh, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+            self.entries = merged
+            self._recorded.clear()
+        finally:
+            os.close(fd)
+            os.remove(lock)
@@ -0,0 +1,87 @@
+"""
+portfolio_index.py
+One-row-per-SKU summary of the product-level forecasts for the dashboard Overview tab.
+
+The Overview used to open every SKU's forecast on each rerun just to sum its
+next 30 days. This index is built once by the pipeline (end of
+02_prophet_forecasting.py and generating_csv.py) and stored as the
+``portfolio_index`` table, so the dashboard needs a single small read:
+
+    SKU, Product, Forecast_Rows, Forecast_Start, Last_Forecast_Date,
+    Demand_7d, Demand_14d, Demand_30d, Peak_Demand, Peak_Date,
+    Next_Festival, Next_Festival_Date
+
+Demand windows and the peak cover the forecast days after each SKU's last
+cleaned observation; the next festival is the first one on or after the
+forecast start.
+
+    python notebook/portfolio_index.py
+"""
+
+import numpy as np
+import pandas as pd
+
+import sku_store
+
+INDEX_TABLE = "portfolio_index"
+WINDOWS = (7, 14, 30)
+
+
+def _history_end(skus):
+    """Last cleaned date per SKU (NaT where the SKU has no cleaned series)."""
+    ends = {}
+    for sku in skus:
+        df = sku_store.read_series("cleaned", sku, columns=["Date"])
+        ends[sku] = df["Date"].max() if df is not None and not df.empty else pd.NaT
+    return pd.Series(ends, dtype="datetime64[ns]")
+
+
+def build_index(festivals=None):
+    """Portfolio index frame built from every product-level forecast, or None if there are none."""
+    fc = sku_store.read_dataset("forecast", columns=["ds", "yhat"])
+    if fc is None or fc.empty:
+        return None
+
+    last = fc.groupby("sku")["ds"].max()
+    end = _history_end(last.index)
+    # Without a cleaned series, treat the last window-length of days as the future
+    end = end.fillna(last - pd.Timedelta(days=max(WINDOWS)))
+    fc["day"] = (fc["ds"] - fc["sku"].map(end)).dt.days
+    future = fc[fc["day"] >= 1]
+
+    index = pd.DataFrame({
+        "Product": last.index.str.replace("_", " ").str.title(),
+        "Forecast_Rows": fc.groupby("sku").size(),
+        "Forecast_Start": end + pd.Timedelta(days=1),
+        "Last_Forecast_Date": last,
+    })
+    for days in WINDOWS:
+        index[f"Demand_{days}d"] = future[future["day"] <= days].groupby("sku")["yhat"].sum()
+    peak = future.loc[future.groupby("sku")["yhat"].idxmax(), ["sku", "yhat", "ds"]].set_index("sku")
+    index["Peak_Demand"] = peak["yhat"]
+    index["Peak_Date"] = peak["ds"]
+
+    index["Next_Festival"] = None
+    index["Next_Festival_Date"] = pd.NaT
+    if festivals is not None and not festivals.empty:
+        fest = festivals.sort_values("Date").reset_index(drop=True)
+        pos = np.searchsorted(fest["Date"].to_numpy(), index["Forecast_Start"].to_numpy())
+        found = pos < len(fest)
+        index.loc[found, "Next_Festival"] = fest["Festival_Name"].to_numpy()[pos[found]]
+        index.loc[found, "Next_Festival_Date"] = fest["Date"].to_numpy()[pos[found]]
+
+    index[[f"Demand_{d}d" for d in WINDOWS]] = index[[f"Demand_{d}d" for d in WINDOWS]].fillna(0.0)
+    return index.rename_axis("SKU").reset_index()
+
+
+def write_index():
+    """Rebuild and store the index; returns its path, or None if there are no forecasts yet."""
+    index = build_index(sku_store.read_table("festival_dates"))
+    if index is None:
+        return None
+    return sku_store.write_table(INDEX_TABLE, index)
+
+
+if __name__ == "__main__":
+    path = write_index()
+    print(f"✅ Portfolio index saved to {path}" if path else "⚠️ No forecasts yet – run 02 first")
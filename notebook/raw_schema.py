@@ -0,0 +1,199 @@
+"""
+raw_schema.py
+Typed schema of the raw sales extract (faviy_dairy_cleaned_extended_with_festivals.csv).
+
+Every reader of the raw file goes through ``read_raw``, which applies the
+schema at read time instead of pandas' defaults:
+
+* repeated strings (product, category, location, channel, promotion type,
+  weekday, month, festival name) → ``category``;
+* integers → the smallest type that fits the column's range (int8 flags,
+  int32 counts and prices), floats → float32 except money;
+* ``Discount_Applied`` "10%" → 0.10 (float32);
+* ``Date`` parsed as ``%Y-%m-%d``.
+
+The schema is checked as the file is read, so drift fails fast with a
+``SchemaDriftError`` naming the column: a missing, extra or reordered
+column, an unparseable date or number, an integer outside its declared
+range, a discount that is not a percentage, or a weekday/month/flag value
+outside its domain.
+
+Downstream tables keep their existing column types – aggregates are summed
+in int64 and string columns are written as plain strings (see ``plain``).
+
+    python notebook/raw_schema.py           # memory per column, default dtypes vs schema
+"""
+
+import argparse
+import calendar
+
+import numpy as np
+import pandas as pd
+
+SOURCE_FILE = "data/faviy_dairy_cleaned_extended_with_festivals.csv"
+DATE_FORMAT = "%Y-%m-%d"
+
+# Column order of the extract; any difference is schema drift
+RAW_COLUMNS = [
+    "Date", "Product_ID", "Product_Name", "Category", "Units_Sold", "Unit_Price", "Revenue",
+    "Discount_Applied", "Net_Revenue", "Location", "Sales_Channel", "Promotion_Flag", "Promotion_Type",
+    "Festival_Flag", "Stockout_Flag", "Restocked_Units", "Spoilage_Units", "Day_of_Week", "Week_Number",
+    "Month", "Temperature", "Festival_Name",
+]
+
+CATEGORICAL = ["Product_ID", "Product_Name", "Category", "Location", "Sales_Channel", "Promotion_Type",
+               "Day_of_Week", "Month", "Festival_Name"]
+
+# Categoricals with a closed domain; a value outside it is drift
+DOMAINS = {
+    "Day_of_Week": list(calendar.day_name),
+    "Month": list(calendar.month_name)[1:],
+}
+
+# integer column → in-memory type; values outside its range are drift
+INTEGERS = {
+    "Units_Sold": "int32", "Unit_Price": "int32", "Revenue": "int32",
+    "Restocked_Units": "int32", "Spoilage_Units": "int32",
+    "Promotion_Flag": "int8", "Festival_Flag": "int8", "Stockout_Flag": "int8",
+    "Week_Number": "int8",
+}
+FLAGS = ["Promotion_Flag", "Festival_Flag", "Stockout_Flag"]
+
+FLOATS = {"Net_Revenue": "float64", "Temperature": "float32"}
+
+DISCOUNT = "Discount_Applied"   # "10%" → 0.10
+
+
+class SchemaDriftError(ValueError):
+    """The raw file no longer matches RAW_COLUMNS / the declared types."""
+
+
+def check_header(path=SOURCE_FILE):
+    """Raise SchemaDriftError unless the file's header is exactly RAW_COLUMNS."""
+    columns = list(pd.read_csv(path, nrows=0).columns)
+    if columns != RAW_COLUMNS:
+        missing = [c for c in RAW_COLUMNS if c not in columns]
+        extra = [c for c in columns if c not in RAW_COLUMNS]
+        detail = f"missing {missing}, unexpected {extra}" if missing or extra else "columns reordered"
+        raise SchemaDriftError(f"{path}: header does not match the raw schema ({detail})")
+
+
+def _read_dtypes(usecols):
+    """dtypes handed to read_csv; integers are read wide and range-checked before downcasting."""
+    dtypes = {c: "category" for c in CATEGORICAL + [DISCOUNT]}
+    dtypes.update({c: "int64" for c in INTEGERS})
+    dtypes.update({c: "float64" for c in FLOATS})
+    return {c: t for c, t in dtypes.items() if c in usecols}
+
+
+def compact(df, path=SOURCE_FILE):
+    """Validate a frame read with ``_read_dtypes`` and convert it to the compact schema (in place)."""
+    if "Date" in df and not pd.api.types.is_datetime64_any_dtype(df["Date"]):
+        bad = df["Date"][pd.to_datetime(df["Date"], format=DATE_FORMAT, errors="coerce").isna()]
+        raise SchemaDriftError(f"{path}: Date is not {DATE_FORMAT}, e.g. {bad.iloc[0]!r}")
+
+    for col, dtype in INTEGERS.items():
+        if col not in df or df[col].empty:
+            continue
+        info = np.iinfo(dtype)
+        lo, hi = df[col].min(), df[col].max()
+        if lo < info.min or hi > info.max:
+            raise SchemaDriftError(f"{path}: {col} range [{lo}, {hi}] does not fit {dtype}")
+        if col in FLAGS and (lo < 0 or hi > 1):
+            raise SchemaDriftError(f"{path}: {col} has values outside 0/1 ([{lo}, {hi}])")
+        df[col] = df[col].astype(dtype)
+
+    for col, dtype in FLOATS.items():
+        if col in df:
+            df[col] = df[col].astype(dtype)
+
+    for col, domain in DOMAINS.items():
+        if col in df:
+            unknown = set(df[col].cat.categories) - set(domain)
+            if unknown:
+                raise SchemaDriftError(f"{path}: {col} has values outside its domain: {sorted(unknown)}")
+
+    if DISCOUNT in df:
+        # Parse each distinct label once, then map the codes
+        labels = df[DISCOUNT].cat.categories.astype(str)
+        ok = labels.str.fullmatch(r"\d+(\.\d+)?%")
+        if not ok.all():
+            raise SchemaDriftError(f"{path}: {DISCOUNT} values are not percentages: {sorted(labels[~ok])}")
+        fractions = (labels.str.rstrip("%").astype("float64").to_numpy() / 100).astype("float32")
+        codes = df[DISCOUNT].cat.codes.to_numpy()
+        df[DISCOUNT] = np.append(fractions, np.float32("nan"))[codes]   # code -1 (missing) → NaN
+    return df
+
+
+def read_raw(path=SOURCE_FILE, usecols=None, chunksize=None):
+    """The raw extract in the compact schema – a DataFrame, or an iterator of chunks if ``chunksize``.
+
+    ``usecols`` limits the columns read (``Date`` is always parsed when read).
+    """
+    check_header(path)
+    usecols = list(usecols or RAW_COLUMNS)
+    unknown = [c for c in usecols if c not in RAW_COLUMNS]
+    if unknown:
+        raise KeyError(f"not raw columns: {unknown}")
+    kwargs = dict(usecols=usecols, dtype=_read_dtypes(usecols),
+                  parse_dates=["Date"] if "Date" in usecols else False, date_format=DATE_FORMAT)
+    try:
+        if chunksize is None:
+            return compact(pd.read_csv(path, **kwargs), path)
+        reader = pd.read_csv(path, chunksize=chunksize, **kwargs)
+    except ValueError as exc:
+        if isinstance(exc, SchemaDriftError):
+            raise
+        raise SchemaDriftError(f"{path}: {exc}") from exc
+    return _compact_chunks(reader, path)
+
+
+def _compact_chunks(reader, path):
+    with reader:
+        while True:
+            try:
+                chunk = next(reader)
+            except StopIteration:
+                return
+            except ValueError as exc:
+                raise SchemaDriftError(f"{path}: {exc}") from exc
+            yield compact(chunk, path)
+
+
+def plain(df):
+    """Categorical columns back to plain strings, for tables written to the store."""
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+    return df
+
+
+def memory_report(before, after):
+    """Bytes per column of two frames with the same columns, plus a total row."""
+    report = pd.DataFrame({
+        "dtype_before": before.dtypes.astype(str),
+        "dtype_after": after.dtypes.astype(str),
+        "bytes_before": before.memory_usage(index=False, deep=True),
+        "bytes_after": after.memory_usage(index=False, deep=True),
+    })
+    report.loc["TOTAL"] = ["", "", report["bytes_before"].sum(), report["bytes_after"].sum()]
+    report["saved_%"] = (100 * (1 - report["bytes_after"] / report["bytes_before"])).round(1)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory of the raw extract with default dtypes vs the compact schema.")
+    parser.add_argument("--input", default=SOURCE_FILE, help=f"raw sales CSV (default: {SOURCE_FILE})")
+    args = parser.parse_args()
+
+    before = pd.read_csv(args.input)
+    after = read_raw(args.input)
+    print(memory_report(before, after).to_string())
+    total_before = before.memory_usage(index=False, deep=True).sum()
+    total_after = after.memory_usage(index=False, deep=True).sum()
+    print(f"\n📦 {len(after):,} rows: {total_before / 1024 ** 2:.2f} MB → {total_after / 1024 ** 2:.2f} MB "
+          f"({total_before / total_after:.1f}× smaller)")
+
+
+if __name__ == "__main__":
+    main()
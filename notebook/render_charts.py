@@ -0,0 +1,174 @@
+"""
+render_charts.py
+Forecast chart PNGs, rendered from the stored forecasts instead of inside the fit loop.
+
+The chart is the one Prophet's ``model.plot`` draws (observed points, forecast
+line, uncertainty band), rebuilt from the cleaned and forecast partitions, so
+it works for either engine and needs no fitted model. Each SKU gets three
+sizes:
+
+    results/forecast_charts/<sku>_plot.png         1000×600 (full)
+    results/forecast_charts/<sku>_plot_medium.png   500×300
+    results/forecast_charts/<sku>_plot_thumb.png    200×120
+
+As a pipeline stage it renders in parallel and only for SKUs whose forecast
+or actuals changed since their charts were drawn (pipeline manifest stage
+"charts"). The dashboard calls ``ensure_chart`` instead, which renders a
+missing or outdated chart on first request and serves the file afterwards.
+
+    python notebook/render_charts.py --workers 4
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from matplotlib.dates import AutoDateFormatter, AutoDateLocator
+from matplotlib.figure import Figure
+
+import run_log
+import sku_store
+from pipeline_cache import Manifest, combined_digest, file_digest
+
+PLOT_DIR = "results/forecast_charts/"
+STAGE = "charts"
+
+FIGSIZE = (10, 6)
+# size name → (file suffix, dpi); the full chart keeps the original file name
+SIZES = {
+    "full":   ("",        100),
+    "medium": ("_medium",  50),
+    "thumb":  ("_thumb",   20),
+}
+CHART_CONFIG = {"figsize": FIGSIZE, "sizes": SIZES, "style": "prophet-plot-v1"}
+
+
+def chart_path(sku, size="full"):
+    return f"{PLOT_DIR}{sku}_plot{SIZES[size][0]}.png"
+
+
+def input_paths(sku):
+    return [sku_store.series_path("forecast", sku), sku_store.series_path("cleaned", sku)]
+
+
+def render_chart(sku, timings=None):
+    """Draw and save every size of one SKU's chart; returns the full-size path.
+
+    ``timings``, if given, receives the seconds spent drawing (plot_s) and
+    rasterising and saving the files (write_s).
+    """
+    start = time.perf_counter()
+    forecast = sku_store.read_series("forecast", sku, columns=sku_store.FORECAST_COLUMNS)
+    if forecast is None:
+        raise FileNotFoundError(f"no stored forecast for {sku}")
+    actual = sku_store.read_series("cleaned", sku)
+
+    # A bare Figure (no pyplot state) is safe to draw from dashboard threads
+    fig = Figure(facecolor="w", figsize=FIGSIZE)
+    ax = fig.add_subplot(111)
+    if actual is not None:
+        ax.plot(actual["Date"], actual["Units_Sold"], "k.", label="Observed data points")
+    ax.plot(forecast["ds"], forecast["yhat"], ls="-", c="#0072B2", label="Forecast")
+    ax.fill_between(forecast["ds"], forecast["yhat_lower"], forecast["yhat_upper"],
+                    color="#0072B2", alpha=0.2, label="Uncertainty interval")
+    locator = AutoDateLocator(interval_multiples=False)
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(AutoDateFormatter(locator))
+    ax.grid(True, which="major", c="gray", ls="-", lw=1, alpha=0.2)
+    ax.set_xlabel("ds")
+    ax.set_ylabel("y")
+    periods = int((forecast["ds"] > actual["Date"].max()).sum()) if actual is not None else len(forecast)
+    ax.set_title(f"{sku.replace('_', ' ').title()} – Forecast ({periods} Days)")
+    fig.tight_layout()
+
+    write_start = time.perf_counter()
+    os.makedirs(PLOT_DIR, exist_ok=True)
+    for size, (_, dpi) in SIZES.items():
+        path = chart_path(sku, size)
+        # A unique temp name per call: dashboard sessions may render the same SKU at once
+        with tempfile.NamedTemporaryFile(dir=PLOT_DIR, prefix=f".{sku}", suffix=".png", delete=False) as tmp:
+            fig.savefig(tmp, dpi=dpi, format="png")
+        os.replace(tmp.name, path)
+    if timings is not None:
+        timings.update(plot_s=write_start - start, write_s=time.perf_counter() - write_start)
+    return chart_path(sku)
+
+
+def ensure_chart(sku, size="full"):
+    """Path of an up-to-date chart, rendering it first if it is missing or older than its inputs.
+
+    Returns None if the SKU has no stored forecast.
+    """
+    if sku_store.series_path("forecast", sku) is None:
+        return None
+    inputs = [p for p in input_paths(sku) if p is not None]
+    path = chart_path(sku, size)
+    if not (os.path.exists(path) and os.path.getmtime(path) >= max(os.path.getmtime(p) for p in inputs)):
+        render_chart(sku)
+    return path
+
+
+def _render(sku):
+    """Worker wrapper: render one SKU and report success or the traceback."""
+    start = time.perf_counter()
+    timings = {}
+    try:
+        render_chart(sku, timings)
+        return {"product": sku, "ok": True, "total_s": time.perf_counter() - start, "error": None, **timings}
+    except Exception:
+        return {"product": sku, "ok": False, "total_s": time.perf_counter() - start,
+                "error": traceback.format_exc()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render forecast chart PNGs for SKUs whose forecast changed.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes to render with; 1 runs serially (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="re-render every SKU's charts")
+    args = parser.parse_args()
+
+    manifest = Manifest()
+    log = run_log.StageLog("charts")
+    digests, todo, skipped = {}, [], []
+    for sku in sku_store.list_skus("forecast"):
+        digests[sku] = combined_digest(*(file_digest(p) for p in input_paths(sku) if p is not None), CHART_CONFIG)
+        outputs = [chart_path(sku, size) for size in SIZES]
+        if not args.force and manifest.is_fresh(STAGE, sku, digests[sku], outputs):
+            skipped.append(sku)
+        else:
+            todo.append(sku)
+
+    workers = max(1, min(args.workers, len(todo)))
+    print(f"🖼️ Rendering charts for {len(todo)} SKUs ({workers} worker(s))")
+    run_start = time.perf_counter()
+    if workers == 1:
+        results = [_render(sku) for sku in todo]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_render, todo))
+
+    for i, result in enumerate(results, 1):
+        status = "✅" if result["ok"] else "❌"
+        print(f"{status} [{i}/{len(todo)}] {result['product']} ({result['total_s']:.2f}s)")
+        log.sku(result["product"], result["ok"], plot_s=result.get("plot_s"), write_s=result.get("write_s"),
+                total_s=result["total_s"])
+        if result["ok"]:
+            manifest.record(STAGE, result["product"], digests[result["product"]])
+        else:
+            print(result["error"])
+    manifest.save()
+    log.rows = len(results) * len(SIZES)   # files written
+    log.cache_hits, log.cache_misses = len(skipped), len(todo)
+    log.close(workers=workers)
+
+    print(f"♻️ Skipped {len(skipped)} unchanged SKUs, rendered {len(results)}")
+    print(f"🏁 Wall time: {time.perf_counter() - run_start:.1f}s")
+    if any(not r["ok"] for r in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""
+replenishment.py
+Reorder points, safety stock and order quantities for every SKU × location at once.
+
+Each series (a product at one location by default, any ``--keys`` level
+from series_keys.py) is planned as a periodic-review (s, S) policy: stock
+is reviewed every ``--review-days``, and an order placed today arrives
+after ``--lead-time`` days.
+
+    protection interval  lead time + review period – the demand an order must cover
+    service level        newsvendor critical ratio  c_u / (c_u + c_o), chosen on a
+                         grid of forecast quantiles (see below)
+    safety stock         z · σ over the protection interval (negative when the
+                         service level is below 50%)
+    reorder point  s     lead-time demand at the service level
+    order-up-to    S     protection-interval demand at the service level
+    order quantity       S − on hand once on hand ≤ s, capped at the demand that
+                         can sell within the shelf life after the order arrives
+
+Underage cost c_u is the margin lost on a unit short (``--margin`` of the
+net selling price from the extract). Overage cost c_o is what a unit left
+over at the end of the cycle costs: holding for another review period, plus
+its unit cost times the chance it spoils – the series' observed spoilage
+share (Spoilage_Units / (Units_Sold + Spoilage_Units)), or certain spoilage
+when the shelf life (spoilage_summary) does not outlast the review period.
+
+Demand comes from the stored forecasts: normal per day around yhat with the
+spread implied by the 80% interval, independent across days. If no forecast
+exists at the requested level, the product forecast is split across the
+series by their share of the product's sales (spread scaled by √share).
+Each series uses the forecast days after its latest sale, up to 30
+(forecast_window.py); series whose stored forecast does not cover the lead
+time + review period are reported and left out of the plan.
+Every series × quantile candidate is priced in one NumPy expression using
+the normal loss function, so thousands of SKU-locations solve in well under
+a second; the raw extract (prices, sales shares, spoilage) is read once in
+chunks.
+
+The plan goes to one store table per level, named like the forecast
+datasets (``plan_table``), one row per series: ``replenishment_plan_by_location``
+for the default SKU × location level, which the dashboards and downstream
+jobs read with ``sku_store.read_table("replenishment_plan_by_location")``;
+``--keys Product_Name`` writes ``replenishment_plan``. As the pipeline's
+"replenish" stage it reruns after every forecast refresh.
+
+    python notebook/replenishment.py                          # SKU × location
+    python notebook/replenishment.py --keys Product_Name --lead-time 1
+    python notebook/replenishment.py --scale 10000            # + timing on 10,000 synthetic series
+"""
+
+import argparse
+import time
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+import chunked_ingest
+import forecast_window
+import raw_schema
+import run_log
+import sku_store
+from series_keys import PRODUCT_KEY, dataset_name, extra_keys, parse_keys, sku_slug
+
+PLAN_TABLE     = "replenishment_plan"
+KEYS           = "Product_Name,Location"
+LEAD_TIME_DAYS = 2
+REVIEW_DAYS    = 1
+HORIZON        = 30
+MARGIN         = 0.30    # gross margin on the net selling price (the extract has no unit cost)
+HOLDING_RATE   = 0.001   # holding cost per unit and day, as a share of unit cost
+GRID = np.round(np.arange(0.01, 0.996, 0.005), 3)   # candidate service levels (forecast quantiles)
+
+
+def plan_table(keys):
+    """Store table holding the plan at this series level (as ``dataset_name`` names forecasts)."""
+    return dataset_name(PLAN_TABLE, keys)
+
+
+# ───── INPUTS ─────
+def history_stats(keys, path=chunked_ingest.SOURCE_FILE, chunksize=chunked_ingest.CHUNK_ROWS):
+    """Units sold, spoiled, net revenue and the last sale date per series, from one chunked pass."""
+    total = None
+    for chunk in chunked_ingest.read_chunks(path, chunksize,
+                                            usecols=["Date", *keys, "Units_Sold", "Spoilage_Units", "Net_Revenue"]):
+        part = (chunk.astype({"Units_Sold": "int64", "Spoilage_Units": "int64"})
+                     .groupby(keys, observed=True, sort=False)
+                     .agg(Units_Sold=("Units_Sold", "sum"), Spoilage_Units=("Spoilage_Units", "sum"),
+                          Net_Revenue=("Net_Revenue", "sum"), Last_Date=("Date", "max")))
+        total = part if total is None else (
+            pd.concat([total, part]).groupby(level=keys, observed=True, sort=False)
+              .agg({"Units_Sold": "sum", "Spoilage_Units": "sum", "Net_Revenue": "sum", "Last_Date": "max"}))
+    stats = raw_schema.plain(total.reset_index())
+    return stats.assign(sku=stats[PRODUCT_KEY].map(sku_slug))
+
+
+def load_inputs(keys=None, horizon=HORIZON):
+    """Demand, stock, shelf life, price and spoilage of every series with a forecast.
+
+    Returns a dict with a ``series`` frame (sku, extra key columns,
+    Plan_Date), aligned arrays (``mean``/``sd`` are series × days, zero past
+    each series' ``days``) and ``missing``, the series or products whose
+    forecast ends before their latest sale – or None if there are no forecasts.
+    """
+    keys = keys or parse_keys(KEYS)
+    extra = extra_keys(keys)
+    stats = history_stats(keys)
+    last_date = stats.groupby("sku")["Last_Date"].max()
+    by = ["sku", *extra]
+
+    fc = sku_store.read_dataset(dataset_name("forecast", keys), columns=[*extra, *sku_store.FORECAST_COLUMNS])
+    source, split = dataset_name("forecast", keys), False
+    if fc is None and extra:
+        fc = sku_store.read_dataset("forecast", columns=sku_store.FORECAST_COLUMNS)
+        source, split = "forecast, split by sales share", True
+    if fc is None:
+        return None
+
+    if split:
+        window = forecast_window.future_window(fc, ["sku"], last_date, horizon)
+        products = window["series"]
+        series = stats[by].merge(products, on="sku").sort_values(by, ignore_index=True)
+        row = pd.Index(products["sku"]).get_indexer(series["sku"])
+        share = _share(series, stats, by).to_numpy()
+        mean, sd = window["mean"][row] * share[:, None], window["sd"][row] * np.sqrt(share)[:, None]
+        days = window["days"][row]
+    else:
+        window = forecast_window.future_window(fc, by, last_date, horizon)
+        series, mean, sd, days = window["series"], window["mean"], window["sd"], window["days"]
+        share = _share(series, stats, by).to_numpy()
+    series = series.rename(columns={"Start": "Plan_Date"})
+
+    series_stats = series[by].merge(stats, on=by, how="left")
+    sold, spoiled = series_stats["Units_Sold"].fillna(0), series_stats["Spoilage_Units"].fillna(0)
+    product_price = stats.groupby("sku")["Net_Revenue"].sum() / stats.groupby("sku")["Units_Sold"].sum()
+    price = (series_stats["Net_Revenue"] / sold.where(sold > 0)).fillna(series["sku"].map(product_price))
+    return {
+        "series": series,
+        "source": source,
+        "mean": mean,
+        "sd": sd,
+        "days": days,
+        # The snapshot is per product, so each series holds its share of it
+        "stock": forecast_window.stock_on_hand(series["sku"]) * share,
+        "shelf": forecast_window.shelf_life(series["sku"]),
+        "price": price.fillna(0).to_numpy(float),
+        "spoil_rate": (spoiled / (sold + spoiled).where(sold + spoiled > 0)).fillna(0).to_numpy(float),
+        "missing": window["missing"],
+    }
+
+
+def select(inputs, keep):
+    """``inputs`` restricted to the series where the boolean array ``keep`` is set."""
+    return {name: value[keep].reset_index(drop=True) if name == "series"
+            else value[keep] if isinstance(value, np.ndarray) else value
+            for name, value in inputs.items()}
+
+
+def _share(series, stats, by):
+    """Each series' share of its product's units sold (1 at product level)."""
+    units = series[by].merge(stats[[*by, "Units_Sold"]], on=by, how="left")["Units_Sold"]
+    product = series["sku"].map(stats.groupby("sku")["Units_Sold"].sum())
+    return (units / product).fillna(0).clip(0, 1)
+
+
+# ───── OPTIMISATION ─────
+def _window(cum_mean, cum_var, start, end):
+    """Mean and sd of demand over days (start, end] from the zero-prefixed cumulative sums.
+
+    ``start`` and ``end`` are day counts, shared or one per series.
+    """
+    rows = np.arange(len(cum_mean))
+    return (cum_mean[rows, end] - cum_mean[rows, start],
+            np.sqrt(np.clip(cum_var[rows, end] - cum_var[rows, start], 0, None)))
+
+
+def plan(inputs, lead_time=LEAD_TIME_DAYS, review_days=REVIEW_DAYS, margin=MARGIN, holding_rate=HOLDING_RATE):
+    """Reorder point, safety stock and order quantity of every series in ``inputs`` (see load_inputs)."""
+    mean, sd, stock, shelf, days = inputs["mean"], inputs["sd"], inputs["stock"], inputs["shelf"], inputs["days"]
+    n = len(mean)
+    protection = lead_time + review_days
+    if (protection > days).any():
+        raise ValueError(f"lead time + review period ({protection} d) is longer than the forecast of "
+                         f"{(protection > days).sum()} series (as short as {days.min()} d)")
+    zero = np.zeros((n, 1))
+    cum_mean = np.hstack([zero, np.cumsum(mean, axis=1)])
+    cum_var = np.hstack([zero, np.cumsum(sd ** 2, axis=1)])
+    mu_lead, sd_lead = _window(cum_mean, cum_var, 0, lead_time)
+    mu_prot, sd_prot = _window(cum_mean, cum_var, 0, protection)
+
+    # Newsvendor costs per unit short / left over
+    cost = inputs["price"] * (1 - margin)
+    under = inputs["price"] * margin
+    spoil_risk = np.where(shelf <= review_days, 1.0, inputs["spoil_rate"])
+    over = cost * spoil_risk + holding_rate * cost * review_days
+
+    # Expected cost of ordering up to each candidate quantile, for every series at once (normal loss
+    # function: E[short] = σ(φ(z) − z(1 − q)), E[left over] = E[short] + zσ)
+    z_grid = np.array([NormalDist().inv_cdf(q) for q in GRID])
+    pdf_grid = np.exp(-z_grid ** 2 / 2) / np.sqrt(2 * np.pi)
+    short = sd_prot[:, None] * (pdf_grid - z_grid * (1 - GRID))[None, :]
+    left = short + sd_prot[:, None] * z_grid[None, :]
+    expected_cost = over[:, None] * left + under[:, None] * short
+    best = expected_cost.argmin(axis=1)
+    rows = np.arange(n)
+    z = z_grid[best]
+
+    safety = z * sd_prot
+    reorder_point = np.ceil(np.clip(mu_lead + z * sd_lead, 0, None))
+    order_up_to = np.ceil(np.clip(mu_prot + safety, 0, None))
+    # No more than can sell within the shelf life after arrival (no cap beyond the forecast horizon)
+    sellable_days = lead_time + shelf
+    mu_shelf, sd_shelf = _window(cum_mean, cum_var, lead_time, np.minimum(sellable_days, days))
+    max_order = np.where(sellable_days <= days, np.ceil(np.clip(mu_shelf + z * sd_shelf, 0, None)), np.inf)
+    order_qty = np.where(stock <= reorder_point, np.minimum(np.ceil(np.clip(order_up_to - stock, 0, None)), max_order), 0)
+
+    out = inputs["series"].rename(columns={"sku": "SKU"})
+    out = out.assign(
+        Shelf_Life_Days=shelf,
+        Lead_Time_Days=lead_time,
+        Review_Days=review_days,
+        Horizon_Days=days,
+        Unit_Price=inputs["price"],
+        Spoilage_Rate=inputs["spoil_rate"],
+        Critical_Ratio=under / np.where(under + over > 0, under + over, 1),
+        Service_Level=GRID[best],
+        Mean_Daily_Demand=mu_prot / protection,
+        Lead_Time_Demand=mu_lead,
+        Protection_Demand=mu_prot,
+        Demand_SD=sd_prot,
+        Safety_Stock=safety,
+        Reorder_Point=reorder_point,
+        Order_Up_To=order_up_to,
+        On_Hand=stock,
+        Order_Qty=order_qty,
+        Max_Order=np.where(np.isinf(max_order), np.nan, max_order),
+        Expected_Short=short[rows, best],
+        Expected_Spoilage=left[rows, best] * spoil_risk,
+        Fill_Rate=1 - short[rows, best] / np.where(mu_prot > 0, mu_prot, np.nan),
+        Expected_Cost=expected_cost[rows, best],
+    )
+    return out
+
+
+def synthetic_inputs(series, horizon=HORIZON, seed=7):
+    """Random SKU × location catalogue of ``series`` rows for timing runs."""
+    rng = np.random.default_rng(seed)
+    level = rng.uniform(5, 200, series)
+    mean = level[:, None] * (1 + 0.2 * np.sin(np.arange(horizon) * 2 * np.pi / 7))[None, :]
+    return {"series": pd.DataFrame({"sku": [f"sku_{i // 20:05d}" for i in range(series)],
+                                    "Location": [f"loc_{i % 20:02d}" for i in range(series)],
+                                    "Plan_Date": pd.Timestamp("2025-01-01")}),
+            "source": "synthetic", "mean": mean, "sd": 0.2 * mean, "days": np.full(series, horizon),
+            "stock": level * rng.uniform(0, 3, series),
+            "shelf": rng.choice([2, 3, 4, 5, 7, 30, 60, 90, 120, 180], series),
+            "price": rng.uniform(20, 600, series), "spoil_rate": rng.uniform(0, 0.05, series)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan reorder points and order quantities for every series.")
+    parser.add_argument("--keys", default=KEYS, help=f"series level, as in 01–03 (default: {KEYS})")
+    parser.add_argument("--lead-time", type=int, default=LEAD_TIME_DAYS,
+                        help=f"days from order to delivery (default: {LEAD_TIME_DAYS})")
+    parser.add_argument("--review-days", type=int, default=REVIEW_DAYS,
+                        help=f"days between stock reviews (default: {REVIEW_DAYS})")
+    parser.add_argument("--margin", type=float, default=MARGIN,
+                        help=f"gross margin on the net selling price (default: {MARGIN})")
+    parser.add_argument("--holding-rate", type=float, default=HOLDING_RATE,
+                        help=f"holding cost per unit-day as a share of unit cost (default: {HOLDING_RATE})")
+    parser.add_argument("--scale", type=int, default=0,
+                        help="also time a run on this many synthetic series (nothing is written)")
+    args = parser.parse_args()
+
+    keys = parse_keys(args.keys)
+    log = run_log.StageLog("replenish", level=args.keys)
+    inputs = load_inputs(keys)
+    if inputs is None:
+        raise SystemExit("❌ No stored forecasts – run 02_prophet_forecasting.py first")
+    if len(inputs["missing"]):
+        print(f"⚠️ Not planned, no forecast days after the latest sale: "
+              f"{forecast_window.describe(inputs['missing'])} – {forecast_window.RERUN_HINT}")
+    protection = args.lead_time + args.review_days
+    short = inputs["days"] < protection
+    if short.all():
+        raise SystemExit(f"❌ No stored forecast covers the {protection}-day lead time + review period "
+                         f"after the latest sale – {forecast_window.RERUN_HINT}")
+    if short.any():
+        print(f"⚠️ Not planned, fewer than {protection} forecast days: "
+              f"{forecast_window.describe(inputs['series'].loc[short, ['sku', *extra_keys(keys)]])}")
+        inputs = select(inputs, ~short)
+    start = time.perf_counter()
+    table = plan(inputs, args.lead_time, args.review_days, args.margin, args.holding_rate)
+    elapsed = time.perf_counter() - start
+    sku_store.write_table(plan_table(keys), table)
+    log.rows = len(table)
+    log.close(source=inputs["source"], lead_time=args.lead_time, review_days=args.review_days,
+              missing=len(inputs["missing"]), short=int(short.sum()))
+
+    print(f"🚚 {len(table)} series ({inputs['source']}) planned in {elapsed * 1000:.0f} ms")
+    cols = ["SKU", *extra_keys(keys), "Shelf_Life_Days", "Service_Level", "Safety_Stock", "Reorder_Point",
+            "Order_Up_To", "On_Hand", "Order_Qty", "Fill_Rate"]
+    print(table[cols].to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+    print(f"✅ Plan saved to {sku_store.table_path(plan_table(keys))}")
+
+    if args.scale:
+        synthetic = synthetic_inputs(args.scale)
+        start = time.perf_counter()
+        plan(synthetic, args.lead_time, args.review_days, args.margin, args.holding_rate)
+        elapsed = time.perf_counter() - start
+        print(f"⏱️ {args.scale:,} synthetic series × {len(GRID)} candidate quantiles in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
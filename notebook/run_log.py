@@ -0,0 +1,176 @@
+"""
+run_log.py
+Structured per-stage and per-SKU timings of the pipeline, as JSON lines.
+
+Every stage appends to data/processed/run_log.jsonl when it finishes:
+
+    {"event": "sku",   "run_id", "stage", "sku", "ok", "fit_s", "predict_s", "plot_s", "write_s", "total_s", ...}
+    {"event": "stage", "run_id", "stage", "level", "started", "duration_s", "ok",
+     "peak_rss_mb", "children_peak_rss_mb", "rows", "skus", "cache_hits", "cache_misses"}
+
+``peak_rss_mb`` is the stage process's own high-water mark;
+``children_peak_rss_mb`` is the largest child process it waited for (pool
+workers, CmdStan fits).
+``cache_hits`` counts SKUs reused from the pipeline manifest, ``cache_misses``
+the ones recomputed. run_pipeline.py hands its run ID to every stage in
+``PIPELINE_RUN_ID``, so one run's stages share it; a stage started on its own
+gets a fresh ID. Each stage writes all its lines in one append, so stages
+running side by side do not interleave.
+
+The dashboards' "🩺 Pipeline Health" tab charts this file.
+
+    python notebook/run_log.py            # last run: stage durations and the slowest SKUs
+    python notebook/run_log.py --runs 5
+"""
+
+import argparse
+import json
+import os
+import resource
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+RUN_LOG = Path("data/processed/run_log.jsonl")
+RUN_ID_ENV = "PIPELINE_RUN_ID"
+TIMINGS = ("fit_s", "predict_s", "plot_s", "write_s", "total_s")
+
+
+def run_id():
+    """The pipeline run this process belongs to (same format as run_pipeline.py)."""
+    return os.environ.get(RUN_ID_ENV) or datetime.now().strftime("%Y%m%dT%H%M%S")
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """High-water resident memory in MB (``ru_maxrss`` is in KB on Linux)."""
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)
+
+
+class StageLog:
+    """Collects one stage's SKU timings and writes them with the stage summary on ``close``.
+
+        with StageLog("forecast") as log:
+            log.sku("paneer_200g", fit_s=1.2, predict_s=0.1, write_s=0.02)
+            log.cache_hits += 1
+
+    Leaving the block through an exception (or a non-zero SystemExit) marks
+    the stage as failed; the lines are written either way.
+    """
+
+    def __init__(self, stage, level=None, path=RUN_LOG):
+        self.stage, self.level, self.path = stage, level, Path(path)
+        self.run_id = run_id()
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self.rows = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._start = time.perf_counter()
+        self._skus = []
+        self._closed = False
+
+    def sku(self, sku, ok=True, **fields):
+        """Record one SKU; timing fields are rounded to the millisecond."""
+        record = {"event": "sku", "run_id": self.run_id, "stage": self.stage, "sku": sku, "ok": bool(ok)}
+        for key, value in fields.items():
+            record[key] = round(value, 3) if key in TIMINGS and value is not None else value
+        self._skus.append(record)
+
+    def close(self, ok=True, **fields):
+        """Append the SKU lines and the stage summary (once)."""
+        if self._closed:
+            return
+        self._closed = True
+        children = peak_rss_mb(resource.RUSAGE_CHILDREN)
+        summary = {"event": "stage", "run_id": self.run_id, "stage": self.stage, "level": self.level,
+                   "started": self.started, "duration_s": round(time.perf_counter() - self._start, 3),
+                   "ok": bool(ok and all(r["ok"] for r in self._skus)),
+                   "peak_rss_mb": peak_rss_mb(), "children_peak_rss_mb": children or None,
+                   "rows": int(self.rows), "skus": len(self._skus),
+                   "cache_hits": self.cache_hits, "cache_misses": self.cache_misses, **fields}
+        lines = "".join(json.dumps(r, default=str) + "\n" for r in [*self._skus, summary])
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # One O_APPEND write per stage keeps concurrent stages' lines whole
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, lines.encode("utf-8"))
+        finally:
+            os.close(fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        failed = exc_type is not None and not (exc_type is SystemExit and exc.code in (None, 0))
+        self.close(ok=not failed)
+        return False
+
+
+# ───── READING ─────
+def read_log(path=RUN_LOG):
+    """Every logged event as one DataFrame (empty if there is no log); skips torn lines."""
+    records = []
+    if Path(path).exists():
+        with open(path) as fh:
+            for line in fh:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return pd.DataFrame(records)
+
+
+def stage_history(log, runs=None):
+    """Stage summaries, one row per (run, stage), oldest run first; the last ``runs`` runs if given."""
+    if log.empty or "event" not in log:
+        return pd.DataFrame()
+    stages = log[log["event"] == "stage"].copy()
+    stages["started"] = pd.to_datetime(stages["started"])
+    order = stages.groupby("run_id")["started"].min().sort_values()
+    if runs:
+        order = order.tail(runs)
+    stages = stages[stages["run_id"].isin(order.index)].astype(
+        {"rows": "int64", "skus": "int64", "cache_hits": "int64", "cache_misses": "int64"})
+    stages["run_id"] = pd.Categorical(stages["run_id"], categories=order.index, ordered=True)
+    return stages.sort_values(["run_id", "started"]).reset_index(drop=True)
+
+
+def slowest_skus(log, stage="forecast", runs=1, n=10, by="total_s"):
+    """Slowest SKUs of ``stage``, averaged over its last ``runs`` runs that recomputed any SKU."""
+    if log.empty or "event" not in log:
+        return pd.DataFrame()
+    skus = log[(log["event"] == "sku") & (log["stage"] == stage)]
+    if skus.empty:
+        return pd.DataFrame()
+    recent = skus.drop_duplicates("run_id", keep="last")["run_id"].tail(runs)
+    skus = skus[skus["run_id"].isin(recent)]
+    timings = [c for c in TIMINGS if c in skus and skus[c].notna().any()]
+    table = skus.groupby("sku")[timings].mean()
+    table["runs"] = skus.groupby("sku").size()
+    return table.sort_values(by if by in table else timings[-1], ascending=False).head(n).reset_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise the pipeline run log.")
+    parser.add_argument("--runs", type=int, default=1, help="runs to show (default: the last one)")
+    parser.add_argument("--top", type=int, default=5, help="slowest SKUs per stage (default: 5)")
+    args = parser.parse_args()
+
+    log = read_log()
+    history = stage_history(log, args.runs)
+    if history.empty:
+        raise SystemExit(f"❌ No stages logged in {RUN_LOG} yet – run the pipeline first")
+    cols = ["run_id", "stage", "duration_s", "peak_rss_mb", "children_peak_rss_mb", "rows", "skus",
+            "cache_hits", "cache_misses", "ok"]
+    print(f"⏱️ Stages of the last {history['run_id'].nunique()} run(s)")
+    print(history[[c for c in cols if c in history]].to_string(index=False))
+    for stage in history["stage"].unique():
+        slow = slowest_skus(log, stage, args.runs, args.top)
+        if not slow.empty:
+            print(f"\n🐢 Slowest {stage} SKUs")
+            print(slow.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+run_pipeline.py
+Single entry point for the notebook/ stages, run as a dependency graph.
+
+    preprocess (01) ──► forecast (02) ──┬──► evaluate (03)
+                                        ├──► charts (render_charts)
+                                        ├──► risk (spoilage_sim)
+                                        └──► replenish (replenishment)
+    reports (generating_csv) ──┬──► risk, replenish
+                               └──► forecast   (batch engine only – it reads festival_dates)
+
+Each stage declares the files it reads and writes. A stage is skipped when
+its inputs (mtime and size), its code and its command line are unchanged
+since its last successful run and all its outputs exist; the store only
+rewrites files whose bytes changed, so an unchanged upstream stage does not
+wake its dependents. Stages whose dependencies are done run concurrently,
+and the stages themselves still skip unchanged SKUs internally.
+
+Every run appends one JSON line to data/processed/pipeline_runs.jsonl with
+per-stage status and duration; each stage's output goes to
+data/processed/logs/<run id>/<stage>.log. The stages get the run ID in
+PIPELINE_RUN_ID and log their per-SKU timings under it (run_log.py).
+
+    python notebook/run_pipeline.py                    # nightly: only what changed
+    python notebook/run_pipeline.py --engine batch --jobs 3
+    python notebook/run_pipeline.py --only forecast,evaluate --force
+"""
+
+import argparse
+import ast
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+
+import run_log
+from pipeline_cache import Manifest, combined_digest, file_stamp
+
+NOTEBOOK_DIR = Path(__file__).resolve().parent
+SOURCE_FILE  = "data/faviy_dairy_cleaned_extended_with_festivals.csv"
+RUN_LOG      = Path("data/processed/pipeline_runs.jsonl")
+LOG_DIR      = Path("data/processed/logs")
+STAGE        = "pipeline"   # manifest stage holding one entry per pipeline stage
+
+CLEANED   = "data/store/cleaned/sku=*/part-0.parquet"
+FORECASTS = "data/store/forecast/sku=*/part-0.parquet"
+TABLES    = ["data/store/tables/stock_levels/part-*.parquet"] + [f"data/store/tables/{t}.parquet" for t in
+             ("stock_snapshot", "spoilage_summary", "seasonal_demand", "festival_dates", "weather_demand")]
+
+
+def stages(engine="prophet"):
+    """Stage name → script, dependencies and input/output globs (its code comes from ``code_files``)."""
+    batch = engine == "batch"
+    return {
+        "preprocess": {
+            "script": "01_data_preprocessing.py",
+            "deps": [],
+            "inputs": [SOURCE_FILE],
+            "outputs": [CLEANED],
+        },
+        "reports": {
+            "script": "generating_csv.py",
+            "deps": [],
+            "inputs": [SOURCE_FILE],
+            "outputs": TABLES,
+        },
+        "forecast": {
+            "script": "02_prophet_forecasting.py",
+            "deps": ["preprocess", "reports"] if batch else ["preprocess"],
+            "inputs": [CLEANED] + (["data/store/tables/festival_dates.parquet"] if batch else []),
+            "outputs": [FORECASTS],
+        },
+        "evaluate": {
+            "script": "03_evaluation_metrics.py",
+            "deps": ["forecast"],
+            "inputs": [CLEANED, FORECASTS],
+            "outputs": ["results/tables/accuracy_summary.csv"],
+        },
+        "charts": {
+            "script": "render_charts.py",
+            "deps": ["forecast"],
+            "inputs": [CLEANED, FORECASTS],
+            "outputs": ["results/forecast_charts/*_plot.png"],
+        },
+        "risk": {
+            "script": "spoilage_sim.py",
+            "deps": ["forecast", "reports"],
+            "inputs": [CLEANED, FORECASTS] + [f"data/store/tables/{t}.parquet" for t in
+                                              ("stock_snapshot", "spoilage_summary")],
+            "outputs": [f"data/store/tables/{t}.parquet" for t in ("spoilage_risk", "spoilage_risk_daily")],
+        },
+        "replenish": {
+            "script": "replenishment.py",
+            "deps": ["forecast", "reports"],
+            "inputs": [SOURCE_FILE, FORECASTS, "data/store/forecast_by_location/sku=*/part-0.parquet"]
+                      + [f"data/store/tables/{t}.parquet" for t in ("stock_snapshot", "spoilage_summary")],
+            "outputs": ["data/store/tables/replenishment_plan_by_location.parquet"],
+        },
+    }
+
+
+def expand(patterns):
+    return sorted({p for pattern in patterns for p in glob.glob(pattern)})
+
+
+def code_files(script):
+    """``script`` and every notebook/ module it imports, directly or through another one."""
+    seen, todo = set(), [NOTEBOOK_DIR / script]
+    while todo:
+        path = todo.pop()
+        if path in seen or not path.exists():
+            continue
+        seen.add(path)
+        for node in ast.walk(ast.parse(path.read_text(), str(path))):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            todo += [NOTEBOOK_DIR / f"{name.split('.')[0]}.py" for name in names]
+    return sorted(seen)
+
+
+def stage_digest(spec, argv):
+    """Digest of a stage's command line, code (the script and its local imports) and input file stamps."""
+    code = code_files(spec["script"])
+    return combined_digest(argv, [file_stamp(p)[1:] for p in code], [file_stamp(p) for p in expand(spec["inputs"])])
+
+
+def stage_argv(name, args):
+    argv = [sys.executable, str(NOTEBOOK_DIR / stages()[name]["script"])]
+    if name == "forecast":
+        argv += ["--engine", args.engine]
+    if name in ("forecast", "charts") and args.workers:
+        argv += ["--workers", str(args.workers)]
+    if args.force and name in ("forecast", "evaluate", "charts"):
+        argv.append("--force")
+    return argv
+
+
+def run_stage(name, argv, log_path, run_id=None):
+    """Run one stage as a subprocess with its output captured in ``log_path``."""
+    start = time.perf_counter()
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    env = {**os.environ, run_log.RUN_ID_ENV: run_id} if run_id else None
+    with open(log_path, "w") as log:
+        code = subprocess.call(argv, stdout=log, stderr=subprocess.STDOUT, env=env)
+    return code, time.perf_counter() - start
+
+
+def tail(path, lines=20):
+    with open(path, errors="replace") as fh:
+        return "".join(fh.readlines()[-lines:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the forecasting pipeline stages in dependency order.")
+    parser.add_argument("--engine", choices=["batch", "prophet"], default="prophet",
+                        help="forecast engine for 02 (default: prophet)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="worker processes for the forecast and chart stages (default: their own default)")
+    parser.add_argument("--jobs", type=int, default=2, help="stages to run at the same time (default: 2)")
+    parser.add_argument("--only", help="comma-separated stages to consider; the others are left as they are")
+    parser.add_argument("--force", action="store_true", help="run every selected stage and refit every SKU")
+    parser.add_argument("--dry-run", action="store_true", help="show what would run without running it")
+    args = parser.parse_args()
+
+    graph = stages(args.engine)
+    selected = list(graph) if not args.only else [s.strip() for s in args.only.split(",")]
+    unknown = [s for s in selected if s not in graph]
+    if unknown:
+        parser.error(f"unknown stage(s) {unknown}; choose from {list(graph)}")
+
+    run_id = datetime.now().strftime("%Y%m%dT%H%M%S")
+    manifest = Manifest()
+    status = {}     # stage → "ran" | "skipped" | "failed" | "blocked"
+    records = {}
+    pending = [s for s in graph if s in selected]
+    running = {}
+    run_start = time.perf_counter()
+    print(f"🚀 Pipeline run {run_id}: {', '.join(pending)} ({args.engine} engine)")
+
+    def ready(name):
+        deps = [d for d in graph[name]["deps"] if d in selected]
+        return all(d in status for d in deps)
+
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        while pending or running:
+            for name in [n for n in pending if ready(n)]:
+                pending.remove(name)
+                spec = graph[name]
+                if any(status.get(d) in ("failed", "blocked") for d in spec["deps"]):
+                    status[name] = "blocked"
+                    records[name] = {"stage": name, "status": "blocked", "duration_s": 0.0}
+                    print(f"⛔ {name}: blocked by a failed dependency")
+                    continue
+                argv = stage_argv(name, args)
+                digest = stage_digest(spec, argv[1:])
+                outputs_exist = all(glob.glob(p) for p in spec["outputs"])
+                if not args.force and outputs_exist and manifest.is_fresh(STAGE, name, digest):
+                    status[name] = "skipped"
+                    records[name] = {"stage": name, "status": "skipped", "duration_s": 0.0}
+                    print(f"♻️ {name}: inputs unchanged – skipped")
+                    continue
+                if args.dry_run:
+                    status[name] = "skipped"
+                    records[name] = {"stage": name, "status": "would run", "duration_s": 0.0}
+                    print(f"📝 {name}: would run {' '.join(argv[1:])}")
+                    continue
+                print(f"▶️ {name}: {' '.join(os.path.relpath(a) if a.endswith('.py') else a for a in argv[1:])}")
+                log_path = LOG_DIR / run_id / f"{name}.log"
+                running[pool.submit(run_stage, name, argv, log_path, run_id)] = (name, argv, log_path)
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, argv, log_path = running.pop(future)
+                code, duration = future.result()
+                ok = code == 0
+                status[name] = "ran" if ok else "failed"
+                records[name] = {"stage": name, "status": status[name], "duration_s": round(duration, 2),
+                                 "returncode": code, "log": str(log_path)}
+                if ok:
+                    # Record the inputs as they are now – the stage's own outputs may be a later stage's inputs
+                    manifest.record(STAGE, name, stage_digest(graph[name], argv[1:]), run_id=run_id)
+                    manifest.save()
+                    print(f"✅ {name}: {duration:.1f}s")
+                else:
+                    print(f"❌ {name}: exit code {code} after {duration:.1f}s – last lines of {log_path}:\n"
+                          f"{tail(log_path)}")
+
+    wall = time.perf_counter() - run_start
+    entry = {
+        "run_id": run_id,
+        "started": datetime.fromtimestamp(time.time() - wall).isoformat(timespec="seconds"),
+        "wall_s": round(wall, 2),
+        "engine": args.engine,
+        "ok": all(s != "failed" and s != "blocked" for s in status.values()),
+        "stages": [records[s] for s in graph if s in records],
+    }
+    if not args.dry_run:
+        RUN_LOG.parent.mkdir(parents=True, exist_ok=True)
+        with open(RUN_LOG, "a") as fh:
+            fh.write(json.dumps(entry) + "\n")
+
+    print("\n⏱️ Stage durations")
+    for r in entry["stages"]:
+        print(f"   {r['stage']:<12} {r['status']:<9} {r['duration_s']:7.1f}s")
+    print(f"🏁 Wall time: {wall:.1f}s" + ("" if args.dry_run else f" – logged to {RUN_LOG}"))
+    if not entry["ok"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+series_keys.py
+Forecast granularity – which raw columns identify one series.
+
+The default level is one series per product. Finer levels add Location
+and/or Sales_Channel; their series are stored in the same per-product
+partitions (one file per product, every location/channel inside it), so
+the file count stays at the product count whatever the level.
+
+    keys = parse_keys("Product_Name,Location,Sales_Channel")
+    dataset_name("cleaned", keys)   # → "cleaned_by_location_sales_channel"
+"""
+
+PRODUCT_KEY  = "Product_Name"
+DEFAULT_KEYS = [PRODUCT_KEY]
+ALLOWED_KEYS = [PRODUCT_KEY, "Location", "Sales_Channel"]
+
+
+def sku_slug(name):
+    return name.lower().replace(" ","_").replace("(","").replace(")","").replace("/","_")
+
+
+def parse_keys(text):
+    """Comma-separated key list → validated list starting with Product_Name."""
+    keys = [k.strip() for k in text.split(",") if k.strip()] if text else list(DEFAULT_KEYS)
+    unknown = [k for k in keys if k not in ALLOWED_KEYS]
+    if unknown:
+        raise ValueError(f"unknown series key(s) {unknown}; choose from {ALLOWED_KEYS}")
+    if keys[0] != PRODUCT_KEY or len(set(keys)) != len(keys):
+        raise ValueError(f"series keys must start with {PRODUCT_KEY} and not repeat: {keys}")
+    return keys
+
+
+def extra_keys(keys):
+    """Keys stored as columns inside a product partition."""
+    return [k for k in keys if k != PRODUCT_KEY]
+
+
+def level_name(keys):
+    extra = extra_keys(keys)
+    return "by_" + "_".join(k.lower() for k in extra) if extra else "product"
+
+
+def dataset_name(base, keys):
+    """Store dataset for ``base`` ("cleaned" / "forecast") at this level."""
+    extra = extra_keys(keys)
+    return f"{base}_{level_name(keys)}" if extra else base
+
+
+def series_id(product_slug, values=()):
+    """Stable id of one series: the product slug plus its slugged key values."""
+    return "__".join([product_slug, *(sku_slug(str(v)) for v in values)])
+
+
+def split_series(df, product_slug, keys):
+    """One cleaned product partition → ``[(series id, {key: value}, DataFrame(ds, y)), ...]``."""
+    df = df.rename(columns={"Date": "ds", "Units_Sold": "y"})
+    extra = extra_keys(keys)
+    if not extra:
+        return [(product_slug, {}, df[["ds", "y"]])]
+    return [
+        (series_id(product_slug, values), dict(zip(extra, values)), grp[["ds", "y"]])
+        for values, grp in df.groupby(extra, sort=True)
+    ]
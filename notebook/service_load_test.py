@@ -0,0 +1,137 @@
+"""
+service_load_test.py
+Load test for forecast_service.py: latency percentiles and throughput of batched requests.
+
+Starts the service in-process on a free port (or targets ``--url``), then
+runs ``--clients`` threads that each keep one HTTP/1.1 connection open and
+send POST /forecast requests of ``--batch`` random (SKU, horizon) pairs for
+``--seconds``, once with JSON and once with Arrow responses. With
+``--reload-every`` the snapshot is rebuilt during the run, which must not
+cost a single failed request.
+
+    python notebook/service_load_test.py --clients 8 --batch 20 --seconds 10
+"""
+
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import forecast_service
+
+HORIZONS = (7, 14, 30)
+
+
+def _client(host, port, skus, batch, fmt, deadline, seed, latencies, failures):
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    headers = {"Content-Type": "application/json"}
+    while time.perf_counter() < deadline:
+        body = json.dumps({"requests": [{"sku": rng.choice(skus), "horizon": rng.choice(HORIZONS)}
+                                        for _ in range(batch)], "format": fmt})
+        start = time.perf_counter()
+        try:
+            conn.request("POST", "/forecast", body, headers)
+            response = conn.getresponse()
+            payload = response.read()
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status}: {payload[:200]!r}")
+            # Decode like a real client would
+            if fmt == "arrow":
+                rows = pa.ipc.open_stream(payload).read_all().num_rows
+            else:
+                rows = sum(len(f["ds"]) for f in json.loads(payload)["forecasts"])
+            if not rows:
+                raise RuntimeError("empty response")
+        except Exception as exc:
+            failures.append(repr(exc))
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def _reloader(url, every, stop):
+    host, port = url
+    while not stop.wait(every):
+        conn = http.client.HTTPConnection(host, port, timeout=60)
+        conn.request("POST", "/reload")
+        conn.getresponse().read()
+        conn.close()
+
+
+def run(host, port, skus, clients, batch, seconds, fmt, reload_every=None):
+    """One timed run; returns a summary dict."""
+    latencies, failures = [], []
+    deadline = time.perf_counter() + seconds
+    stop = threading.Event()
+    if reload_every:
+        threading.Thread(target=_reloader, args=((host, port), reload_every, stop), daemon=True).start()
+    threads = [threading.Thread(target=_client, args=(host, port, skus, batch, fmt, deadline, seed,
+                                                      latencies, failures))
+               for seed in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+
+    ms = 1000 * np.array(latencies or [np.nan])
+    return {"format": fmt, "requests": len(latencies), "failed": len(failures),
+            "p50_ms": np.percentile(ms, 50), "p90_ms": np.percentile(ms, 90), "p99_ms": np.percentile(ms, 99),
+            "rps": len(latencies) / elapsed, "series_per_s": len(latencies) * batch / elapsed,
+            "first_error": failures[0] if failures else ""}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the forecast service: p50/p99 latency and throughput.")
+    parser.add_argument("--url", help="running service, e.g. http://127.0.0.1:8502 (default: start one in-process)")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent connections (default: 8)")
+    parser.add_argument("--batch", type=int, default=20, help="(SKU, horizon) pairs per request (default: 20)")
+    parser.add_argument("--seconds", type=float, default=10, help="duration per response format (default: 10)")
+    parser.add_argument("--formats", default="json,arrow", help="response formats to test (default: json,arrow)")
+    parser.add_argument("--reload-every", type=float,
+                        help="force a snapshot reload every N seconds during the run")
+    args = parser.parse_args()
+
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        server, _, stop = forecast_service.serve(port=0, poll=0)
+        host, port = server.server_address
+        print(f"🚀 In-process service on http://{host}:{port}")
+
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    conn.request("GET", "/skus")
+    skus = json.loads(conn.getresponse().read())
+    conn.close()
+    if not skus:
+        raise SystemExit("❌ The service has no forecasts – run 02_prophet_forecasting.py first")
+
+    print(f"⏱️ {args.clients} clients × {args.batch} series per request, {args.seconds:g}s per format, "
+          f"{len(skus)} SKUs" + (f", reload every {args.reload_every:g}s" if args.reload_every else ""))
+    report = pd.DataFrame([run(host, port, skus, args.clients, args.batch, args.seconds, fmt, args.reload_every)
+                           for fmt in args.formats.split(",")])
+    print(report.drop(columns="first_error").to_string(index=False, float_format=lambda v: f"{v:.1f}"))
+    for row in report[report["failed"] > 0].itertuples():
+        print(f"❌ {row.format}: {row.failed} failed requests, e.g. {row.first_error}")
+    if not args.url:
+        stop.set()
+        server.shutdown()
+    if report["failed"].any():
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+sku_store.py
+Columnar (Parquet) storage for per-SKU series and summary tables.
+
+Layout:
+    data/store/<dataset>/sku=<sku>/part-0.parquet   – per-SKU series (cleaned, forecast)
+    data/store/tables/<name>.parquet                – summary tables (spoilage_summary, ...)
+    data/store/tables/<name>/part-00000.parquet     – row-level tables written in parts (stock_levels)
+    data/store/state/<name>.parquet                 – ingestion state for append mode
+
+Finer forecast levels (see series_keys.py) use datasets such as
+``cleaned_by_location``; their partitions hold every series of the product,
+told apart by string key columns (Location, Sales_Channel).
+
+Columns are written with fixed types, so readers get parsed dates back
+without re-inferring them, can project only the columns they need and can
+push a date range down into the Parquet reader.
+
+Until `migrate_to_store.py` has been run, every reader falls back to the
+legacy CSV layout in data/processed/.
+"""
+
+import filecmp
+import operator
+import os
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+STORE_DIR  = Path("data/store")
+LEGACY_DIR = Path("data/processed")
+TABLE_DIR  = STORE_DIR / "tables"
+STATE_DIR  = STORE_DIR / "state"    # running totals for append mode (incremental_ingest.py)
+
+# dataset (or "<dataset>_by_<keys>") → (date column, {column: dtype})
+SERIES_SCHEMAS = {
+    "cleaned":  ("Date", {"Date": "datetime64[ns]", "Units_Sold": "float64"}),
+    "forecast": ("ds",   {"ds": "datetime64[ns]"}),  # every other column is float64
+}
+
+# table → date columns to parse from the legacy CSV
+TABLE_DATES = {
+    "stock_levels": ["Date"],
+    "stock_snapshot": ["As_Of"],
+    "festival_dates": ["Date"],
+}
+
+# Everything the dashboards read from a forecast
+FORECAST_COLUMNS = ["ds", "yhat", "yhat_lower", "yhat_upper"]
+
+_OPS = {"==": operator.eq, "!=": operator.ne, ">=": operator.ge,
+        "<=": operator.le, ">": operator.gt, "<": operator.lt}
+
+
+def _apply_filters(df, filters):
+    """pandas equivalent of pyarrow's filter pushdown, for the CSV fallback."""
+    for col, op, value in filters or ():
+        mask = df[col].isin(value) if op == "in" else _OPS[op](df[col], value)
+        df = df[mask]
+    return df.reset_index(drop=True)
+
+
+def _schema(dataset):
+    return SERIES_SCHEMAS[dataset.split("_by_")[0]]
+
+
+def _coerce(dataset, df):
+    _, dtypes = _schema(dataset)
+    df = df.copy()
+    for col in df.columns:
+        if col in dtypes:
+            df[col] = df[col].astype(dtypes[col])
+        elif pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].astype("float64")
+        else:
+            df[col] = df[col].astype(str)  # series key columns
+    return df.reset_index(drop=True)
+
+
+def partition_path(dataset, sku):
+    return STORE_DIR / dataset / f"sku={sku}" / "part-0.parquet"
+
+
+def legacy_path(dataset, sku):
+    return LEGACY_DIR / f"{sku}_{dataset}.csv"
+
+
+def series_path(dataset, sku):
+    """The file currently backing ``sku`` (Parquet if migrated, else legacy CSV), or None."""
+    for path in (partition_path(dataset, sku), legacy_path(dataset, sku)):
+        if path.exists():
+            return path
+    return None
+
+
+def list_skus(dataset):
+    """Sorted SKU slugs present in either layout."""
+    skus = set()
+    if (STORE_DIR / dataset).is_dir():
+        skus.update(p.name[len("sku="):] for p in (STORE_DIR / dataset).glob("sku=*") if (p / "part-0.parquet").exists())
+    if LEGACY_DIR.is_dir():
+        suffix = f"_{dataset}.csv"
+        skus.update(p.name[:-len(suffix)] for p in LEGACY_DIR.glob(f"*{suffix}"))
+    return sorted(skus)
+
+
+def _publish(tmp, path):
+    """Move ``tmp`` over ``path`` unless the bytes are identical.
+
+    Leaving identical files untouched keeps their mtime, so mtime-based
+    staleness checks (run_pipeline.py, the dashboard cache) see no change.
+    """
+    if path.exists() and filecmp.cmp(tmp, path, shallow=False):
+        os.remove(tmp)
+    else:
+        tmp.replace(path)
+
+
+def write_series(dataset, sku, df):
+    path = partition_path(dataset, sku)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    _coerce(dataset, df).to_parquet(tmp, index=False)
+    _publish(tmp, path)
+    return path
+
+
+def read_series(dataset, sku, columns=None, start=None, end=None):
+    """Read one SKU's series, optionally projected to ``columns`` and limited to [start, end].
+
+    Returns None if the SKU is not stored in either layout.
+    """
+    date_col, _ = _schema(dataset)
+    filters = []
+    if start is not None:
+        filters.append((date_col, ">=", pd.Timestamp(start)))
+    if end is not None:
+        filters.append((date_col, "<=", pd.Timestamp(end)))
+
+    path = partition_path(dataset, sku)
+    if path.exists():
+        return pq.read_table(path, columns=columns, filters=filters or None).to_pandas()
+
+    path = legacy_path(dataset, sku)
+    if not path.exists():
+        return None
+    df = pd.read_csv(path, parse_dates=[date_col])
+    df = _apply_filters(df, filters)
+    return df[columns] if columns is not None else df
+
+
+def read_dataset(dataset, skus=None, columns=None, start=None, end=None):
+    """Several SKUs' series stacked into one frame with a ``sku`` column."""
+    frames = []
+    for sku in skus if skus is not None else list_skus(dataset):
+        df = read_series(dataset, sku, columns=columns, start=start, end=end)
+        if df is not None:
+            frames.append(df.assign(sku=sku))
+    return pd.concat(frames, ignore_index=True) if frames else None
+
+
+def table_path(name):
+    return TABLE_DIR / f"{name}.parquet"
+
+
+def write_table(name, df):
+    path = table_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    df.reset_index(drop=True).to_parquet(tmp, index=False)
+    _publish(tmp, path)
+    return path
+
+
+def table_parts(name, folder=None):
+    """Part files of a table written by `write_table_parts`, in order."""
+    folder = Path(folder) if folder is not None else TABLE_DIR / name
+    return sorted(folder.glob("part-*.parquet")) if folder.is_dir() else []
+
+
+def _part_number(path):
+    return int(path.stem[len("part-"):])
+
+
+def write_table_parts(name, frames, first=0, folder=None):
+    """Write each of ``frames`` as one part file of ``name``, numbered from ``first``.
+
+    Parts before ``first`` are kept and every part after the last one written is
+    removed, so appending to a table rewrites only its tail. Each part is
+    published atomically and left untouched if its bytes are unchanged; later
+    frames are cast to the first frame's schema. ``folder`` writes the parts
+    outside the store instead. Returns the number of parts written; with no
+    frames the table is left as it was.
+    """
+    folder = Path(folder) if folder is not None else TABLE_DIR / name
+    folder.mkdir(parents=True, exist_ok=True)
+    schema, number = None, first
+    for df in frames:
+        table = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False, schema=schema)
+        schema = table.schema
+        path = folder / f"part-{number:05d}.parquet"
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        pq.write_table(table, tmp)
+        _publish(tmp, path)
+        number += 1
+    if number == first:
+        return 0
+    for stale in table_parts(name, folder):
+        if _part_number(stale) >= number:
+            stale.unlink()
+    if folder == TABLE_DIR / name:
+        table_path(name).unlink(missing_ok=True)   # a single-file copy left by migrate_to_store.py
+    return number - first
+
+
+def read_parts(parts, columns=None, filters=None):
+    """Read part files in order into one DataFrame."""
+    return pa.concat_tables([pq.read_table(p, columns=columns, filters=filters) for p in parts]).to_pandas()
+
+
+def write_state(name, df):
+    path = STATE_DIR / f"{name}.parquet"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    df.reset_index(drop=True).to_parquet(tmp, index=False)
+    _publish(tmp, path)
+    return path
+
+
+def read_state(name):
+    """A persisted ingestion-state frame, or None if it was never written."""
+    path = STATE_DIR / f"{name}.parquet"
+    return pd.read_parquet(path) if path.exists() else None
+
+
+def read_table(name, columns=None, filters=None):
+    """Read a summary table (Parquet, else legacy CSV); None if absent.
+
+    ``filters`` uses the pyarrow ``[(column, op, value), ...]`` form.
+    """
+    path = table_path(name)
+    if path.exists():
+        return pq.read_table(path, columns=columns, filters=filters).to_pandas()
+    parts = table_parts(name)
+    if parts:
+        return read_parts(parts, columns=columns, filters=filters)
+    path = LEGACY_DIR / f"{name}.csv"
+    if not path.exists():
+        return None
+    df = _apply_filters(pd.read_csv(path, parse_dates=TABLE_DATES.get(name)), filters)
+    return df[columns] if columns is not None else df
@@ -0,0 +1,283 @@
+"""
+spoilage_sim.py
+Monte Carlo spoilage and stockout risk for every SKU at once.
+
+For each SKU the simulator draws ``--paths`` daily demand paths from the
+stored forecast (normal around yhat, with the spread implied by the 80%
+interval, truncated at zero) and runs them through a FIFO inventory:
+
+    opening stock   latest ending stock (stock_snapshot), received in equal lots
+                    over the days of demand it covers (older units have sold)
+    receipts        policy "forecast": each day the forecast's ``--service-level``
+                    quantile arrives fresh (0.9: the interval's upper bound,
+                    0.5: the mean); policy "stock": only the opening stock
+    sales           oldest units first; unmet demand is lost (a stockout)
+    spoilage        units still unsold on their last day of shelf life
+
+Each SKU is simulated over the forecast days after its latest data, at most
+``--horizon`` (forecast_window.py); SKUs whose stored forecast ends before
+their latest data are reported and skipped. Shelf life comes from
+spoilage_summary (Shelf_Life_Days). The whole catalogue is one NumPy
+computation over SKUs × paths × days – one vectorized step per day, in
+batches of SKUs of bounded memory. The seed is fixed, so the same forecasts
+give the same tables.
+
+Results go to two store tables that the dashboards read:
+
+    spoilage_risk         one row per SKU: probability of any spoilage / stockout,
+                          expected and P50/P90/P99 spoiled and lost units, fill rate
+    spoilage_risk_daily   one row per SKU × day: probability of spoilage and of a
+                          stockout that day, expected spoiled and lost units
+
+As the pipeline's "risk" stage it reruns only when the forecasts, the stock
+snapshot or the spoilage summary change.
+
+    python notebook/spoilage_sim.py                       # 1,000 paths, 30 days
+    python notebook/spoilage_sim.py --paths 5000 --policy stock
+    python notebook/spoilage_sim.py --scale 5000          # + timing on 5,000 synthetic SKUs
+"""
+
+import argparse
+import time
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+import forecast_window
+import portfolio_index
+import run_log
+import sku_store
+
+RISK_TABLE  = "spoilage_risk"
+DAILY_TABLE = "spoilage_risk_daily"
+PATHS       = 1000
+HORIZON     = 30
+SEED        = 7
+POLICIES    = ("forecast", "stock")
+SERVICE_LEVEL = 0.9  # forecast quantile ordered each day under the "forecast" policy
+BATCH_MB    = 256    # working memory per batch of SKUs
+MIN_UNITS   = 0.5    # spoiled / lost quantities below this count as none (units are simulated as floats)
+QUANTILES   = (0.5, 0.9, 0.99)
+
+
+# ───── INPUTS ─────
+def load_inputs(horizon=HORIZON):
+    """Future forecast, opening stock and shelf life of every SKU with a stored forecast.
+
+    Returns a dict of aligned arrays (``skus``, ``days``, ``dates``, ``mean``,
+    ``sd``, ``stock``, ``shelf``; dates, mean and sd are SKUs × days, padded
+    past each SKU's ``days``) and ``missing``, the SKUs whose forecast ends
+    before their latest data – or None if there are no forecasts.
+    """
+    fc = sku_store.read_dataset("forecast", columns=sku_store.FORECAST_COLUMNS)
+    if fc is None:
+        return None
+    end = portfolio_index._history_end(fc["sku"].unique())
+    window = forecast_window.future_window(fc, ["sku"], end, horizon)
+    skus = window["series"]["sku"].to_numpy()
+    return {
+        "skus": skus,
+        "days": window["days"],
+        "dates": window["dates"],
+        "mean": window["mean"],
+        "sd": window["sd"],
+        "stock": forecast_window.stock_on_hand(skus),
+        "shelf": forecast_window.shelf_life(skus),
+        "missing": window["missing"],
+    }
+
+
+# ───── SIMULATION ─────
+def demand_paths(mean, sd, paths, rng):
+    """(days, SKUs, paths) float32 demand draws, normal around ``mean`` and truncated at zero.
+
+    Days come first so that each day's slice is contiguous for the simulation loop.
+    """
+    draws = rng.standard_normal((mean.shape[1], mean.shape[0], paths), dtype=np.float32)
+    draws *= sd.T[:, :, None]
+    draws += mean.T[:, :, None]
+    return np.maximum(draws, 0, out=draws)
+
+
+def simulate(demand, stock, shelf, receipts):
+    """FIFO inventory over every path at once.
+
+    ``demand`` is (days, SKUs, paths); ``stock`` and ``shelf`` are per SKU;
+    ``receipts`` is (SKUs, days). Under FIFO with a fixed shelf life the
+    inventory never needs tracking by age: units leave in arrival order, so
+    by the end of day t the cumulative outflow (sold + spoiled) must cover
+    every unit that expires by t – a schedule known before any demand is
+    drawn. Each day is then a handful of (SKUs, paths) array operations:
+
+        sold     = min(demand, received so far − outflow so far)
+        outflow  = max(outflow + sold, expiring by today)
+        spoiled  = the part of the outflow that was not sold
+
+    Returns the (days, SKUs, paths) spoiled and lost units.
+    """
+    days, n, paths = demand.shape
+    day = np.arange(1, days + 1)
+    # Opening stock arrived over the last `cover` days – as many as it lasts at the expected demand,
+    # since under FIFO anything older has already sold – in equal daily lots; a lot received `a`
+    # days ago expires at the end of day shelf − a
+    daily_demand = demand.mean(axis=(0, 2))
+    cover = np.where(daily_demand > 0, np.ceil(stock / np.where(daily_demand > 0, daily_demand, 1)), shelf)
+    cover = np.clip(cover, 1, shelf)
+    expired_lots = np.clip(cover[:, None] - np.clip(shelf[:, None] - day[None, :], 0, None), 0, None)
+    expiring = expired_lots * (stock / cover)[:, None]
+    # A unit received on day τ expires at the end of day τ + shelf − 1
+    received = np.cumsum(receipts, axis=1)
+    arrived_by = day[None, :] - shelf[:, None] + 1
+    expiring += np.where(arrived_by >= 1,
+                         np.take_along_axis(received, np.clip(arrived_by - 1, 0, days - 1), axis=1), 0.0)
+    received += stock[:, None]
+
+    lost = np.empty_like(demand)
+    spoiled = np.empty_like(demand)
+    # The running outflow and the expiry schedule stay float64: rounding them to the float32 demand
+    # would let max(outflow + sold, expiring) fall below outflow + sold, i.e. negative spoilage
+    expiring = expiring.astype(np.float64)
+    outflow = np.zeros((n, paths), dtype=np.float64)
+    for t in range(days):
+        sold = np.minimum(demand[t], received[:, t, None] - outflow)
+        np.subtract(demand[t], sold, out=lost[t])
+        sold += outflow
+        np.maximum(sold, expiring[:, t, None], out=outflow)
+        np.subtract(outflow, sold, out=spoiled[t])
+    return spoiled, lost
+
+
+def summarise(skus, dates, demand, spoiled, lost, stock, shelf):
+    """Per-SKU and per-SKU × day risk tables from one batch's simulated paths."""
+    spoiled_total, lost_total = spoiled.sum(axis=0), lost.sum(axis=0)   # (SKUs, paths)
+    short = lost >= MIN_UNITS
+    risk = pd.DataFrame({
+        "SKU": skus,
+        "Opening_Stock": stock,
+        "Shelf_Life_Days": shelf,
+        "Expected_Demand": demand.sum(axis=0).mean(axis=1),
+        "Spoilage_Prob": (spoiled_total >= MIN_UNITS).mean(axis=1),
+        "Expected_Spoilage": spoiled_total.mean(axis=1),
+        **{f"Spoilage_P{round(q * 100)}": np.quantile(spoiled_total, q, axis=1) for q in QUANTILES},
+        "Stockout_Prob": short.any(axis=0).mean(axis=1),
+        "Expected_Stockout_Days": short.sum(axis=0).mean(axis=1),
+        "Expected_Lost_Units": lost_total.mean(axis=1),
+        **{f"Lost_P{round(q * 100)}": np.quantile(lost_total, q, axis=1) for q in QUANTILES},
+    })
+    risk["Fill_Rate"] = 1 - risk["Expected_Lost_Units"] / risk["Expected_Demand"].where(risk["Expected_Demand"] > 0)
+    days = dates.shape[1]
+    daily = pd.DataFrame({
+        "SKU": np.repeat(skus, days),
+        "Date": dates.ravel(),
+        "Day": np.tile(np.arange(1, days + 1), len(skus)),
+        "Spoilage_Prob": (spoiled >= MIN_UNITS).mean(axis=2).T.ravel(),
+        "Expected_Spoilage": spoiled.mean(axis=2).T.ravel(),
+        "Stockout_Prob": short.mean(axis=2).T.ravel(),
+        "Expected_Lost_Units": lost.mean(axis=2).T.ravel(),
+    })
+    return risk, daily
+
+
+def run(inputs, paths=PATHS, policy="forecast", service_level=SERVICE_LEVEL, seed=SEED, batch_mb=BATCH_MB):
+    """Simulate every SKU in ``inputs`` (see load_inputs); returns (risk, daily) frames.
+
+    SKUs are simulated over their own number of forecast days, one group per
+    distinct length.
+    """
+    rng = np.random.default_rng(seed)
+    mean, sd, stock, shelf = inputs["mean"], inputs["sd"], inputs["stock"], inputs["shelf"]
+    if policy == "forecast":
+        receipts = np.clip(mean + NormalDist().inv_cdf(service_level) * sd, 0, None)
+    else:
+        receipts = np.zeros_like(mean)
+
+    risks, dailies = [], []
+    for days in np.unique(inputs["days"]):
+        group = np.flatnonzero(inputs["days"] == days)
+        # Batches of SKUs sized to keep the working arrays (demand, spoiled, lost, temporaries) in budget
+        step = max(1, int(batch_mb * 1024 ** 2 // (4 * paths * 5 * days)))
+        for start in range(0, len(group), step):
+            idx = group[start:start + step]
+            demand = demand_paths(mean[idx, :days], sd[idx, :days], paths, rng)
+            spoiled, lost = simulate(demand, stock[idx], shelf[idx], receipts[idx, :days])
+            risk, daily = summarise(inputs["skus"][idx], inputs["dates"][idx, :days], demand, spoiled, lost,
+                                    stock[idx], shelf[idx])
+            risks.append(risk.assign(Horizon_Days=int(days)))
+            dailies.append(daily)
+    risk = pd.concat(risks, ignore_index=True).sort_values("SKU", ignore_index=True)
+    risk.insert(1, "Horizon_Days", risk.pop("Horizon_Days"))
+    risk.insert(2, "Paths", paths)
+    risk.insert(3, "Policy", policy)
+    risk.insert(4, "Service_Level", service_level if policy == "forecast" else None)
+    daily = pd.concat(dailies, ignore_index=True).sort_values(["SKU", "Day"], ignore_index=True)
+    return risk, daily
+
+
+def synthetic_inputs(skus, horizon=HORIZON, seed=SEED):
+    """Random catalogue of ``skus`` SKUs for timing runs."""
+    rng = np.random.default_rng(seed)
+    level = rng.uniform(20, 400, skus)
+    mean = level[:, None] * (1 + 0.2 * np.sin(np.arange(horizon) * 2 * np.pi / 7))[None, :]
+    return {"skus": np.array([f"sku_{i:05d}" for i in range(skus)]), "days": np.full(skus, horizon),
+            "dates": np.tile(pd.date_range("2025-01-01", periods=horizon).to_numpy(), (skus, 1)),
+            "mean": mean, "sd": 0.15 * mean, "stock": level * rng.uniform(0, 3, skus),
+            "shelf": rng.choice([2, 3, 4, 5, 7, 30, 60, 90, 120, 180], skus)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate spoilage and stockout risk for every SKU.")
+    parser.add_argument("--paths", type=int, default=PATHS, help=f"demand paths per SKU (default: {PATHS})")
+    parser.add_argument("--horizon", type=int, default=HORIZON, help=f"days to simulate (default: {HORIZON})")
+    parser.add_argument("--policy", choices=POLICIES, default="forecast",
+                        help="forecast: the forecast's --service-level quantile arrives every day; "
+                             "stock: opening stock only (default: forecast)")
+    parser.add_argument("--service-level", type=float, default=SERVICE_LEVEL,
+                        help=f"forecast quantile received each day under the forecast policy "
+                             f"(default: {SERVICE_LEVEL})")
+    parser.add_argument("--seed", type=int, default=SEED, help=f"random seed (default: {SEED})")
+    parser.add_argument("--scale", type=int, default=0,
+                        help="also time a run on this many synthetic SKUs (nothing is written)")
+    args = parser.parse_args()
+
+    log = run_log.StageLog("risk")
+    inputs = load_inputs(args.horizon)
+    if inputs is None:
+        raise SystemExit("❌ No stored forecasts – run 02_prophet_forecasting.py first")
+    if not len(inputs["skus"]):
+        raise SystemExit(f"❌ No stored forecast has days after the latest data – {forecast_window.RERUN_HINT}")
+    if len(inputs["missing"]):
+        print(f"⚠️ Not simulated, no forecast days after the latest data: "
+              f"{forecast_window.describe(inputs['missing'])} – {forecast_window.RERUN_HINT}")
+    start = time.perf_counter()
+    risk, daily = run(inputs, args.paths, args.policy, args.service_level, args.seed)
+    elapsed = time.perf_counter() - start
+    sku_store.write_table(RISK_TABLE, risk)
+    sku_store.write_table(DAILY_TABLE, daily)
+    log.rows = len(daily)
+    log.close(paths=args.paths, policy=args.policy, service_level=args.service_level,
+              missing=len(inputs["missing"]))
+
+    short = risk[risk["Horizon_Days"] < args.horizon]
+    if len(short):
+        print(f"⚠️ Fewer than {args.horizon} forecast days, simulated over what there is: "
+              + ", ".join(f"{r.SKU} ({r.Horizon_Days} d)" for r in short.itertuples()))
+    print(f"🎲 {len(risk)} SKUs × {args.paths:,} paths × up to {risk['Horizon_Days'].max()} days "
+          f"({args.policy} policy) in {elapsed:.2f}s")
+    cols = ["SKU", "Shelf_Life_Days", "Opening_Stock", "Spoilage_Prob", "Expected_Spoilage", "Spoilage_P90",
+            "Stockout_Prob", "Expected_Lost_Units", "Fill_Rate"]
+    print(risk.sort_values("Spoilage_Prob", ascending=False)[cols]
+              .to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+    print(f"✅ Risk tables saved to {sku_store.table_path(RISK_TABLE)} and {sku_store.table_path(DAILY_TABLE)}")
+
+    if args.scale:
+        synthetic = synthetic_inputs(args.scale, args.horizon, args.seed)
+        start = time.perf_counter()
+        run(synthetic, args.paths, args.policy, args.service_level, args.seed)
+        elapsed = time.perf_counter() - start
+        print(f"⏱️ {args.scale:,} synthetic SKUs × {args.paths:,} paths × {args.horizon} days in {elapsed:.1f}s "
+              f"({args.scale * args.paths * args.horizon / elapsed / 1e6:.0f}M SKU-path-days/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+synthetic_extract.py
+Synthetic raw sales extract in the exact schema of faviy_dairy_cleaned_extended_with_festivals.csv.
+
+One row per day × SKU × location × sales channel, with the 22 columns of
+``raw_schema.RAW_COLUMNS`` in order, so every reader (raw_schema.read_raw,
+01, generating_csv.py, incremental_ingest.py) accepts it unchanged.
+
+Demand per row is a fixed level per SKU, location and channel times
+
+* a weekly profile (weekend peak, early-week dip) scaled per category;
+* festival uplift over each festival's three-day window (the two days before
+  and the day itself, as in the sample), strongest for sweets, ghee and
+  paneer – festivals repeat on the same calendar day every year;
+* a yearly temperature cycle that drives cold drinks and ice cream;
+* promotions: 5% / 10% discounts lift demand, festival promotions run on
+  festival days;
+
+with Poisson noise. The day's restock is planned around expected demand;
+sales are capped by it (``Stockout_Flag`` when demand reaches it) and part
+of the leftover spoils, faster for short shelf-life products.
+
+Rows are generated and written one block of days at a time, so memory stays
+bounded by ``--block-rows`` whatever the file size. Every day draws from its
+own generator seeded with (seed, date), so a seed reproduces the same file
+byte for byte, independent of the block size, and a file started later with
+``--start`` continues an earlier one exactly (new days for append mode).
+
+    python notebook/synthetic_extract.py --skus 500 --locations 20 --channels 3 --days 730 \\
+        --output data/synthetic_extract.csv
+"""
+
+import argparse
+import calendar
+import gzip
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import raw_schema
+
+SEED = 42
+START = "2024-06-01"
+BLOCK_ROWS = 250_000
+
+# Product_ID, Product_Name, Category, Unit_Price, daily units, shelf life (days) – the sample's catalogue
+PRODUCTS = [
+    ("MILK500ML", "Toned Milk 500ml", "Milk", 25, 290, 2),
+    ("CURD200G", "Fresh Curd 200g", "Curd", 20, 270, 3),
+    ("GHEE1L", "Desi Ghee 1L", "Ghee", 450, 280, 180),
+    ("PANEER250G", "Paneer 250g", "Paneer", 90, 280, 5),
+    ("CHOC100G", "Milk Chocolate 100g", "Chocolate", 40, 290, 120),
+    ("LASSI200ML", "Sweet Lassi 200ml", "Beverage", 20, 280, 4),
+    ("FLAVMILK200", "Flavored Milk 200ml", "Beverage", 30, 275, 30),
+    ("ICECREAM500", "Ice Cream 500ml", "Dessert", 80, 315, 90),
+    ("BUTTER250G", "Salted Butter 250g", "Butter", 120, 275, 60),
+    ("SHRIKHAND250", "Shrikhand 250g", "Dessert", 60, 325, 7),
+]
+LOCATIONS = ["Ahmedabad", "Surat", "Vadodara", "Rajkot", "Gandhinagar", "Bhavnagar", "Jamnagar", "Junagadh"]
+CHANNELS = ["Retail", "Online", "Distributor", "Modern Trade", "HoReCa"]
+
+# Festival → (month, day); the flag covers the day and the two before it
+FESTIVALS = {
+    "Makar Sankranti": (1, 14), "Holi": (3, 25), "Rath Yatra": (7, 7), "Independence Day": (8, 15),
+    "Raksha Bandhan": (8, 19), "Janmashtami": (8, 26), "Navratri": (10, 11), "Diwali": (11, 1),
+}
+FESTIVAL_DAYS = 3
+
+# Monday … Sunday
+WEEKLY = np.array([0.94, 0.95, 0.97, 1.00, 1.04, 1.11, 1.07])
+# category → (weekly amplitude, festival uplift, temperature sensitivity per °C above 30)
+CATEGORY_EFFECTS = {
+    "Milk": (0.6, 0.15, 0.000), "Curd": (0.8, 0.20, 0.010), "Ghee": (0.5, 0.45, 0.000),
+    "Paneer": (1.0, 0.40, 0.000), "Chocolate": (1.2, 0.25, -0.005), "Beverage": (1.1, 0.20, 0.025),
+    "Dessert": (1.3, 0.40, 0.030), "Butter": (0.7, 0.25, 0.000),
+}
+DISCOUNTS = np.array([0.05, 0.10])
+DISCOUNT_VALUES = np.array([0.0, 0.05, 0.10])
+DISCOUNT_LABELS = ["0%", "5%", "10%"]
+PROMOTION_TYPES = ["None", "Discount", "Festival"]   # 0 no promotion, 1 discount, 2 festival promotion
+
+
+def catalogue(skus):
+    """Static attributes of ``skus`` SKUs: the sample's 10 products, then numbered variants of them."""
+    base = [PRODUCTS[i % len(PRODUCTS)] for i in range(skus)]
+    variant = [i // len(PRODUCTS) for i in range(skus)]
+    return pd.DataFrame({
+        "Product_ID": [p[0] if v == 0 else f"{p[0]}-{v:04d}" for p, v in zip(base, variant)],
+        "Product_Name": [p[1] if v == 0 else f"{p[1]} {v:04d}" for p, v in zip(base, variant)],
+        "Category": [p[2] for p in base],
+        "Unit_Price": [p[3] for p in base],
+        "Level": [float(p[4]) for p in base],
+        "Shelf_Life": [p[5] for p in base],
+    })
+
+
+def names(prefix_list, count, label):
+    return [prefix_list[i] if i < len(prefix_list) else f"{label} {i + 1:03d}" for i in range(count)]
+
+
+def festival_calendar(dates):
+    """Festival name per date (None outside a festival window) and the day's position in its window."""
+    name = np.full(len(dates), None, dtype=object)
+    position = np.zeros(len(dates), dtype=np.int8)   # 1 … FESTIVAL_DAYS, the festival itself last
+    for festival, (month, day) in FESTIVALS.items():
+        for year in range(dates.min().year, dates.max().year + 1):
+            peak = pd.Timestamp(year=year, month=month, day=day)
+            for back in range(FESTIVAL_DAYS):
+                hit = dates == peak - pd.Timedelta(days=back)
+                name[hit] = festival
+                position[hit] = FESTIVAL_DAYS - back
+    return name, position
+
+
+def temperature(dates, seed=SEED):
+    """Daily temperature (°C, one per date): 22° in mid-January up to 40° in mid-May, plus noise."""
+    phase = 2 * np.pi * (dates.dayofyear.to_numpy() - 135) / 365.25
+    noise = [np.random.default_rng([seed, 2, d.toordinal()]).normal(0, 1.8) for d in dates]
+    return (31 + 9 * np.cos(phase) + np.array(noise)).round(1)
+
+
+class Generator:
+    """Static draws (levels per SKU, location and channel) plus one day's rows at a time."""
+
+    def __init__(self, skus, locations, channels, seed=SEED):
+        self.seed = seed
+        rng = np.random.default_rng([seed, 0])
+        self.products = catalogue(skus)
+        self.locations = names(LOCATIONS, locations, "Depot")
+        self.channels = names(CHANNELS, channels, "Channel")
+        effects = np.array([CATEGORY_EFFECTS[c] for c in self.products["Category"]])
+        self.weekly_amp, self.festival_uplift, self.temp_slope = effects.T
+        # Multiplicative level per SKU × location × channel around each product's sample level
+        self.level = (self.products["Level"].to_numpy()[:, None, None]
+                      * rng.lognormal(0, 0.15, (skus, 1, 1))
+                      * rng.lognormal(0, 0.25, (1, locations, 1))
+                      * rng.lognormal(0, 0.20, (1, 1, channels)))
+        self.promo_rate = rng.uniform(0.4, 0.8, skus)
+        self.category_codes, self.categories = pd.factorize(self.products["Category"])
+        self.cells = skus * locations * channels
+
+    def day(self, date, temp, festival, position):
+        """All rows of one date as a dict of column arrays (ordered SKU, location, channel)."""
+        rng = np.random.default_rng([self.seed, 1, date.toordinal()])
+        n_sku, n_loc, n_ch = self.level.shape
+        shape = self.level.shape
+
+        weekly = 1 + self.weekly_amp * (WEEKLY[date.dayofweek] - 1)
+        demand = self.level * weekly[:, None, None]
+        demand = demand * (1 + self.temp_slope * (temp - 30))[:, None, None]
+        if festival is not None:
+            demand = demand * (1 + self.festival_uplift * position / FESTIVAL_DAYS)[:, None, None]
+
+        promo = rng.random(shape) < self.promo_rate[:, None, None]
+        discount = np.where(promo, DISCOUNTS[rng.integers(0, len(DISCOUNTS), shape)], 0.0)
+        festive_promo = promo & (rng.random(shape) < 0.3) if festival is not None else np.zeros(shape, bool)
+        expected = np.clip(demand * (1 + 1.6 * discount), 1, None)
+        demand = rng.poisson(expected)
+
+        # Restock planned around expected demand; a short one caps sales
+        restocked = np.rint(expected * rng.uniform(0.9, 1.5, shape)).astype(np.int64)
+        sold = np.minimum(demand, restocked)
+        stockout = (demand >= restocked).astype(np.int8)
+        # Leftover spoils at a rate set by shelf life, plus a little handling loss
+        shelf = self.products["Shelf_Life"].to_numpy()[:, None, None]
+        spoiled = rng.binomial(restocked - sold, np.clip(0.3 / shelf, 0.002, 0.15)) + rng.poisson(1.5, shape)
+        spoiled = np.minimum(spoiled, restocked)
+
+        price = np.broadcast_to(self.products["Unit_Price"].to_numpy()[:, None, None], shape)
+        revenue = sold * price
+        return {
+            "sku": np.repeat(np.arange(n_sku), n_loc * n_ch),
+            "Location": np.tile(np.repeat(np.arange(n_loc), n_ch), n_sku),
+            "Sales_Channel": np.tile(np.arange(n_ch), n_sku * n_loc),
+            "Units_Sold": sold.ravel(), "Unit_Price": price.ravel(), "Revenue": revenue.ravel(),
+            "Discount_Applied": np.searchsorted(DISCOUNT_VALUES, discount).ravel(),
+            "Net_Revenue": (revenue * (1 - discount)).round(2).ravel(),
+            "Promotion_Flag": promo.astype(np.int8).ravel(),
+            "Promotion_Type": (promo.astype(np.int8) + festive_promo).ravel(),
+            "Stockout_Flag": stockout.ravel(), "Restocked_Units": restocked.ravel(),
+            "Spoilage_Units": spoiled.ravel(),
+        }
+
+    def blocks(self, days, start=START, block_rows=BLOCK_ROWS):
+        """The extract as DataFrames of whole days, about ``block_rows`` rows each."""
+        dates = pd.date_range(start, periods=days, freq="D")
+        temps = temperature(dates, self.seed)
+        fest_names, fest_pos = festival_calendar(dates)
+        per_block = max(1, block_rows // self.cells)
+        products = self.products
+        # Repeated strings are written from categorical codes
+        labels = {
+            "Product_ID": products["Product_ID"], "Product_Name": products["Product_Name"],
+            "Category": self.categories, "Location": self.locations, "Sales_Channel": self.channels,
+            "Discount_Applied": DISCOUNT_LABELS, "Promotion_Type": PROMOTION_TYPES,
+        }
+        for first in range(0, days, per_block):
+            block = dates[first:first + per_block]
+            parts = [self.day(date, temps[first + k], fest_names[first + k], fest_pos[first + k])
+                     for k, date in enumerate(block)]
+            columns = {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+            day = np.repeat(np.arange(len(block)), self.cells)
+            sku = columns.pop("sku")
+            columns["Product_ID"], columns["Product_Name"], columns["Category"] = sku, sku, self.category_codes[sku]
+            frame = pd.DataFrame({
+                **{c: (pd.Categorical.from_codes(v, categories=list(labels[c]))
+                       if c in labels else v) for c, v in columns.items()},
+                "Date": pd.Categorical.from_codes(day, block.strftime(raw_schema.DATE_FORMAT)),
+                "Festival_Flag": np.array([n is not None for n in fest_names[first:first + len(block)]],
+                                          dtype=np.int8)[day],
+                "Day_of_Week": pd.Categorical.from_codes(block.dayofweek.to_numpy()[day],
+                                                         list(calendar.day_name)),
+                "Week_Number": block.isocalendar().week.to_numpy()[day],
+                "Month": pd.Categorical.from_codes(block.month.to_numpy()[day] - 1,
+                                                   list(calendar.month_name)[1:]),
+                "Temperature": temps[first:first + len(block)][day],
+                "Festival_Name": np.array([n or "" for n in fest_names[first:first + len(block)]],
+                                          dtype=object)[day],
+            })
+            yield frame[raw_schema.RAW_COLUMNS]
+
+
+def write(path, skus=10, locations=4, channels=3, days=92, start=START, seed=SEED,
+          block_rows=BLOCK_ROWS, progress=False):
+    """Stream the extract to ``path`` ("-" for stdout, gzip if it ends in .gz); returns the row count."""
+    generator = Generator(skus, locations, channels, seed)
+    if path == "-":
+        fh = sys.stdout
+    elif str(path).endswith(".gz"):
+        fh = gzip.open(path, "wt", newline="")
+    else:
+        fh = open(path, "w", newline="")
+    rows = 0
+    begin = time.perf_counter()
+    try:
+        fh.write(",".join(raw_schema.RAW_COLUMNS) + "\n")
+        for block in generator.blocks(days, start, block_rows):
+            block.to_csv(fh, header=False, index=False)
+            rows += len(block)
+            if progress:
+                print(f"   {block['Date'].iloc[-1]}  {rows:,} rows  {time.perf_counter() - begin:6.1f}s",
+                      file=sys.stderr, flush=True)
+    finally:
+        if fh is not sys.stdout:
+            fh.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic raw sales extract in the dairy schema.")
+    parser.add_argument("--output", default="data/synthetic_extract.csv",
+                        help='CSV to write; ".gz" compresses, "-" writes to stdout (default: data/synthetic_extract.csv)')
+    parser.add_argument("--skus", type=int, default=10, help="products (default: 10, the sample's catalogue)")
+    parser.add_argument("--locations", type=int, default=4, help="locations per product (default: 4)")
+    parser.add_argument("--channels", type=int, default=3, help="sales channels per location (default: 3)")
+    parser.add_argument("--days", type=int, default=92, help="days of history (default: 92)")
+    parser.add_argument("--start", default=START, help=f"first date (default: {START})")
+    parser.add_argument("--seed", type=int, default=SEED, help=f"random seed (default: {SEED})")
+    parser.add_argument("--block-rows", type=int, default=BLOCK_ROWS,
+                        help=f"rows generated and written at a time (default: {BLOCK_ROWS:,})")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rows = write(args.output, args.skus, args.locations, args.channels, args.days, args.start, args.seed,
+                 args.block_rows, progress=args.output != "-")
+    if args.output != "-":
+        print(f"✅ {rows:,} rows ({args.skus} SKUs × {args.locations} locations × {args.channels} channels × "
+              f"{args.days} days) written to {args.output} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+warm_start.py
+Warm-started Prophet refits for the nightly forecast stage.
+
+After each product-level fit, 02_prophet_forecasting.py stores the fitted
+parameters (k, m, delta, beta, sigma_obs) with the model in the registry
+(``warm_start`` in the version's meta.json, see model_registry.py). The next
+refit passes them to Stan as the initial point, so a series that only gained
+a day converges in a few optimizer iterations instead of starting from zero.
+
+A warm start only makes sense while the parameters mean the same thing, so
+the changepoint grid of the last cold fit is pinned for warm refits, and a
+cold fit (fresh grid, default init) is used instead when
+
+* the model configuration changed,
+* the history no longer starts on the same day or got shorter,
+* the history grew by more than ``MAX_GROWTH`` since the grid was laid out
+  (the newest part of the series would have no changepoints),
+* the number of seasonality features changed (e.g. yearly seasonality
+  switched on once two years of data exist).
+
+    python notebook/warm_start.py --days 7          # benchmark: iterations and wall time, warm vs cold
+"""
+
+import argparse
+import logging
+import re
+import time
+
+import numpy as np
+import pandas as pd
+from prophet import Prophet
+
+import sku_store
+from pipeline_cache import combined_digest
+
+PARAM_NAMES = ("k", "m", "delta", "beta", "sigma_obs")
+MAX_GROWTH = 0.10   # re-lay the changepoint grid once the history grew by 10%
+
+_ITERATION = re.compile(r"^\s*(?:Iteration\s+(\d+)\.|(\d+)\s+-?\d)")
+
+
+def config_digest(config):
+    return combined_digest(config)
+
+
+def optimizer_iterations(model):
+    """Optimizer iterations of the last Stan fit of ``model`` (None if unknown)."""
+    try:
+        paths = model.stan_backend.stan_fit.runset.stdout_files
+    except AttributeError:
+        return None
+    last = None
+    for path in paths:
+        with open(path, errors="replace") as fh:
+            for line in fh:
+                match = _ITERATION.match(line)
+                if match:
+                    last = int(match.group(1) or match.group(2))
+    return last
+
+
+def fitted_state(model, config, previous=None, warm=False):
+    """The warm-start record stored with a fitted model."""
+    params = {name: np.asarray(model.params[name]).ravel() for name in PARAM_NAMES}
+    history = model.history
+    grid = previous if warm else {
+        "changepoints": [str(d.date()) for d in model.changepoints],
+        "grid_rows": int(len(history)),
+        "history_start": str(history["ds"].min().date()),
+    }
+    return {
+        "config": config_digest(config),
+        "params": {name: (float(v[0]) if name in ("k", "m", "sigma_obs") else v.tolist())
+                   for name, v in params.items()},
+        "changepoints": grid["changepoints"],
+        "grid_rows": grid["grid_rows"],
+        "history_start": grid["history_start"],
+    }
+
+
+def plan(series, state, config):
+    """(Prophet kwargs, init or None, reason) for refitting ``series`` given its stored state."""
+    if not state:
+        return {}, None, "no previous fit"
+    if state.get("config") != config_digest(config):
+        return {}, None, "configuration changed"
+    history = series.dropna(subset=["y"])
+    if str(history["ds"].min().date()) != state["history_start"]:
+        return {}, None, "history start moved"
+    rows = len(history)
+    if rows < state["grid_rows"]:
+        return {}, None, "history got shorter"
+    if rows > state["grid_rows"] * (1 + MAX_GROWTH):
+        return {}, None, f"history grew {rows / state['grid_rows'] - 1:.0%} since the changepoint grid"
+
+    kwargs = {"changepoints": pd.to_datetime(state["changepoints"])}
+    # Same seasonality features? (cheap: no Stan call)
+    probe = Prophet(**kwargs).preprocess(history)
+    if probe.K != len(state["params"]["beta"]) or probe.S != len(state["params"]["delta"]):
+        return {}, None, "changepoint or seasonality layout changed"
+    init = {name: (np.asarray(value) if isinstance(value, list) else value)
+            for name, value in state["params"].items()}
+    return kwargs, init, "warm"
+
+
+def fit(series, state=None, config=None, warm=True):
+    """Fit ``series`` (ds, y), warm-started from ``state`` where it still applies.
+
+    Returns (model, info) with info = {mode, reason, iterations, fit_s, state}.
+    """
+    kwargs, init, reason = plan(series, state, config) if warm else ({}, None, "cold start requested")
+    start = time.perf_counter()
+    model = Prophet(**kwargs)
+    model.fit(series, **({"init": init} if init is not None else {}))
+    info = {
+        "mode": "warm" if init is not None else "cold",
+        "reason": reason,
+        "iterations": optimizer_iterations(model),
+        "fit_s": time.perf_counter() - start,
+    }
+    info["state"] = fitted_state(model, config, state, warm=init is not None)
+    return model, info
+
+
+# ───── BENCHMARK ─────
+def benchmark(series, days, config):
+    """Replay the last ``days`` nights of one series: warm refit vs cold refit each night."""
+    series = series.dropna(subset=["y"]).reset_index(drop=True)
+    _, first = fit(series.iloc[:len(series) - days], config=config)
+    state = first["state"]
+    rows = []
+    for night in range(days, 0, -1):
+        history = series.iloc[:len(series) - night + 1]
+        warm_model, warm = fit(history, state, config)
+        cold_model, cold = fit(history, config=config, warm=False)
+        state = warm["state"]
+        future = cold_model.make_future_dataframe(periods=30, include_history=False)
+        drift = np.abs(warm_model.predict(future)["yhat"] - cold_model.predict(future)["yhat"]).mean()
+        rows.append({"history_end": history["ds"].max().date(), "warm_mode": warm["mode"],
+                     "warm_iter": warm["iterations"], "cold_iter": cold["iterations"],
+                     "warm_s": warm["fit_s"], "cold_s": cold["fit_s"],
+                     "yhat_diff": drift / max(cold_model.history["y"].mean(), 1e-9)})
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark warm-started vs cold Prophet refits, night by night.")
+    parser.add_argument("--days", type=int, default=7, help="nights to replay per SKU (default: 7)")
+    parser.add_argument("--skus", help="comma-separated SKU slugs (default: every cleaned SKU)")
+    args = parser.parse_args()
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+
+    import prophet
+    config = {"model": "prophet", "prophet_version": prophet.__version__, "benchmark": True}
+    skus = args.skus.split(",") if args.skus else sku_store.list_skus("cleaned")
+    summary = []
+    for sku in skus:
+        df = sku_store.read_series("cleaned", sku).rename(columns={"Date": "ds", "Units_Sold": "y"})
+        nights = benchmark(df[["ds", "y"]], args.days, config)
+        summary.append({
+            "SKU": sku,
+            "Warm nights": f"{(nights['warm_mode'] == 'warm').sum()}/{len(nights)}",
+            "Iter warm": nights["warm_iter"].mean(), "Iter cold": nights["cold_iter"].mean(),
+            "Fit s warm": nights["warm_s"].mean(), "Fit s cold": nights["cold_s"].mean(),
+            "yhat diff %": 100 * nights["yhat_diff"].mean(),
+        })
+    report = pd.DataFrame(summary)
+    print(report.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    iw, ic = report["Iter warm"].sum(), report["Iter cold"].sum()
+    sw, sc = report["Fit s warm"].sum(), report["Fit s cold"].sum()
+    print(f"\n🔥 Mean per SKU-night: {iw / len(report):.0f} vs {ic / len(report):.0f} iterations "
+          f"({1 - iw / ic:.0%} fewer), {sw / len(report):.3f}s vs {sc / len(report):.3f}s fit "
+          f"({sc / sw:.2f}× faster)")
+
+
+if __name__ == "__main__":
+    main()